@@ -1,12 +1,54 @@
 import streamlit as st
-from pymongo import MongoClient
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from pymongo.errors import PyMongoError
 import pandas as pd
-from bson import ObjectId
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import concurrent.futures
 import datetime
+import os
+import tempfile
+import threading
+import time
 import numpy as np
+import pyarrow as pa
+
+from dashboard.queries import (
+    PANDAS_FALLBACK_MAX_DOCS,
+    DIAS_PT,
+    aggregate_order_summary,
+    build_order_match,
+    fetch_dish_rankings,
+    fetch_order_date_bounds,
+    fetch_order_status_values,
+    hour_weekday_frame,
+    hour_weekday_totals,
+    summarize_orders_frame,
+)
+from dashboard.approximate import DEFAULT_SAMPLE_SIZE, BackgroundRefiner, approximate_order_summary
+from dashboard.charts import downsample_totals, histogram_bins, mean_by_period, value_distribution
+from dashboard.decoder import fetch_columnar, process_record
+from dashboard.dimensions import RestaurantDimension
+from dashboard.geo import DEFAULT_ORDER_LOCATION_FIELD, fetch_order_grid, fetch_order_location_bounds, viewport_from_points
+from dashboard.live import DEFAULT_LIVE_TIME_FIELD, LIVE_WINDOWS, LiveOrderFeed
+from dashboard.loaders import SECTION_SOURCES, get_section_source
+from dashboard.mongo import MongoAccess
+from dashboard.order_store import OrderStore
+from dashboard.prefetch import DEFAULT_MAX_WORKERS, SectionPrefetcher, fetch_concurrently
+from dashboard.refresh import INCREMENTAL_SECTIONS, IncrementalFrameCache
+from dashboard.result_cache import ResultCache, filter_state_key
+from dashboard.profiling import Profiler, figure_points
+from dashboard.schema import frame_memory_report
+from dashboard.snapshot import SnapshotStore
+from dashboard.tenant import resolve_restaurant_scope, scope_query
+from dashboard.rollup import (
+    rollup_date_bounds,
+    rollup_order_summary,
+    rollup_status_values,
+    rollup_supports,
+    update_rollup,
+)
 
 # Configurações da página Streamlit
 st.set_page_config(
@@ -165,31 +207,35 @@ st.markdown(f"""
 </style>
 """, unsafe_allow_html=True)
 
-# Função para conectar ao MongoDB
+# Função para conectar ao MongoDB (pool, timeouts, compressão e read
+# preference vêm da seção [MONGO] do secrets; ver dashboard/mongo.py)
 @st.cache_resource
-def connect_mongo(uri, db_name):
-    client = MongoClient(uri)
-    db = client[db_name]
-    return db
-
-# Função para converter ObjectId para string e lidar com tipos aninhados
-def process_record(record):
-    for key, value in record.items():
-        if isinstance(value, ObjectId):
-            record[key] = str(value)
-        elif isinstance(value, dict):
-            record[key] = process_record(value)
-        elif isinstance(value, list):
-            record[key] = [process_record(item) if isinstance(item, dict) else item for item in value]
-    return record
+def connect_mongo(uri, db_name, settings):
+    return MongoAccess(uri, db_name, settings)
 
 # Função para buscar dados de uma coleção
+# Com os campos declarados usa o decodificador colunar; sem eles, o documento
+# inteiro passa por process_record. O instante da leitura fica no frame
+# (attrs['carregado_em']) e serve de versão dos dados no modo TTL
 @st.cache_data(ttl=600)
-def fetch_data_from_mongo(_db, collection_name):
+def fetch_data_from_mongo(_db, collection_name, fields=None):
     collection = _db[collection_name]
-    data = list(collection.find({}))
-    processed_data = [process_record(record) for record in data]
-    return pd.DataFrame(processed_data)
+    if fields is not None:
+        with profiler.span(f"mongo: leitura colunar {collection_name}") as span:
+            frame = fetch_columnar(collection, fields, batch_size=mongo.batch_size)
+            span.frame(frame)
+        frame.attrs['carregado_em'] = time.time_ns()
+        return frame
+    with profiler.span(f"mongo: find {collection_name}") as span:
+        data = list(collection.find({}))
+        span.frame(data)
+    with profiler.span(f"process_record {collection_name}"):
+        processed_data = [process_record(record) for record in data]
+    with profiler.span(f"DataFrame {collection_name}") as span:
+        frame = pd.DataFrame(processed_data)
+        span.frame(frame)
+    frame.attrs['carregado_em'] = time.time_ns()
+    return frame
 
 # Função para criar cards de métricas personalizados
 def create_metric_card(title, value, icon):
@@ -200,6 +246,13 @@ def create_metric_card(title, value, icon):
     </div>
     """
 
+# Renderiza o gráfico estilizado, medindo a serialização da figura no st.plotly_chart
+def render_chart(fig, title, height=500, **kwargs):
+    with profiler.span(f"gráfico: {title}") as span:
+        if profiler.enabled:
+            span.set(pontos=figure_points(fig))
+        return st.plotly_chart(create_styled_chart(fig, title, height), use_container_width=True, **kwargs)
+
 # Função para criar gráficos estilizados com paleta consistente
 def create_styled_chart(fig, title, height=500):
     fig.update_layout(
@@ -242,41 +295,578 @@ uri = st.secrets["MONGODB_URI"]
 db_name = "restaurante_reviews_db"
 
 try:
-    db = connect_mongo(uri, db_name)
+    mongo = connect_mongo(uri, db_name, dict(st.secrets.get("MONGO", {})))
+    # Leituras do dashboard vão para secundários (secondaryPreferred); escritas
+    # (cubo de pedidos, índices) usam mongo.db, no primário
+    db = mongo.analytics_db
     st.success("Conectado ao MongoDB com sucesso!")
 except Exception as e:
     st.error(f"Erro ao conectar ao MongoDB: {e}")
     st.stop()
 
-# Carregar todos os dados das coleções
+# Modo de atualização das coleções que só crescem: "ttl" recarrega tudo a cada
+# 10 minutos; "delta" busca só os documentos novos/alterados; "change_stream"
+# acompanha as alterações em replica sets
+REFRESH_MODE = st.secrets.get("REFRESH_MODE", "ttl")
+# Campo de data de modificação por seção (opcional), para o delta pegar alterações
+REFRESH_UPDATED_FIELDS = st.secrets.get("REFRESH_UPDATED_FIELDS", {})
+# Painéis de diagnóstico (memória dos frames em cache); também via ?debug=1
+DEBUG = bool(st.secrets.get("DEBUG", False)) or st.query_params.get("debug") == "1"
+# Painel de desempenho por etapa (também via ?profile=1) e arquivo JSONL com
+# um trace por rerun, para acompanhar regressões em produção
+PROFILE = DEBUG or bool(st.secrets.get("PROFILE", False)) or st.query_params.get("profile") == "1"
+PROFILE_TRACE_FILE = st.secrets.get("PROFILE_TRACE_FILE")
+profiler = Profiler(enabled=PROFILE or bool(PROFILE_TRACE_FILE))
+# Orçamento (MB) do cache de resultados compartilhado entre as sessões
+RESULT_CACHE_MB = float(st.secrets.get("RESULT_CACHE_MB", 256))
+# Painel ao vivo (pedidos dos últimos 15/30/60 minutos) e seu intervalo de atualização
+LIVE_PANEL = bool(st.secrets.get("LIVE_PANEL", True))
+LIVE_REFRESH_SECONDS = int(st.secrets.get("LIVE_REFRESH_SECONDS", 10))
+# Campo de data que o painel ao vivo usa como marca d'água (ex.: a data de
+# inserção, se os pedidos tiverem uma)
+LIVE_TIME_FIELD = st.secrets.get("LIVE_TIME_FIELD", DEFAULT_LIVE_TIME_FIELD)
+# Campo do local de entrega dos pedidos (GeoJSON Point) usado no mapa de calor;
+# o índice 2dsphere é criado por python -m dashboard.indexes
+ORDER_LOCATION_FIELD = st.secrets.get("ORDER_LOCATION_FIELD", DEFAULT_ORDER_LOCATION_FIELD)
+# Threads para buscar as coleções em paralelo (limitado pelo pool de conexões)
+FETCH_WORKERS = int(st.secrets.get("FETCH_WORKERS", DEFAULT_MAX_WORKERS))
+# Modo por restaurante: RESTAURANTE_ID no secrets fixa o restaurante da
+# implantação; sem ele, ?restaurante=<id> na URL escolhe o da sessão. Cada
+# restaurante tem o seu cache, com TTL próprio (SCOPE_TTL_SECONDS)
+try:
+    RESTAURANT_SCOPE = resolve_restaurant_scope(st.secrets.get("RESTAURANTE_ID"), st.query_params.get("restaurante"))
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+SCOPE_TTL_SECONDS = int(st.secrets.get("SCOPE_TTL_SECONDS", 300))
+# Restaurantes mantidos no cache ao mesmo tempo (os usados há mais tempo saem)
+SCOPE_MAX_RESTAURANTS = int(st.secrets.get("SCOPE_MAX_RESTAURANTS", 100))
+# Modo aproximado: períodos de pelo menos APPROX_MIN_DAYS dias saem primeiro de
+# uma amostra, e o resumo exato vem em segundo plano. O cubo por hora tem
+# precedência: os filtros da barra lateral sempre cabem nele, então com
+# USE_ROLLUP ligado (o padrão) o modo aproximado só atua enquanto o cubo não
+# está disponível (servidor sem $merge, cubo ainda sendo montado) ou com
+# USE_ROLLUP desligado
+APPROXIMATE_MODE = bool(st.secrets.get("APPROXIMATE_MODE", True))
+APPROX_MIN_DAYS = int(st.secrets.get("APPROX_MIN_DAYS", 365))
+APPROX_SAMPLE_SIZE = int(st.secrets.get("APPROX_SAMPLE_SIZE", DEFAULT_SAMPLE_SIZE))
+APPROX_POLL_SECONDS = 2
+
+# As threads do pool herdam o contexto desta execução do script (cache, secrets, sessão)
+def script_thread_setup():
+    ctx = get_script_run_ctx()
+    return lambda: add_script_run_ctx(threading.current_thread(), ctx)
+
+# Pool das buscas em segundo plano, do processo e não da execução: um rerun
+# interrompido (st.stop, st.rerun num fragmento, exceção) não chega ao
+# shutdown() no fim da página, e um pool por execução deixaria threads para trás
+@st.cache_resource
+def get_prefetch_executor(max_workers):
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+
+# Seções buscadas em segundo plano nesta execução (ver dashboard/prefetch.py)
+section_prefetcher = SectionPrefetcher(
+    lambda section: _load_section(db, section),
+    thread_setup=script_thread_setup(),
+    executor=get_prefetch_executor(FETCH_WORKERS)
+)
+
+# Frame incremental compartilhado entre sessões (um por seção)
+@st.cache_resource
+def get_incremental_cache(_db, section, mode):
+    source = get_section_source(section)
+    return IncrementalFrameCache(
+        _db[source.collection],
+        source.fields,
+        updated_field=REFRESH_UPDATED_FIELDS.get(section),
+        mode=mode,
+        batch_size=mongo.batch_size,
+        # Os pedidos ficam em ordem de data, como o OrderStore os fatia
+        sort_field='data_hora_pedido' if section == 'pedidos' else None
+    )
+
+# Dimensão de restaurantes com códigos inteiros e índice de categorias
+@st.cache_data(ttl=600)
+def build_restaurant_dimension(df_restaurantes):
+    return RestaurantDimension(df_restaurantes)
+
+# Snapshot em disco (Arrow) das seções em modo TTL, mapeado em memória por todas
+# as sessões e processos; SNAPSHOT_DIR vazio desliga e volta ao st.cache_data
+SNAPSHOT_DIR = st.secrets.get("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), f"snapshot_{db_name}"))
+
+@st.cache_resource
+def get_snapshot_store(root):
+    return SnapshotStore(root)
+
+# Seções gravadas no snapshot: as que não são incrementais e, para bases
+# grandes, sem os pedidos (respondidos por agregação no servidor)
+def snapshot_sections(_db):
+    use_pipeline = count_orders(_db) > PANDAS_FALLBACK_MAX_DOCS
+    return tuple(
+        section for section in SECTION_SOURCES
+        if not (REFRESH_MODE != "ttl" and section in INCREMENTAL_SECTIONS)
+        and not (use_pipeline and section == 'pedidos')
+    )
+
+# Busca as seções no MongoDB para uma versão nova do snapshot (os pedidos já
+# vão ordenados por data, para o OrderStore não precisar copiá-los)
+def fetch_snapshot_frames(_db, sections):
+    loaders = {
+        section: lambda source=get_section_source(section): fetch_columnar(
+            _db[source.collection], source.fields, batch_size=mongo.batch_size
+        )
+        for section in sections
+    }
+    frames = fetch_concurrently(loaders, FETCH_WORKERS, script_thread_setup())
+    if 'pedidos' in frames:
+        frames['pedidos'] = OrderStore(frames['pedidos']).frame
+    return frames
+
+# Frame mapeado de uma versão do snapshot, o mesmo objeto para todas as sessões
+@st.cache_resource(max_entries=2 * len(SECTION_SOURCES))
+def read_snapshot_section(_store, root, version, section):
+    return _store.read(version, section)
+
+# Versão vigente do snapshot (None se desligado ou indisponível)
+def snapshot_version(_db, section):
+    if not SNAPSHOT_DIR:
+        return None
+    sections = snapshot_sections(_db)
+    if section not in sections:
+        return None
+    try:
+        return get_snapshot_store(SNAPSHOT_DIR).ensure_fresh(lambda names: fetch_snapshot_frames(_db, names), sections)
+    except (OSError, pa.ArrowException) as e:
+        st.warning(f"Snapshot local indisponível, lendo direto do MongoDB: {e}")
+        return None
+
+# Carregar sob demanda os dados de uma seção (só a coleção e os campos que ela usa);
+# se a busca já começou em segundo plano, espera só por ela
+def load_section(_db, section):
+    with profiler.span(f"dados: {section}") as span:
+        if section in section_prefetcher:
+            span.set(paralelo=True)
+            if section_prefetcher.ready(section):
+                frame = section_prefetcher.get(section)
+            else:
+                with st.spinner(f"Carregando {section}..."):
+                    frame = section_prefetcher.get(section)
+        else:
+            frame = _load_section(_db, section)
+        span.frame(frame)
+    return frame
+
+def _load_section(_db, section):
+    source = get_section_source(section)
+    if RESTAURANT_SCOPE is not None:
+        return fetch_scoped_section(_db, section, RESTAURANT_SCOPE)
+    if REFRESH_MODE != "ttl" and section in INCREMENTAL_SECTIONS:
+        return get_incremental_cache(_db, section, REFRESH_MODE).get()
+    version = snapshot_version(_db, section)
+    if version is not None:
+        return read_snapshot_section(get_snapshot_store(SNAPSHOT_DIR), SNAPSHOT_DIR, version, section)
+    return fetch_data_from_mongo(_db, source.collection, source.fields)
+
+# Seção de um restaurante só (modo por restaurante): o filtro de restaurante
+# vai na consulta e o cache fica particionado por restaurante, com TTL próprio.
+# O snapshot e o cache incremental, que guardam a plataforma inteira, não são usados
+@st.cache_data(ttl=SCOPE_TTL_SECONDS, max_entries=SCOPE_MAX_RESTAURANTS * len(SECTION_SOURCES))
+def fetch_scoped_section(_db, section, restaurant_id):
+    source = get_section_source(section)
+    with profiler.span(f"mongo: leitura do restaurante {source.collection}") as span:
+        frame = fetch_columnar(
+            _db[source.collection], source.fields, scope_query(section, restaurant_id), batch_size=mongo.batch_size
+        )
+        span.frame(frame)
+    frame.attrs['carregado_em'] = time.time_ns()
+    return frame
+
+# Versão dos dados de uma seção incremental (None no modo TTL e no modo por
+# restaurante, em que a expiração do cache já faz esse papel)
+def section_version(_db, section):
+    if RESTAURANT_SCOPE is not None:
+        return None
+    if REFRESH_MODE != "ttl" and section in INCREMENTAL_SECTIONS:
+        cache = get_incremental_cache(_db, section, REFRESH_MODE)
+        cache.get()
+        return cache.version
+    return snapshot_version(_db, section)
+
+# Versão dos dados já carregados de uma seção, chave dos cálculos memoizados:
+# a do snapshot ou do cache incremental e, no modo TTL, o instante da leitura
+def loaded_version(_db, section, frame):
+    version = section_version(_db, section)
+    return version if version is not None else frame.attrs.get('carregado_em')
+
+# Pedidos ordenados por data, compartilhados (somente leitura) entre as sessões
+# (no modo por restaurante, um por restaurante)
+@st.cache_resource(ttl=600, max_entries=SCOPE_MAX_RESTAURANTS)
+def get_order_store(_db, data_version, restaurant_scope=None):
+    return OrderStore(load_section(_db, 'pedidos'))
+
+# Funções de consulta agregada no MongoDB (usadas quando a base é grande); no
+# modo por restaurante conta só os pedidos do restaurante
 @st.cache_data(ttl=600)
-def load_all_data(_db):
-    data = {}
-    collections = ["avaliacoes", "cardapios", "mensagens", "notificacoes", "pedidos", "pratos", "relatorios", "restaurantes", "usuarios"]
-    for col_name in collections:
-        data[col_name] = fetch_data_from_mongo(_db, col_name)
-    return data
+def count_orders(_db, restaurant_scope=None):
+    if restaurant_scope is not None:
+        return _db['pedidos'].count_documents(build_order_match((restaurant_scope,)))
+    return _db['pedidos'].estimated_document_count()
+
+# Atualiza o cubo de pedidos por hora; se o servidor não suportar $merge
+# (MongoDB < 4.2) ou o cubo ainda estiver sendo montado por outro processo,
+# as consultas vão direto na coleção de pedidos
+@st.cache_data(ttl=600)
+def refresh_order_rollup(_db):
+    try:
+        return update_rollup(_db, updated_field=REFRESH_UPDATED_FIELDS.get('pedidos')) is not None
+    except (PyMongoError, NotImplementedError):
+        return False
+
+@st.cache_data(ttl=600)
+def query_order_date_bounds(_db, use_rollup, restaurant_ids):
+    match = build_order_match(restaurant_ids)
+    if use_rollup and rollup_supports(match):
+        return rollup_date_bounds(_db, match)
+    return fetch_order_date_bounds(_db['pedidos'], match)
 
-all_data = load_all_data(db)
+@st.cache_data(ttl=600)
+def query_order_status_values(_db, use_rollup, restaurant_ids, start_date, end_date):
+    match = build_order_match(restaurant_ids, start_date, end_date)
+    if use_rollup and rollup_supports(match):
+        return rollup_status_values(_db, match)
+    return fetch_order_status_values(_db['pedidos'], match)
+
+def query_order_summary(_db, use_rollup, restaurant_ids, start_date, end_date, statuses):
+    match = build_order_match(restaurant_ids, start_date, end_date, statuses)
+    if use_rollup and rollup_supports(match):
+        return rollup_order_summary(_db, match)
+    return aggregate_order_summary(_db['pedidos'], match)
+
+# Mapa de calor: limites e grade agregada no MongoDB
+@st.cache_data(ttl=600)
+def query_order_location_bounds(_db, restaurant_ids, start_date, end_date, statuses):
+    return fetch_order_location_bounds(_db['pedidos'], restaurant_ids, start_date, end_date, statuses,
+                                       location_field=ORDER_LOCATION_FIELD)
+
+@st.cache_data(ttl=600)
+def query_order_grid(_db, bounds, restaurant_ids, start_date, end_date, statuses):
+    return fetch_order_grid(_db['pedidos'], bounds, restaurant_ids, start_date, end_date, statuses,
+                            location_field=ORDER_LOCATION_FIELD)
+
+# Resumos de pedidos (KPIs e séries dos gráficos) compartilhados entre as
+# sessões pelo estado canônico dos filtros (ver dashboard/result_cache.py)
+@st.cache_resource
+def get_result_cache(max_mb):
+    return ResultCache(max_bytes=int(max_mb * 1024 * 1024), max_age_seconds=600)
+
+result_cache = get_result_cache(RESULT_CACHE_MB)
+
+# Versão dos pedidos para o cache de resultados no caminho de agregação: o
+# último pedido gravado (consultado no índice de _id a cada minuto)
+@st.cache_data(ttl=60)
+def latest_order_id(_db):
+    latest = _db['pedidos'].find_one({}, {'_id': 1}, sort=[('_id', -1)])
+    return str(latest['_id']) if latest is not None else None
+
+# Resumo dos pedidos filtrados, do cache de resultados ou calculado
+def cached_order_summary(data_version, categories, restaurant_ids, start_date, end_date, statuses, compute):
+    key = filter_state_key(categories, start_date, end_date, restaurant_ids, statuses)
+    return result_cache.get_or_compute('resumo_pedidos', data_version, key, compute)
+
+# Rankings de pratos vendidos dos pedidos filtrados ($unwind/$group no MongoDB),
+# compartilhados entre as sessões como o resumo dos pedidos
+def cached_dish_rankings(categories, restaurant_ids, start_date, end_date, statuses):
+    key = filter_state_key(categories, start_date, end_date, restaurant_ids, statuses)
+    match = build_order_match(restaurant_ids, start_date, end_date, statuses)
+    return result_cache.get_or_compute(
+        'pratos_vendidos', latest_order_id(db), key,
+        lambda: fetch_dish_rankings(db['pedidos'], db['pratos'], match)
+    )
+
+# Cálculos exatos em segundo plano do modo aproximado, compartilhados entre as sessões
+@st.cache_resource
+def get_background_refiner():
+    return BackgroundRefiner()
+
+refiner = get_background_refiner()
+
+# O resumo sai primeiro da amostra só no caminho de agregação, para filtros que
+# o cubo não responde (a resposta do cubo já é exata e barata) e períodos de
+# pelo menos APPROX_MIN_DAYS dias
+def approximate_applicable(restaurant_ids, start_date, end_date, statuses):
+    if not APPROXIMATE_MODE or start_date is None or end_date is None:
+        return False
+    if use_rollup and rollup_supports(build_order_match(restaurant_ids, start_date, end_date, statuses)):
+        return False
+    return (end_date - start_date).days + 1 >= APPROX_MIN_DAYS
+
+# Resumo aproximado (amostra dos pedidos), compartilhado entre as sessões como o exato
+def cached_approximate_summary(data_version, categories, restaurant_ids, start_date, end_date, statuses):
+    key = filter_state_key(categories, start_date, end_date, restaurant_ids, statuses)
+    match = build_order_match(restaurant_ids, start_date, end_date, statuses)
+    return result_cache.get_or_compute(
+        'resumo_aproximado', data_version, key,
+        lambda: approximate_order_summary(db['pedidos'], match, count_orders(db), APPROX_SAMPLE_SIZE)
+    )
+
+# Cálculos de cada seção memoizados nas suas entradas (versão dos dados e os
+# filtros que a seção usa): mudar um filtro só recalcula as seções que dependem
+# dele; avaliações e pratos não dependem da barra lateral
+@st.cache_data(ttl=600, max_entries=64)
+def restaurant_performance(_df_restaurantes, restaurants_version, por_restaurante):
+    # Faturamento por código de restaurante (np.bincount) e por categoria
+    # (incidência esparsa restaurante x categoria), sem merge nem explode
+    with profiler.span("restaurantes: códigos e incidência") as span:
+        dimension = build_restaurant_dimension(_df_restaurantes)
+        valores, presentes = dimension.values_by_code(por_restaurante['restaurante_id'], por_restaurante['valor_total'])
+        top_rest_faturamento = dimension.top_names(valores, presentes, 10)
+        cozinha_faturamento = dimension.category_frame(valores, presentes) if dimension.categories else None
+        span.set(restaurantes=len(dimension), categorias=len(dimension.categories))
+    return top_rest_faturamento, cozinha_faturamento
+
+@st.cache_data(ttl=600, max_entries=8)
+def review_section_data(_df_avaliacoes, data_version):
+    df_avaliacoes = _df_avaliacoes
+    # O frame é compartilhado (somente leitura): conversões geram um frame novo
+    if not pd.api.types.is_datetime64_any_dtype(df_avaliacoes['data_avaliacao']):
+        df_avaliacoes = df_avaliacoes.assign(data_avaliacao=pd.to_datetime(df_avaliacoes['data_avaliacao']))
+    total_avaliacoes = len(df_avaliacoes)
+    avaliacoes_positivas = int((df_avaliacoes['nota'] >= 4).sum())
+    # Evolução temporal das notas (mensal; trimestral/anual em históricos longos)
+    nota_por_periodo, _ = mean_by_period(df_avaliacoes['data_avaliacao'], df_avaliacoes['nota'])
+    return {
+        'nota_media': float(df_avaliacoes['nota'].mean()),
+        'total_avaliacoes': total_avaliacoes,
+        'taxa_satisfacao': (avaliacoes_positivas / total_avaliacoes * 100) if total_avaliacoes > 0 else 0,
+        # Histograma de notas (contagem por nota feita no servidor)
+        'distribuicao_notas': value_distribution(df_avaliacoes['nota'], name='nota'),
+        'avaliacoes_tempo': nota_por_periodo.rename_axis('mes_ano').rename('nota').reset_index(),
+    }
+
+@st.cache_data(ttl=600, max_entries=8)
+def dish_section_data(_df_pratos, data_version):
+    # Faixas e contagens do histograma de preços e os 10 pratos mais caros
+    return histogram_bins(_df_pratos['preco'], bins=20), _df_pratos.nlargest(10, 'preco')[['nome', 'preco']]
+
+# Bases pequenas continuam no caminho em pandas; as grandes usam agregação no
+# servidor, respondida pelo cubo por hora sempre que possível
+use_pipeline = count_orders(db, RESTAURANT_SCOPE) > PANDAS_FALLBACK_MAX_DOCS
+use_rollup = use_pipeline and st.secrets.get("USE_ROLLUP", True) and refresh_order_rollup(mongo.db)
+
+# Todas as seções começam a ser buscadas agora, em paralelo; cada parte da
+# página é renderizada assim que a sua seção chega
+section_prefetcher.start([
+    section for section in ('restaurantes', 'pedidos', 'avaliacoes', 'pratos')
+    if not (use_pipeline and section == 'pedidos')
+])
+
+# Pedidos novos acompanhados pela marca d'água de data (ou pelo change stream),
+# num buffer por minuto compartilhado entre as sessões
+# (no modo por restaurante, um feed por restaurante)
+@st.cache_resource(max_entries=SCOPE_MAX_RESTAURANTS)
+def get_live_feed(_db, mode, restaurant_scope=None):
+    return LiveOrderFeed(
+        _db['pedidos'], mode=mode, poll_seconds=max(LIVE_REFRESH_SECONDS // 2, 1),
+        query=scope_query('pedidos', restaurant_scope) if restaurant_scope is not None else None,
+        time_field=LIVE_TIME_FIELD,
+    )
+
+# Painel ao vivo. Fragmento com run_every: só ele é reexecutado a cada
+# LIVE_REFRESH_SECONDS, sem refazer filtros nem recarregar os pedidos
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_live_panel():
+    feed = get_live_feed(db, 'change_stream' if REFRESH_MODE == 'change_stream' else 'poll', RESTAURANT_SCOPE)
+    try:
+        feed.refresh()
+    except PyMongoError as e:
+        st.warning(f"Painel ao vivo indisponível: {e}")
+        return
+
+    st.markdown("## Pedidos ao Vivo")
+    janelas = feed.windows(LIVE_WINDOWS)
+    for col, janela in zip(st.columns(len(janelas)), janelas):
+        with col:
+            st.metric(label=f"Últimos {janela['minutos']} min", value=f"{janela['pedidos']:,} pedidos")
+            total_status = sum(janela['status'].values())
+            mix_status = " · ".join(
+                f"{status} {quantidade / total_status:.0%}"
+                for status, quantidade in sorted(janela['status'].items(), key=lambda item: -item[1])
+            )
+            st.caption(
+                f"{janela['pedidos_por_minuto']:,.1f} pedidos/min · R$ {janela['faturamento']:,.2f} · "
+                f"ticket R$ {janela['ticket_medio']:,.2f}" + (f"<br>{mix_status}" if mix_status else ""),
+                unsafe_allow_html=True
+            )
+
+    if janelas[-1]['pedidos']:
+        pedidos_minuto = feed.per_minute(max(LIVE_WINDOWS))
+        fig_ao_vivo = px.bar(
+            pedidos_minuto,
+            x='minuto',
+            y='pedidos',
+            custom_data=['faturamento'],
+            color_discrete_sequence=[RESTAURANT_COLORS['primary']]
+        )
+        fig_ao_vivo.update_traces(
+            hovertemplate='<b>%{x|%H:%M}</b><br>Pedidos: %{y}<br>Faturamento: R$ %{customdata[0]:,.2f}<extra></extra>',
+            hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
+        )
+        render_chart(fig_ao_vivo, 'Pedidos por Minuto (última hora)', 300)
+    else:
+        st.caption(f"Nenhum pedido nos últimos {max(LIVE_WINDOWS)} minutos.")
+    st.caption(f"Atualizado a cada {LIVE_REFRESH_SECONDS} s (horário UTC)")
+
+# Ticket médio por dia da semana x hora (matriz 7 x 24 já agregada no resumo).
+# Fragmento: trocar a métrica ou o restaurante reexecuta só esta seção
+@st.fragment
+def render_hour_weekday_section(order_summary, df_restaurantes, df_pedidos, start_date, end_date, filter_statuses):
+    st.markdown("### Ticket Médio por Hora")
+    col1, col2 = st.columns(2)
+    with col1:
+        heatmap_metric = st.radio(
+            "Métrica",
+            ['Ticket médio', 'Pedidos', 'Faturamento'],
+            horizontal=True,
+            key='hora_semana_metrica'
+        )
+    with col2:
+        restaurantes_resumo = df_restaurantes[df_restaurantes['_id'].isin(order_summary['por_restaurante']['restaurante_id'])]
+        heatmap_restaurant = st.selectbox(
+            "Restaurante",
+            ['Todos'] + sorted(restaurantes_resumo['nome'].unique().tolist()),
+            key='hora_semana_restaurante'
+        )
+
+    hora_semana = order_summary['hora_semana']
+    if heatmap_restaurant != 'Todos':
+        heatmap_ids = restaurantes_resumo.loc[restaurantes_resumo['nome'] == heatmap_restaurant, '_id'].tolist()
+        with profiler.span("ticket por hora: restaurante") as span:
+            if use_pipeline:
+                hora_semana = cached_order_summary(
+                    latest_order_id(db), None, heatmap_ids, start_date, end_date, filter_statuses,
+                    lambda: query_order_summary(db, use_rollup, tuple(heatmap_ids), start_date, end_date, filter_statuses)
+                )['hora_semana']
+            else:
+                pedidos_restaurante = df_pedidos[df_pedidos['restaurante_id'].isin(heatmap_ids)]
+                span.frame(pedidos_restaurante)
+                hora_semana = hour_weekday_frame(*hour_weekday_totals(
+                    pedidos_restaurante['data_hora_pedido'], pedidos_restaurante['valor_total']
+                ))
+
+    metric_column = {'Ticket médio': 'ticket_medio', 'Pedidos': 'pedidos', 'Faturamento': 'faturamento'}[heatmap_metric]
+    matrix = hora_semana.pivot(index='dia', columns='hora', values=metric_column).reindex(index=range(7), columns=range(24))
+    detalhes = np.dstack([
+        hora_semana.pivot(index='dia', columns='hora', values=column).reindex(index=range(7), columns=range(24)).to_numpy()
+        for column in ('pedidos', 'faturamento', 'ticket_medio')
+    ])
+    fig_hora = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(),
+        x=[f"{hora:02d}h" for hora in range(24)],
+        y=DIAS_PT,
+        customdata=detalhes,
+        colorscale=[[0, '#FFF5E6'], [0.5, RESTAURANT_COLORS['warning']], [1, RESTAURANT_COLORS['primary']]],
+        hoverongaps=False,
+        hovertemplate='<b>%{y}, %{x}</b><br>Pedidos: %{customdata[0]:,}<br>Faturamento: R$ %{customdata[1]:,.2f}'
+                      '<br>Ticket médio: R$ %{customdata[2]:,.2f}<extra></extra>',
+        hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
+    ))
+    fig_hora.update_yaxes(autorange='reversed')
+    render_chart(fig_hora, f'{heatmap_metric} por Dia da Semana e Hora', 420)
+
+# Mapa de calor dos pedidos. Fragmento: aproximar numa região ou voltar à
+# visão geral reexecuta só o mapa
+@st.fragment
+def render_order_map_section(map_filters):
+    with profiler.span("mapa: limites dos pedidos"):
+        map_overview = query_order_location_bounds(db, *map_filters)
+
+    if map_overview is None:
+        st.info(f"Os pedidos filtrados não têm local de entrega ({ORDER_LOCATION_FIELD}) para o mapa.")
+    else:
+        # A área aproximada vale só para os filtros em que foi escolhida
+        saved_area = st.session_state.get('mapa_area')
+        map_bounds = saved_area[0] if saved_area is not None and saved_area[1] == map_filters else map_overview
+
+        with profiler.span("mapa: grade") as span:
+            map_grid = query_order_grid(db, map_bounds, *map_filters)
+            span.frame(map_grid)
+
+        lon_span = max(map_bounds[2] - map_bounds[0], map_bounds[3] - map_bounds[1])
+        fig_mapa = px.scatter_mapbox(
+            map_grid,
+            lat='lat',
+            lon='lon',
+            color='pedidos',
+            size='pedidos',
+            custom_data=['faturamento'],
+            color_continuous_scale=[[0, RESTAURANT_COLORS['warning']], [1, RESTAURANT_COLORS['primary']]],
+            center={'lat': (map_bounds[1] + map_bounds[3]) / 2, 'lon': (map_bounds[0] + map_bounds[2]) / 2},
+            zoom=float(np.clip(np.log2(360 / lon_span) - 0.5, 1, 18)),
+            size_max=18
+        )
+        fig_mapa.update_layout(mapbox_style='open-street-map', dragmode='select')
+        fig_mapa.update_traces(
+            hovertemplate='<b>Pedidos: %{marker.color:,}</b><br>Faturamento: R$ %{customdata[0]:,.2f}<extra></extra>',
+            hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
+        )
+        # Seleção em retângulo aproxima o mapa na área escolhida (a chave muda
+        # com a área, para a seleção anterior não ser reaplicada)
+        map_event = render_chart(
+            fig_mapa, 'Concentração de Pedidos por Região', 550,
+            on_select="rerun", selection_mode="box", key=f"mapa_{hash(map_bounds)}"
+        )
+        zoomed = viewport_from_points(map_event.selection.points if map_event else [], map_bounds)
+        if zoomed is not None:
+            st.session_state['mapa_area'] = (zoomed, map_filters)
+            st.rerun(scope="fragment")
+
+        st.caption(f"{len(map_grid):,} células de {map_grid['pedidos'].sum():,} pedidos. "
+                   "Selecione uma região no mapa para aproximar.")
+        if map_bounds != map_overview and st.button("Voltar à visão geral do mapa"):
+            st.session_state.pop('mapa_area', None)
+            st.rerun(scope="fragment")
 
 # --- SIDEBAR COM FILTROS INTELIGENTES ---
 st.sidebar.markdown("## Filtros Inteligentes")
 
 # Inicializa os DataFrames
-df_pedidos = all_data.get('pedidos', pd.DataFrame()).copy()
-df_restaurantes = all_data.get('restaurantes', pd.DataFrame()).copy()
+with profiler.span("dados: pedidos ordenados (OrderStore)") as span:
+    if use_pipeline:
+        order_store = None
+    elif RESTAURANT_SCOPE is not None:
+        # Versão = instante da leitura dos pedidos do restaurante
+        order_store = get_order_store(
+            db, loaded_version(db, 'pedidos', load_section(db, 'pedidos')), RESTAURANT_SCOPE
+        )
+    else:
+        order_store = get_order_store(db, section_version(db, 'pedidos'))
+    span.frame(order_store.frame if order_store is not None else None)
+df_pedidos = pd.DataFrame() if use_pipeline else order_store.frame
+df_restaurantes = load_section(db, 'restaurantes')
 
-# Filtro de categorias (NOVO)
-if not df_restaurantes.empty and 'categorias' in df_restaurantes.columns:
-    # Extrair todas as categorias únicas
-    all_categories = []
-    for categorias in df_restaurantes['categorias'].dropna():
-        if isinstance(categorias, list):
-            all_categories.extend(categorias)
-        elif isinstance(categorias, str):
-            all_categories.append(categorias)
+if RESTAURANT_SCOPE is not None and df_restaurantes.empty:
+    st.error(f"Restaurante não encontrado: {RESTAURANT_SCOPE}")
+    st.stop()
 
-    unique_categories = sorted(list(set(all_categories)))
+# Estado dos filtros (None = sem filtro)
+filter_restaurant_ids = None
+start_date, end_date = None, None
+filter_statuses = None
+category_codes = None
+selected_categories = []
+
+# Modo por restaurante: todas as consultas levam o restaurante da sessão, e os
+# filtros de categoria e de restaurante não se aplicam
+if RESTAURANT_SCOPE is not None:
+    filter_restaurant_ids = (RESTAURANT_SCOPE,)
+    st.sidebar.markdown(f"**Restaurante:** {df_restaurantes['nome'].iloc[0]}")
+    profiler.annotate(restaurante=RESTAURANT_SCOPE)
+
+# Filtro de categorias (NOVO)
+if RESTAURANT_SCOPE is None and not df_restaurantes.empty and 'categorias' in df_restaurantes.columns:
+    # Índice invertido categoria -> códigos de restaurantes (refeito só quando a coleção muda)
+    restaurant_dimension = build_restaurant_dimension(df_restaurantes)
+    unique_categories = restaurant_dimension.categories
 
     if unique_categories:
         selected_categories = st.sidebar.multiselect(
@@ -285,28 +875,25 @@ if not df_restaurantes.empty and 'categorias' in df_restaurantes.columns:
             default=[],
             help="Selecione as categorias de restaurantes para filtrar"
         )
+        profiler.annotate(categorias=selected_categories)
 
-        # Aplicar filtro de categorias
+        # Aplicar filtro de categorias (nos pedidos, depois do recorte de período)
         if selected_categories:
-            filtered_restaurant_ids = []
-            for idx, row in df_restaurantes.iterrows():
-                if isinstance(row['categorias'], list):
-                    if any(cat in selected_categories for cat in row['categorias']):
-                        filtered_restaurant_ids.append(row['_id'])
-                elif isinstance(row['categorias'], str):
-                    if row['categorias'] in selected_categories:
-                        filtered_restaurant_ids.append(row['_id'])
-
-            if not df_pedidos.empty and filtered_restaurant_ids:
-                df_pedidos = df_pedidos[df_pedidos['restaurante_id'].isin(filtered_restaurant_ids)]
+            category_codes = restaurant_dimension.codes_for_categories(selected_categories)
 
-# Filtro de período
-if not df_pedidos.empty and 'data_hora_pedido' in df_pedidos.columns:
-    df_pedidos['data_hora_pedido'] = pd.to_datetime(df_pedidos['data_hora_pedido'])
+            if len(category_codes):
+                filter_restaurant_ids = tuple(restaurant_dimension.ids_for_codes(category_codes))
+            else:
+                category_codes = None
 
-    min_date = df_pedidos['data_hora_pedido'].min().date()
-    max_date = df_pedidos['data_hora_pedido'].max().date()
+# Filtro de período
+with profiler.span("filtro: limites de período"):
+    if use_pipeline:
+        min_date, max_date = query_order_date_bounds(db, use_rollup, filter_restaurant_ids)
+    else:
+        min_date, max_date = order_store.date_bounds(filter_restaurant_ids)
 
+if min_date is not None:
     date_range = st.sidebar.date_input(
         "Período de Análise",
         value=(min_date, max_date),
@@ -316,13 +903,21 @@ if not df_pedidos.empty and 'data_hora_pedido' in df_pedidos.columns:
 
     if len(date_range) == 2:
         start_date, end_date = date_range
-        df_pedidos = df_pedidos[
-            (df_pedidos['data_hora_pedido'].dt.date >= start_date) &
-            (df_pedidos['data_hora_pedido'].dt.date <= end_date)
-        ]
+        profiler.annotate(periodo=[start_date, end_date])
+        if not use_pipeline:
+            # Busca binária na coluna ordenada: fatia sem copiar os pedidos
+            with profiler.span("filtro: período") as span:
+                df_pedidos = order_store.slice_dates(start_date, end_date)
+                span.frame(df_pedidos)
+
+if category_codes is not None and not df_pedidos.empty:
+    with profiler.span("filtro: categorias") as span:
+        order_codes = restaurant_dimension.order_codes(df_pedidos['restaurante_id'])
+        df_pedidos = df_pedidos[restaurant_dimension.order_mask(order_codes, category_codes)]
+        span.frame(df_pedidos)
 
 # Filtro de restaurantes
-if not df_restaurantes.empty:
+if RESTAURANT_SCOPE is None and not df_restaurantes.empty:
     restaurantes_list = ['Todos'] + sorted(df_restaurantes['nome'].unique().tolist())
     selected_restaurants = st.sidebar.multiselect(
         "Restaurantes",
@@ -331,13 +926,26 @@ if not df_restaurantes.empty:
     )
 
     if 'Todos' not in selected_restaurants and selected_restaurants:
+        restaurant_ids = df_restaurantes[df_restaurantes['nome'].isin(selected_restaurants)]['_id'].tolist()
+        if filter_restaurant_ids is not None:
+            allowed_ids = set(filter_restaurant_ids)
+            restaurant_ids = [rid for rid in restaurant_ids if rid in allowed_ids]
+        filter_restaurant_ids = tuple(restaurant_ids)
+        profiler.annotate(restaurantes=len(restaurant_ids))
         if not df_pedidos.empty:
-            restaurant_ids = df_restaurantes[df_restaurantes['nome'].isin(selected_restaurants)]['_id'].tolist()
-            df_pedidos = df_pedidos[df_pedidos['restaurante_id'].isin(restaurant_ids)]
+            with profiler.span("filtro: restaurantes") as span:
+                df_pedidos = df_pedidos[df_pedidos['restaurante_id'].isin(restaurant_ids)]
+                span.frame(df_pedidos)
 
 # Filtro de status de pedidos
-if not df_pedidos.empty:
-    status_list = ['Todos'] + df_pedidos['status_pedido'].unique().tolist()
+with profiler.span("filtro: valores de status"):
+    if use_pipeline:
+        status_values = query_order_status_values(db, use_rollup, filter_restaurant_ids, start_date, end_date) if min_date is not None else []
+    else:
+        status_values = df_pedidos['status_pedido'].unique().tolist() if not df_pedidos.empty else []
+
+if status_values:
+    status_list = ['Todos'] + status_values
     selected_status = st.sidebar.multiselect(
         "Status dos Pedidos",
         status_list,
@@ -345,43 +953,122 @@ if not df_pedidos.empty:
     )
 
     if 'Todos' not in selected_status and selected_status:
-        df_pedidos = df_pedidos[df_pedidos['status_pedido'].isin(selected_status)]
+        filter_statuses = tuple(selected_status)
+        profiler.annotate(status=selected_status)
+        if not df_pedidos.empty:
+            with profiler.span("filtro: status") as span:
+                df_pedidos = df_pedidos[df_pedidos['status_pedido'].isin(selected_status)]
+                span.frame(df_pedidos)
+
+# Resumo dos pedidos filtrados: agregação no MongoDB ou, para bases pequenas, em
+# pandas; sessões com os mesmos filtros reaproveitam o resultado do cache
+# Em períodos longos, a primeira renderização sai da amostra (modo aproximado)
+# enquanto o resumo exato é calculado em segundo plano
+refine_key = None
+with profiler.span("resumo dos pedidos", origem='mongo' if use_pipeline else 'pandas') as span:
+    hits_before = result_cache.hits
+    if use_pipeline:
+        data_version = latest_order_id(db)
+        exact_summary = lambda: cached_order_summary(
+            data_version, selected_categories, filter_restaurant_ids, start_date, end_date, filter_statuses,
+            lambda: query_order_summary(db, use_rollup, filter_restaurant_ids, start_date, end_date, filter_statuses)
+        )
+        order_summary = None
+        if status_values and approximate_applicable(filter_restaurant_ids, start_date, end_date, filter_statuses):
+            summary_key = filter_state_key(selected_categories, start_date, end_date, filter_restaurant_ids, filter_statuses)
+            refine_key = (data_version, summary_key)
+            # Exato já no cache ou cálculo em segundo plano que falhou (repetido aqui): sem amostra
+            if result_cache.contains('resumo_pedidos', data_version, summary_key) or refiner.done(refine_key):
+                refiner.discard(refine_key)
+                refine_key = None
+            else:
+                order_summary = cached_approximate_summary(
+                    data_version, selected_categories, filter_restaurant_ids, start_date, end_date, filter_statuses
+                )
+                if order_summary is not None:
+                    refiner.submit(refine_key, exact_summary)
+                    span.set(aproximado=order_summary['aproximado']['amostra'])
+                else:
+                    refine_key = None
+        if order_summary is None and status_values:
+            order_summary = exact_summary()
+    else:
+        span.frame(df_pedidos)
+        order_summary = cached_order_summary(
+            loaded_version(db, 'pedidos', order_store.frame), selected_categories, filter_restaurant_ids,
+            start_date, end_date, filter_statuses, lambda: summarize_orders_frame(df_pedidos)
+        ) if not df_pedidos.empty else None
+    span.set(cache='acerto' if result_cache.hits > hits_before else 'falta')
+
+if order_summary is not None and order_summary['total_pedidos'] == 0:
+    order_summary = None
+
+# Selo de valores aproximados, com os intervalos de confiança dos cards; o
+# fragmento confere o cálculo exato a cada APPROX_POLL_SECONDS e, quando ele
+# termina, refaz a página inteira com os valores exatos
+@st.fragment(run_every=APPROX_POLL_SECONDS)
+def render_approximate_badge(refine_key, aproximado):
+    if not refiner.pending(refine_key):
+        st.rerun()
+    intervalos = aproximado['intervalos']
+    faturamento, taxa, ticket = intervalos['valor_total'], intervalos['taxa_sucesso'], intervalos['ticket_medio']
+    st.markdown(
+        f'<span style="background-color: {RESTAURANT_COLORS["warning"]}; color: white; padding: 0.2rem 0.6rem; '
+        f'border-radius: 8px; font-weight: 600;">APROXIMADO</span> '
+        f"Valores estimados a partir de {aproximado['amostra']:,} pedidos de uma amostra de "
+        f"{aproximado['amostra_total']:,}; os exatos estão sendo calculados.",
+        unsafe_allow_html=True
+    )
+    st.caption(
+        f"Intervalos de 95%: faturamento R$ {faturamento[0]:,.2f} – R$ {faturamento[1]:,.2f} · "
+        f"taxa de sucesso {taxa[0]:.1f}% – {taxa[1]:.1f}% · ticket médio R$ {ticket[0]:,.2f} – R$ {ticket[1]:,.2f}"
+    )
 
 # --- DASHBOARD PRINCIPAL ---
 st.markdown("# Dashboard de Análise de Restaurantes")
 st.markdown("### Análise Completa e Inteligente dos Dados de Restaurantes")
 st.markdown("---")
 
+# --- PEDIDOS AO VIVO ---
+if LIVE_PANEL:
+    render_live_panel()
+    st.markdown("---")
+
 # --- MÉTRICAS PRINCIPAIS EM CARDS PERSONALIZADOS ---
-if not df_pedidos.empty:
+if order_summary is not None:
     # Calcular métricas
-    total_pedidos = len(df_pedidos)
-    valor_total = df_pedidos['valor_total'].sum()
-    pedidos_entregues = df_pedidos[df_pedidos['status_pedido'] == 'entregue'].shape[0]
+    total_pedidos = order_summary['total_pedidos']
+    valor_total = order_summary['valor_total']
+    pedidos_entregues = order_summary['pedidos_entregues']
     taxa_sucesso = (pedidos_entregues / total_pedidos * 100) if total_pedidos > 0 else 0
     ticket_medio = valor_total / total_pedidos if total_pedidos > 0 else 0
+    # Valores da amostra levam "≈" até o cálculo exato terminar
+    aprox = "≈ " if refine_key is not None else ""
+
+    if refine_key is not None:
+        render_approximate_badge(refine_key, order_summary['aproximado'])
 
     # Layout em 4 colunas para métricas
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        st.markdown(create_metric_card("Total de Pedidos", f"{total_pedidos:,}", ""), unsafe_allow_html=True)
+        st.markdown(create_metric_card("Total de Pedidos", f"{aprox}{total_pedidos:,}", ""), unsafe_allow_html=True)
 
     with col2:
-        st.markdown(create_metric_card("Faturamento Total", f"R$ {valor_total:,.2f}", ""), unsafe_allow_html=True)
+        st.markdown(create_metric_card("Faturamento Total", f"{aprox}R$ {valor_total:,.2f}", ""), unsafe_allow_html=True)
 
     with col3:
-        st.markdown(create_metric_card("Taxa de Sucesso", f"{taxa_sucesso:.1f}%", ""), unsafe_allow_html=True)
+        st.markdown(create_metric_card("Taxa de Sucesso", f"{aprox}{taxa_sucesso:.1f}%", ""), unsafe_allow_html=True)
 
     with col4:
-        st.markdown(create_metric_card("Ticket Médio", f"R$ {ticket_medio:.2f}", ""), unsafe_allow_html=True)
+        st.markdown(create_metric_card("Ticket Médio", f"{aprox}R$ {ticket_medio:.2f}", ""), unsafe_allow_html=True)
 
     st.markdown("---")
 else:
     st.warning("Nenhum dado de pedido encontrado para os filtros selecionados.")
 
 # --- ANÁLISE DE PEDIDOS AVANÇADA ---
-if not df_pedidos.empty:
+if order_summary is not None:
     st.markdown("## Análise Detalhada de Pedidos")
 
     # Layout em 2 colunas para gráficos
@@ -389,8 +1076,7 @@ if not df_pedidos.empty:
 
     with col1:
         # Gráfico de pizza para status dos pedidos
-        status_counts = df_pedidos['status_pedido'].value_counts().reset_index()
-        status_counts.columns = ['status', 'count']
+        status_counts = order_summary['status_counts']
 
         fig_status = px.pie(
             status_counts,
@@ -406,17 +1092,11 @@ if not df_pedidos.empty:
             hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>',
             hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
         )
-        st.plotly_chart(create_styled_chart(fig_status, 'Status dos Pedidos'), use_container_width=True)
+        render_chart(fig_status, 'Status dos Pedidos')
 
     with col2:
         # Gráfico de barras para pedidos por dia da semana
-        df_pedidos['dia_semana'] = df_pedidos['data_hora_pedido'].dt.day_name()
-        dias_ordem = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        dias_pt = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-
-        pedidos_dia = df_pedidos['dia_semana'].value_counts().reindex(dias_ordem).reset_index()
-        pedidos_dia.columns = ['dia', 'count']
-        pedidos_dia['dia_pt'] = dias_pt
+        pedidos_dia = order_summary['pedidos_dia']
 
         fig_dias = px.bar(
             pedidos_dia,
@@ -430,17 +1110,14 @@ if not df_pedidos.empty:
             hovertemplate='<b>%{x}</b><br>Pedidos: %{y}<extra></extra>',
             hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
         )
-        st.plotly_chart(create_styled_chart(fig_dias, 'Pedidos por Dia da Semana'), use_container_width=True)
+        render_chart(fig_dias, 'Pedidos por Dia da Semana')
 
     # Gráfico de evolução temporal (largura completa)
     st.markdown("### Evolução Temporal dos Pedidos")
-    df_pedidos['data'] = df_pedidos['data_hora_pedido'].dt.date
-    pedidos_tempo = df_pedidos.groupby('data').agg({
-        'valor_total': 'sum',
-        '_id': 'count'
-    }).reset_index()
-    pedidos_tempo.columns = ['data', 'faturamento', 'quantidade']
-
+    # Períodos longos passam para resolução semanal/mensal (pontos limitados)
+    pedidos_tempo, resolucao_tempo = downsample_totals(order_summary['pedidos_tempo'], 'data', ['faturamento', 'quantidade'])
+    if resolucao_tempo != 'dia':
+        st.caption(f"Série agregada por {resolucao_tempo} para o período selecionado")
     fig_tempo = make_subplots(specs=[[{"secondary_y": True}]])
     fig_tempo.add_trace(
         go.Scatter(
@@ -467,23 +1144,25 @@ if not df_pedidos.empty:
     fig_tempo.update_xaxes(title_text="Data")
     fig_tempo.update_yaxes(title_text="Quantidade de Pedidos", secondary_y=False)
     fig_tempo.update_yaxes(title_text="Faturamento (R$)", secondary_y=True)
-    st.plotly_chart(create_styled_chart(fig_tempo, 'Evolução Temporal: Pedidos vs Faturamento', 400), use_container_width=True)
+    render_chart(fig_tempo, 'Evolução Temporal: Pedidos vs Faturamento', 400)
+
+    render_hour_weekday_section(order_summary, df_restaurantes, df_pedidos, start_date, end_date, filter_statuses)
     st.markdown("---")
 
 # --- ANÁLISE DE RESTAURANTES ---
-if not df_pedidos.empty:
+if order_summary is not None:
     st.markdown("## Performance dos Restaurantes")
 
     if not df_restaurantes.empty:
-        df_rest_pedidos = pd.merge(df_pedidos, df_restaurantes[['_id', 'nome', 'categorias']],
-                                 left_on='restaurante_id', right_on='_id', how='left')
+        top_rest_faturamento, cozinha_faturamento = restaurant_performance(
+            df_restaurantes, loaded_version(db, 'restaurantes', df_restaurantes), order_summary['por_restaurante']
+        )
 
         # Layout em 2 colunas
         col1, col2 = st.columns(2)
 
         with col1:
             # Top restaurantes por faturamento
-            top_rest_faturamento = df_rest_pedidos.groupby('nome')['valor_total'].sum().sort_values(ascending=False).head(10).reset_index()
             fig_top_rest = px.bar(
                 top_rest_faturamento,
                 x='valor_total',
@@ -498,14 +1177,11 @@ if not df_pedidos.empty:
                 hovertemplate='<b>%{y}</b><br>Faturamento: R$ %{x:,.2f}<extra></extra>',
                 hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
             )
-            st.plotly_chart(create_styled_chart(fig_top_rest, 'Top Restaurantes - Faturamento'), use_container_width=True)
+            render_chart(fig_top_rest, 'Top Restaurantes - Faturamento')
 
         with col2:
             # Faturamento por categoria
-            if 'categorias' in df_rest_pedidos.columns and not df_rest_pedidos['categorias'].isnull().all():
-                df_exploded = df_rest_pedidos.explode('categorias')
-                cozinha_faturamento = df_exploded.groupby('categorias')['valor_total'].sum().reset_index()
-
+            if cozinha_faturamento is not None:
                 fig_cozinha = px.pie(
                     cozinha_faturamento,
                     names='categorias',
@@ -517,60 +1193,64 @@ if not df_pedidos.empty:
                     hovertemplate='<b>%{label}</b><br>Faturamento: R$ %{value:,.2f}<br>Percentual: %{percent}<extra></extra>',
                     hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
                 )
-                st.plotly_chart(create_styled_chart(fig_cozinha, 'Tipos de Cozinha'), use_container_width=True)
+                render_chart(fig_cozinha, 'Tipos de Cozinha')
             else:
                 st.info("Coluna 'categorias' não disponível ou sem dados para análise.")
     else:
         st.warning("Nenhum dado de restaurantes encontrado para análise de performance.")
 
+# --- MAPA DE CALOR DE PEDIDOS ---
+if order_summary is not None:
+    st.markdown("## Mapa de Calor de Pedidos")
+    render_order_map_section((filter_restaurant_ids, start_date, end_date, filter_statuses))
+    st.markdown("---")
+
 # --- ANÁLISE DE AVALIAÇÕES ---
 st.markdown("---")
 st.markdown("## Análise de Avaliações e Satisfação")
-df_avaliacoes = all_data.get('avaliacoes', pd.DataFrame()).copy()
+df_avaliacoes = load_section(db, 'avaliacoes')
 
 if not df_avaliacoes.empty:
-    df_avaliacoes['data_avaliacao'] = pd.to_datetime(df_avaliacoes['data_avaliacao'])
+    # Não depende dos filtros: recalculado só quando as avaliações mudam
+    review_data = review_section_data(df_avaliacoes, loaded_version(db, 'avaliacoes', df_avaliacoes))
 
     # Métricas de avaliação em 3 colunas
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        nota_media = df_avaliacoes['nota'].mean()
-        st.metric(label="Nota Média Geral", value=f"{nota_media:.2f}")
+        st.metric(label="Nota Média Geral", value=f"{review_data['nota_media']:.2f}")
 
     with col2:
-        total_avaliacoes = len(df_avaliacoes)
-        st.metric(label="Total de Avaliações", value=f"{total_avaliacoes:,}")
+        st.metric(label="Total de Avaliações", value=f"{review_data['total_avaliacoes']:,}")
 
     with col3:
-        avaliacoes_positivas = df_avaliacoes[df_avaliacoes['nota'] >= 4].shape[0]
-        taxa_satisfacao = (avaliacoes_positivas / total_avaliacoes * 100) if total_avaliacoes > 0 else 0
-        st.metric(label="Taxa de Satisfação", value=f"{taxa_satisfacao:.1f}%")
+        st.metric(label="Taxa de Satisfação", value=f"{review_data['taxa_satisfacao']:.1f}%")
 
     # Gráficos de avaliação em 2 colunas
     col1, col2 = st.columns(2)
 
     with col1:
-        # Histograma de notas
-        fig_notas = px.histogram(
-            df_avaliacoes,
+        # Histograma de notas (contagem por nota feita no servidor)
+        distribuicao_notas = review_data['distribuicao_notas']
+        fig_notas = px.bar(
+            distribuicao_notas,
             x='nota',
-            nbins=5,
+            y='quantidade',
             title='Distribuição das Notas',
             color_discrete_sequence=[RESTAURANT_COLORS['primary']]
         )
+        fig_notas.update_layout(bargap=0, yaxis_title='count')
         fig_notas.update_traces(
             marker_line_width=2,
             marker_line_color="white",
             hovertemplate='<b>Nota: %{x}</b><br>Quantidade: %{y}<extra></extra>',
             hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
         )
-        st.plotly_chart(create_styled_chart(fig_notas, 'Distribuição de Notas'), use_container_width=True)
+        render_chart(fig_notas, 'Distribuição de Notas')
 
     with col2:
-        # Evolução temporal das notas
-        df_avaliacoes['mes_ano'] = df_avaliacoes['data_avaliacao'].dt.to_period('M').astype(str)
-        avaliacoes_tempo = df_avaliacoes.groupby('mes_ano')['nota'].mean().reset_index()
+        # Evolução temporal das notas (mensal; trimestral/anual em históricos longos)
+        avaliacoes_tempo = review_data['avaliacoes_tempo']
 
         fig_aval_tempo = px.line(
             avaliacoes_tempo,
@@ -586,37 +1266,42 @@ if not df_avaliacoes.empty:
             hovertemplate='<b>Período: %{x}</b><br>Nota Média: %{y:.2f}<extra></extra>',
             hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
         )
-        st.plotly_chart(create_styled_chart(fig_aval_tempo, 'Evolução das Avaliações'), use_container_width=True)
+        render_chart(fig_aval_tempo, 'Evolução das Avaliações')
 else:
     st.warning("Nenhum dado de avaliação encontrado.")
 
 # --- ANÁLISE DE PRATOS ---
 st.markdown("---")
 st.markdown("## Análise do Cardápio e Pratos")
-df_pratos = all_data.get('pratos', pd.DataFrame()).copy()
+df_pratos = load_section(db, 'pratos')
 
 if not df_pratos.empty:
+    # Não depende dos filtros: recalculado só quando os pratos mudam
+    faixas_preco, top_pratos_caros = dish_section_data(df_pratos, loaded_version(db, 'pratos', df_pratos))
+
     # Layout em 2 colunas para análise de pratos
     col1, col2 = st.columns(2)
     
     with col1:
-        # Distribuição de preços 
-        fig_precos = px.histogram(
-            df_pratos, 
-            x='preco', 
-            nbins=20,
-            title='Distribuição de Preços dos Pratos', 
-            color_discrete_sequence=['#E3B778'] 
+        # Distribuição de preços (faixas e contagens calculadas no servidor)
+        fig_precos = px.bar(
+            faixas_preco,
+            x='centro',
+            y='quantidade',
+            custom_data=['inicio', 'fim'],
+            title='Distribuição de Preços dos Pratos',
+            color_discrete_sequence=['#E3B778']
         )
+        fig_precos.update_layout(bargap=0, xaxis_title='preco', yaxis_title='count')
         fig_precos.update_traces(
-            hovertemplate='<b>Faixa de Preço: R$ %{x:.2f}</b><br>Quantidade de pratos: %{y}<extra></extra>',
+            width=(faixas_preco['fim'] - faixas_preco['inicio']).tolist(),
+            hovertemplate='<b>Faixa de Preço: R$ %{customdata[0]:.2f} - R$ %{customdata[1]:.2f}</b><br>Quantidade de pratos: %{y}<extra></extra>',
             hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
         )
-        st.plotly_chart(create_styled_chart(fig_precos, 'Distribuição de Preços dos Pratos'), use_container_width=True)
+        render_chart(fig_precos, 'Distribuição de Preços dos Pratos')
     
     with col2:
         # Top pratos mais caros
-        top_pratos_caros = df_pratos.nlargest(10, 'preco')
         fig_caros = px.bar(
             top_pratos_caros, 
             x='preco', 
@@ -631,10 +1316,70 @@ if not df_pratos.empty:
             hovertemplate='<b>%{y}</b><br>Preço: R$ %{x:.2f}<extra></extra>',
             hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
         )
-        st.plotly_chart(create_styled_chart(fig_caros, 'Pratos Mais Caros'), use_container_width=True)
+        render_chart(fig_caros, 'Pratos Mais Caros')
+
+    # Pratos mais vendidos nos pedidos filtrados (itens dos pedidos x cardápio)
+    if order_summary is not None:
+        with profiler.span("pratos mais vendidos") as span:
+            hits_before = result_cache.hits
+            pratos_vendidos = cached_dish_rankings(
+                selected_categories, filter_restaurant_ids, start_date, end_date, filter_statuses
+            )
+            span.set(cache='acerto' if result_cache.hits > hits_before else 'falta')
+
+        if not pratos_vendidos['quantidade'].empty:
+            col1, col2 = st.columns(2)
+
+            with col1:
+                fig_vendidos = px.bar(
+                    pratos_vendidos['quantidade'],
+                    x='quantidade',
+                    y='nome',
+                    orientation='h',
+                    title='Top 10 Pratos Mais Vendidos',
+                    color='quantidade',
+                    color_continuous_scale=[[0, RESTAURANT_COLORS['secondary']], [1, RESTAURANT_COLORS['primary']]],
+                    custom_data=['pedidos']
+                )
+                fig_vendidos.update_layout(yaxis={'categoryorder':'total ascending'})
+                fig_vendidos.update_traces(
+                    hovertemplate='<b>%{y}</b><br>Unidades vendidas: %{x:,}<br>Pedidos: %{customdata[0]:,}<extra></extra>',
+                    hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
+                )
+                render_chart(fig_vendidos, 'Pratos Mais Vendidos')
+
+            with col2:
+                fig_fat_pratos = px.bar(
+                    pratos_vendidos['faturamento'],
+                    x='faturamento',
+                    y='nome',
+                    orientation='h',
+                    title='Top 10 Pratos por Faturamento',
+                    color='faturamento',
+                    color_continuous_scale=[[0, RESTAURANT_COLORS['warning']], [1, RESTAURANT_COLORS['success']]],
+                    custom_data=['quantidade']
+                )
+                fig_fat_pratos.update_layout(yaxis={'categoryorder':'total ascending'})
+                fig_fat_pratos.update_traces(
+                    hovertemplate='<b>%{y}</b><br>Faturamento: R$ %{x:,.2f}<br>Unidades vendidas: %{customdata[0]:,}<extra></extra>',
+                    hoverlabel=dict(bgcolor="rgba(0,0,0,0.85)", font_color="white", font_size=14, bordercolor="white")
+                )
+                render_chart(fig_fat_pratos, 'Pratos por Faturamento')
 else:
     st.warning("Nenhum dado de pratos encontrado.")
 
+# --- DIAGNÓSTICO (DEBUG) ---
+if DEBUG:
+    with st.sidebar.expander("Memória dos dados em cache"):
+        memory_report = frame_memory_report({
+            'pedidos': order_store.frame if order_store is not None else None,
+            'restaurantes': load_section(db, 'restaurantes'),
+            'avaliacoes': load_section(db, 'avaliacoes'),
+            'pratos': load_section(db, 'pratos'),
+        })
+        st.dataframe(memory_report, hide_index=True, use_container_width=True)
+        st.caption("'antes' estima o frame com ids e status como strings e números em float64")
+
 # --- RODAPÉ INFORMATIVO ---
 st.markdown("---")
 st.markdown("### Informações do Sistema")
@@ -646,7 +1391,7 @@ with col1:
     st.markdown("""
     <div class="info-card">
         <h4>Atualização</h4>
-        <p>Dados atualizados a cada 10 minutos</p>
+        <p>Dados atualizados a cada 10 minutos; pedidos ao vivo a cada poucos segundos</p>
     </div>
     """, unsafe_allow_html=True)
 
@@ -671,4 +1416,36 @@ st.markdown("""
 <div style="text-align: center; color: #666; font-style: italic; margin-top: 2rem;">
     Dashboard desenvolvido para análise inteligente de dados de restaurantes<br>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+# --- DESEMPENHO POR ETAPA (PROFILE) ---
+if PROFILE:
+    with st.sidebar.expander("Desempenho desta execução"):
+        st.metric(label="Tempo total do script", value=f"{profiler.total_ms():,.0f} ms")
+        st.dataframe(profiler.to_frame(), hide_index=True, use_container_width=True)
+        st.caption("Etapas com ~0 ms vieram do cache; 'gráfico' inclui a serialização da figura")
+
+if PROFILE:
+    with st.sidebar.expander("Cache de resultados"):
+        cache_stats = result_cache.stats()
+        col1, col2 = st.columns(2)
+        col1.metric(label="Acertos", value=f"{cache_stats['acertos']:,}")
+        col2.metric(label="Faltas", value=f"{cache_stats['faltas']:,}")
+        taxa_acerto = cache_stats['taxa_acerto']
+        st.caption(
+            f"Taxa de acerto: {'-' if taxa_acerto is None else f'{taxa_acerto:.0%}'} · "
+            f"{cache_stats['entradas']} resultados, {cache_stats['bytes'] / 1024 / 1024:,.1f} de "
+            f"{cache_stats['limite_bytes'] / 1024 / 1024:,.0f} MB · "
+            f"{cache_stats['descartes_lru']} descartes (LRU), {cache_stats['invalidacoes']} invalidações"
+        )
+
+# Plano (explain) das consultas lentas registradas pelo listener do driver
+mongo.explain_slow_queries()
+if PROFILE:
+    with st.sidebar.expander("Consultas lentas no MongoDB"):
+        slow_queries = mongo.slow_log.to_records()
+        if slow_queries:
+            st.dataframe(pd.DataFrame(slow_queries[::-1]), hide_index=True, use_container_width=True)
+        else:
+            st.caption(f"Nenhuma consulta acima de {mongo.slow_log.threshold_ms} ms")
+section_prefetcher.shutdown()
+profiler.export(PROFILE_TRACE_FILE)
@@ -0,0 +1,93 @@
+# Benchmark do decodificador colunar contra o caminho atual
+# (find + process_record + pd.DataFrame de lista de dicts).
+#
+# Uso:
+#   python benchmarks/bench_decoder.py --orders 200000
+#
+# Os pedidos são gerados em memória e codificados em lotes de BSON bruto, no
+# mesmo formato devolvido por find_raw_batches; não é preciso um MongoDB.
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+import bson
+import pandas as pd
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.decoder import decode_raw_batches, process_record  # noqa: E402
+from dashboard.loaders import SECTION_SOURCES  # noqa: E402
+
+STATUS = ['entregue', 'entregue', 'entregue', 'cancelado', 'em_preparo', 'a_caminho']
+
+
+# Gera lotes de BSON bruto com pedidos sintéticos
+def build_raw_batches(n_orders, batch_size, n_restaurants=500, seed=42):
+    rng = random.Random(seed)
+    restaurants = [ObjectId() for _ in range(n_restaurants)]
+    base = datetime.datetime(2023, 1, 1)
+    batches, current = [], []
+    for _ in range(n_orders):
+        current.append(bson.encode({
+            '_id': ObjectId(),
+            'restaurante_id': rng.choice(restaurants),
+            'status_pedido': rng.choice(STATUS),
+            'valor_total': round(rng.uniform(15, 300), 2),
+            'data_hora_pedido': base + datetime.timedelta(minutes=rng.randrange(60 * 24 * 730)),
+        }))
+        if len(current) == batch_size:
+            batches.append(b''.join(current))
+            current = []
+    if current:
+        batches.append(b''.join(current))
+    return batches
+
+
+# Caminho atual: documentos decodificados em dicts, walk recursivo e DataFrame linha a linha
+def decode_legacy(raw_batches):
+    records = []
+    for raw_batch in raw_batches:
+        records.extend(bson.decode_all(raw_batch))
+    return pd.DataFrame([process_record(record) for record in records])
+
+
+def _time(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do decodificador colunar')
+    parser.add_argument('--orders', type=int, default=200_000)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    raw_batches = build_raw_batches(args.orders, args.batch_size)
+    fields = SECTION_SOURCES['pedidos'].fields
+
+    legacy_time, legacy_df = _time(lambda: decode_legacy(raw_batches), args.repeat)
+    columnar_time, columnar_df = _time(lambda: decode_raw_batches(raw_batches, fields), args.repeat)
+
+    legacy_bytes = legacy_df.memory_usage(deep=True).sum()
+    columnar_bytes = columnar_df.memory_usage(deep=True).sum()
+
+    print(f"pedidos: {args.orders:,} em lotes de {args.batch_size:,}")
+    print(f"{'caminho':<22}{'tempo (s)':>12}{'memória (MB)':>16}")
+    print(f"{'process_record':<22}{legacy_time:>12.3f}{legacy_bytes / 1e6:>16.1f}")
+    print(f"{'colunar':<22}{columnar_time:>12.3f}{columnar_bytes / 1e6:>16.1f}")
+    print(f"ganho: {legacy_time / columnar_time:.1f}x no tempo, {legacy_bytes / columnar_bytes:.1f}x na memória")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# Benchmark por etapa do pipeline do dashboard, para acompanhar como o app
+# escala com o volume de pedidos. Mede:
+#   - caminho antigo: find (documentos inteiros), process_record, pd.DataFrame
+#   - caminho atual: leitura colunar das seções (uma a uma e em paralelo) e
+#     montagem do OrderStore
+#   - cada filtro da barra lateral (categorias, período, restaurantes, status)
+#   - a agregação de cada gráfico, em pandas e no $facet do servidor
+#
+# Uso:
+#   python benchmarks/synthetic.py --orders 1m
+#   python benchmarks/bench_pipeline.py --orders 1m
+#   python benchmarks/bench_pipeline.py --mock --orders 100k   (gera a base em memória)
+#   python benchmarks/bench_pipeline.py --orders 1m --compare benchmarks/results/<arquivo>.json
+#
+# Cada execução grava um JSON em benchmarks/results com os tempos e o commit,
+# para comparar versões do código sobre a mesma base.
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.decoder import fetch_columnar, process_record  # noqa: E402
+from dashboard.dimensions import RestaurantDimension  # noqa: E402
+from dashboard.loaders import SECTION_SOURCES  # noqa: E402
+from dashboard.order_store import OrderStore  # noqa: E402
+from dashboard.prefetch import fetch_concurrently  # noqa: E402
+from dashboard.queries import aggregate_order_summary, build_order_match, summarize_orders_frame  # noqa: E402
+from synthetic import DEFAULT_DB_NAME, SIZES, connect, generate, parse_orders  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class StageTimer:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    # Executa a etapa `repeat` vezes e guarda o melhor tempo
+    def run(self, group, name, func):
+        best, result = None, None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        rows = len(result) if hasattr(result, '__len__') and not isinstance(result, (dict, tuple)) else None
+        self.results.append({'grupo': group, 'etapa': name, 'segundos': best, 'linhas': rows})
+        print(f"  {group:<10}{name:<44}{best:>10.4f}s" + (f"{rows:>12,}" if rows is not None else ''))
+        return result
+
+
+# Caminho antigo: coleção inteira em dicts, walk recursivo e DataFrame linha a linha
+def bench_legacy(timer, db):
+    for section in ('pedidos', 'restaurantes'):
+        collection = SECTION_SOURCES[section].collection
+        documents = timer.run('antigo', f"find {collection}", lambda: list(db[collection].find({})))
+        records = timer.run('antigo', f"process_record {collection}", lambda: [process_record(d) for d in documents])
+        timer.run('antigo', f"DataFrame {collection}", lambda: pd.DataFrame(records))
+        del documents, records
+
+
+# Caminho atual: projeção declarada por seção e decodificação colunar
+def bench_fetch(timer, db):
+    frames = {}
+    for section, source in SECTION_SOURCES.items():
+        frames[section] = timer.run(
+            'leitura', f"colunar {section}", lambda source=source: fetch_columnar(db[source.collection], source.fields)
+        )
+    timer.run('leitura', 'colunar todas as seções em paralelo', lambda: fetch_concurrently({
+        section: lambda source=source: fetch_columnar(db[source.collection], source.fields)
+        for section, source in SECTION_SOURCES.items()
+    }))
+    store = timer.run('leitura', 'OrderStore (ordenação por data)', lambda: OrderStore(frames['pedidos']))
+    dimension = timer.run('leitura', 'RestaurantDimension', lambda: RestaurantDimension(frames['restaurantes']))
+    return frames, store, dimension
+
+
+# Filtros da barra lateral, na mesma ordem do app
+def bench_filters(timer, store, dimension, frames):
+    pedidos = store.frame
+    categorias = dimension.categories[:2]
+    order_codes = timer.run('filtros', 'códigos de restaurante dos pedidos',
+                            lambda: dimension.order_codes(pedidos['restaurante_id']))
+    selected = dimension.codes_for_categories(categorias)
+    timer.run('filtros', f"categorias {categorias}", lambda: pedidos[dimension.order_mask(order_codes, selected)])
+
+    start, end = store.date_bounds()
+    window_start = max(start, end - datetime.timedelta(days=90))
+    periodo = timer.run('filtros', 'período (últimos 90 dias)', lambda: store.slice_dates(window_start, end))
+
+    restaurant_ids = frames['restaurantes']['_id'].astype(str).head(5).tolist()
+    timer.run('filtros', 'restaurantes (5)', lambda: periodo[periodo['restaurante_id'].isin(restaurant_ids)])
+    timer.run('filtros', "status ['entregue']", lambda: periodo[periodo['status_pedido'].isin(['entregue'])])
+
+
+# Agregação de cada gráfico em pandas, sobre todos os pedidos
+def bench_charts(timer, store, frames):
+    pedidos = store.frame
+    timer.run('gráficos', 'resumo completo (summarize_orders_frame)', lambda: summarize_orders_frame(pedidos))
+    timer.run('gráficos', 'status dos pedidos', lambda: pedidos['status_pedido'].value_counts())
+    timer.run('gráficos', 'pedidos por dia da semana',
+              lambda: pedidos['data_hora_pedido'].dt.day_name().value_counts())
+    timer.run('gráficos', 'evolução diária', lambda: pedidos.groupby(pedidos['data_hora_pedido'].dt.date).agg(
+        faturamento=('valor_total', 'sum'), quantidade=('valor_total', 'size')))
+
+    restaurantes = frames['restaurantes'].assign(_id=frames['restaurantes']['_id'].astype(str))
+
+    def por_restaurante():
+        soma = pedidos.groupby('restaurante_id', observed=True)['valor_total'].sum().reset_index()
+        soma['restaurante_id'] = soma['restaurante_id'].astype(str)
+        merged = soma.merge(restaurantes, left_on='restaurante_id', right_on='_id', how='left')
+        return merged.explode('categorias').groupby('categorias')['valor_total'].sum()
+    timer.run('gráficos', 'faturamento por restaurante/cozinha', por_restaurante)
+
+    dimension = RestaurantDimension(frames['restaurantes'])
+
+    def por_restaurante_codigos():
+        soma = pedidos.groupby('restaurante_id', observed=True)['valor_total'].sum()
+        valores, presentes = dimension.values_by_code(soma.index.astype(str), soma.to_numpy())
+        return dimension.top_names(valores, presentes), dimension.category_frame(valores, presentes)
+    timer.run('gráficos', 'faturamento por restaurante/cozinha (códigos + CSR)', por_restaurante_codigos)
+
+    avaliacoes = frames['avaliacoes']
+    timer.run('gráficos', 'nota média por mês', lambda: avaliacoes.groupby(
+        avaliacoes['data_avaliacao'].dt.to_period('M').astype(str))['nota'].mean())
+    pratos = frames['pratos']
+    timer.run('gráficos', 'preços dos pratos (histograma + top 10)',
+              lambda: (np.histogram(pratos['preco'].dropna(), bins=20), pratos.nlargest(10, 'preco')))
+
+
+# Mesmo resumo respondido pelo $facet no servidor
+def bench_server(timer, db, store):
+    collection = db[SECTION_SOURCES['pedidos'].collection]
+    timer.run('servidor', '$facet sem filtros', lambda: aggregate_order_summary(collection, build_order_match()))
+    start, end = store.date_bounds()
+    window_start = max(start, end - datetime.timedelta(days=90))
+    timer.run('servidor', '$facet últimos 90 dias',
+              lambda: aggregate_order_summary(collection, build_order_match(None, window_start, end)))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Compara com uma execução anterior (razão > 1 = mais lento agora)
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['grupo'], r['etapa']): r['segundos'] for r in json.load(f)['resultados']}
+    print(f"\ncomparação com {baseline_path}")
+    print(f"  {'etapa':<56}{'antes':>10}{'agora':>10}{'razão':>8}")
+    for r in results:
+        before = baseline.get((r['grupo'], r['etapa']))
+        if before:
+            print(f"  {r['grupo'] + ' / ' + r['etapa']:<56}{before:>10.4f}{r['segundos']:>10.4f}"
+                  f"{r['segundos'] / before:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark por etapa do pipeline do dashboard')
+    parser.add_argument('--orders', type=parse_orders, default=SIZES['100k'],
+                        help='volume esperado na base (ou gerado, com --mock/--generate)')
+    parser.add_argument('--uri', default=os.environ.get('MONGODB_URI'))
+    parser.add_argument('--db', default=DEFAULT_DB_NAME)
+    parser.add_argument('--mock', action='store_true', help='gera a base em mongomock (implica --generate)')
+    parser.add_argument('--generate', action='store_true', help='regera a base sintética antes de medir')
+    parser.add_argument('--skip-legacy', action='store_true', help='não mede o caminho antigo (lento em 10M)')
+    parser.add_argument('--skip-server', action='store_true', help='não mede o $facet no servidor')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=RESULTS_DIR)
+    parser.add_argument('--compare', help='JSON de uma execução anterior')
+    args = parser.parse_args()
+
+    db = connect(args.uri, args.db, args.mock)
+    if args.mock or args.generate:
+        generate(db, args.orders)
+    n_orders = db[SECTION_SOURCES['pedidos'].collection].estimated_document_count()
+    if not n_orders:
+        raise SystemExit(f"Base {args.db} vazia: rode benchmarks/synthetic.py antes ou use --generate")
+    backend = 'mongomock' if args.mock else 'mongod'
+    print(f"{n_orders:,} pedidos em {backend}/{args.db}")
+
+    timer = StageTimer(args.repeat)
+    if not args.skip_legacy:
+        bench_legacy(timer, db)
+    frames, store, dimension = bench_fetch(timer, db)
+    bench_filters(timer, store, dimension, frames)
+    bench_charts(timer, store, frames)
+    if not args.skip_server:
+        bench_server(timer, db, store)
+
+    os.makedirs(args.output, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(args.output, f"pipeline-{backend}-{n_orders}-{stamp}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'data': stamp,
+            'backend': backend,
+            'pedidos': n_orders,
+            'repeticoes': args.repeat,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'resultados': timer.results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\nresultados gravados em {path}")
+    if args.compare:
+        compare(timer.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+# Teste de carga com sessões simultâneas do dashboard: N sessões headless
+# (AppTest do Streamlit) rodam o app.py contra uma base sintética e, a cada
+# rerun, trocam um filtro da barra lateral ao acaso (categorias, período,
+# restaurantes ou status). Mede:
+#   - tempo de rerun (p50/p95/p99) visto pela sessão e o tempo total do script
+#   - taxa de acerto do cache de resultados e leituras no MongoDB por rerun,
+#     a partir do trace de etapas do profiler (PROFILE_TRACE_FILE)
+#   - RSS dos processos, a memória a mais por sessão aberta e o tamanho dos
+#     caches do Streamlit (st.cache_data / st.cache_resource)
+#
+# Uso:
+#   python benchmarks/load_test.py --mock --orders 20000 --sessions 20 --reruns 10
+#   python benchmarks/load_test.py --uri mongodb://localhost:27017 --sessions 50 --concurrency 8
+#
+# Como num servidor do Streamlit, as --concurrency sessões simultâneas rodam
+# em threads do mesmo processo, cada uma com a sua execução do script (thread e
+# contexto de execução próprios), e disputam o mesmo estado compartilhado:
+# st.cache_resource, st.cache_data, o cache de resultados, o prefetch das seções
+# e o OrderStore. O AppTest troca o estado global do Streamlit (Runtime,
+# secrets, config) a cada execução; aqui esse estado é instalado uma vez por
+# processo e as sessões só rodam o script. --processes reparte as sessões entre
+# processos quando um só não dá conta (como réplicas do servidor); cada um se
+# aquece antes das suas sessões, e o que cada sessão guarda (estado, árvore de
+# elementos, cópias dos frames devolvidas pelo st.cache_data) aparece no RSS.
+# Com --uri o app lê o banco restaurante_reviews_db já populado desse servidor;
+# com --mock cada processo gera a mesma base (mesma semente) em memória.
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+from urllib import parse
+
+import numpy as np
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import RESULTS_DIR, git_commit  # noqa: E402
+from synthetic import connect, generate, parse_orders  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+APP_DB_NAME = 'restaurante_reviews_db'
+FILTER_ACTIONS = ('categorias', 'periodo', 'restaurantes', 'status')
+
+
+# RSS atual do processo (Linux); fora dele, o pico informado pelo getrusage
+def rss_bytes():
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(max(values))}
+
+
+def _widget(widgets, label):
+    return next((widget for widget in widgets if widget.label == label), None)
+
+
+# Estado global do Streamlit, instalado uma vez por processo para todas as
+# sessões: Runtime, secrets e a config de teste. O patch da config fica
+# guardado aqui para não ser desfeito
+_shared_runtime = {}
+
+
+def install_shared_runtime(secrets):
+    import streamlit as st
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    shared_secrets = Secrets([])
+    shared_secrets._secrets = dict(secrets)
+    st.secrets = shared_secrets
+    config = patch_config_options({'global.appTest': True})
+    config.__enter__()
+    _shared_runtime.update(runtime=runtime, secrets=shared_secrets, config=config)
+
+
+# AppTest que só roda o script, sem trocar o estado global a cada execução
+# (install_shared_runtime), para várias sessões rodarem ao mesmo tempo no mesmo
+# processo; cada sessão tem o seu session_id, como no servidor
+class ConcurrentAppTest(AppTest):
+    def _run(self, widget_state=None, timeout=None):
+        if timeout is None:
+            timeout = self.default_timeout
+        runner = LocalScriptRunner(self._script_path, self.session_state,
+                                   PagesManager(self._script_path, setup_watcher=False),
+                                   args=self.args, kwargs=self.kwargs)
+        runner._session_id = self.session_id
+        self._tree = runner.run(widget_state, self.query_params, timeout, self._page_hash)
+        self._tree._runner = self
+        # O último evento é o SHUTDOWN, que traz a query string da execução
+        self.query_params = parse.parse_qs(runner.event_data[-1]['client_state'].query_string)
+        return self
+
+
+# Uma sessão headless do dashboard; cada rerun aplica uma troca de filtro aleatória
+class DashboardSession:
+    def __init__(self, index, seed, timeout, think_seconds=0.0):
+        self.index = index
+        self.rng = random.Random(seed)
+        self.app = ConcurrentAppTest(APP_PATH, default_timeout=timeout)
+        self.app.session_id = f'sessao-{index}'
+        self.think_seconds = think_seconds
+        # (ação, ms do rerun)
+        self.timings = []
+        self.actions = collections.Counter()
+        self.errors = []
+
+    def _run(self, action, change=None):
+        start = time.perf_counter()
+        if change is None:
+            self.app.run()
+        else:
+            change.run()
+        self.timings.append((action, (time.perf_counter() - start) * 1000))
+        self.actions[action] += 1
+        for exception in self.app.exception:
+            self.errors.append(f"{action}: {exception.message}")
+        for error in self.app.error:
+            self.errors.append(f"{action}: {error.value}")
+
+    def start(self):
+        self._run('inicial')
+
+    # Escolhe um filtro presente na barra lateral e troca o seu valor (depois
+    # de um tempo de leitura aleatório, como um gerente olhando os gráficos)
+    def rerun_with_random_filter(self):
+        if self.think_seconds:
+            time.sleep(self.rng.uniform(0, self.think_seconds))
+        sidebar = self.app.sidebar
+        available = [action for action in FILTER_ACTIONS if self._filter_widget(sidebar, action) is not None]
+        if not available:
+            self._run('rerun')
+            return
+        action = self.rng.choice(available)
+        widget = self._filter_widget(sidebar, action)
+        self._run(action, widget.set_value(self._random_value(action, widget)))
+
+    def _filter_widget(self, sidebar, action):
+        if action == 'periodo':
+            return _widget(sidebar.date_input, 'Período de Análise')
+        label = {'categorias': 'Categorias de Restaurantes', 'restaurantes': 'Restaurantes',
+                 'status': 'Status dos Pedidos'}[action]
+        return _widget(sidebar.multiselect, label)
+
+    def _random_value(self, action, widget):
+        rng = self.rng
+        if action == 'periodo':
+            first, last = widget.min, widget.max
+            days = (last - first).days
+            start = first + datetime.timedelta(days=rng.randint(0, days))
+            # Metade das trocas volta ao período inteiro (a visão mais comum)
+            if rng.random() < 0.5:
+                return first, last
+            return start, min(last, start + datetime.timedelta(days=rng.choice((7, 30, 90, 365))))
+        options = [option for option in widget.options if option != 'Todos']
+        if action == 'categorias':
+            return rng.sample(options, k=min(len(options), rng.randint(0, 2)))
+        if not options or rng.random() < 0.4:
+            return ['Todos']
+        return rng.sample(options, k=min(len(options), rng.randint(1, 3)))
+
+
+# Reruns, acertos do cache de resultados e leituras no MongoDB, dos traces de
+# etapas (um arquivo por processo)
+def summarize_trace(paths):
+    totals, cache, mongo_reads = [], collections.Counter(), []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        for record in records:
+            totals.append(record['total_ms'])
+            reads = 0
+            for span in record['etapas']:
+                if 'cache' in span:
+                    cache[(span['etapa'], span['cache'])] += 1
+                # Etapas "mongo: ..." só rodam quando o st.cache_data não tem a leitura
+                if span['etapa'].startswith('mongo:'):
+                    reads += 1
+            mongo_reads.append(reads)
+    by_stage = {}
+    for stage in sorted({stage for stage, _ in cache}):
+        hits, misses = cache[(stage, 'acerto')], cache[(stage, 'falta')]
+        by_stage[stage] = {'acertos': hits, 'faltas': misses,
+                           'taxa_acerto': hits / (hits + misses) if hits + misses else None}
+    return {
+        'script_ms': percentiles(totals),
+        'cache_resultados': by_stage,
+        'leituras_mongo_por_rerun': float(np.mean(mongo_reads)) if mongo_reads else None,
+    }
+
+
+# Bytes guardados nos caches do Streamlit, por função em cache
+def streamlit_cache_bytes():
+    from streamlit.runtime.caching import get_data_cache_stats_provider, get_resource_cache_stats_provider
+    sizes = collections.Counter()
+    for provider in (get_data_cache_stats_provider(), get_resource_cache_stats_provider()):
+        try:
+            stats = provider.get_stats()
+        except ValueError:
+            # O st.cache_resource mede os objetos com o pympler, que não sabe
+            # medir alguns arrays do numpy; fica de fora do relatório
+            continue
+        for stat in stats:
+            sizes[f"{stat.category_name}:{stat.cache_name}"] += stat.byte_length
+    return dict(sizes.most_common())
+
+
+# O mongomock não implementa $geoWithin: com --mock, o recorte do mapa (sempre
+# um retângulo) vira intervalos de longitude e latitude
+def use_box_geo_match():
+    import dashboard.geo as geo
+    geo_match = geo.geo_match
+
+    def box_match(match, bounds=None, location_field=geo.DEFAULT_ORDER_LOCATION_FIELD):
+        if bounds is None:
+            return geo_match(match, location_field=location_field)
+        min_lon, min_lat, max_lon, max_lat = bounds
+        coordinates = f"{location_field}.coordinates"
+        return dict(match, **{
+            f"{coordinates}.0": {'$gte': min_lon, '$lte': max_lon},
+            f"{coordinates}.1": {'$gte': min_lat, '$lte': max_lat},
+        })
+    geo.geo_match = box_match
+
+
+def run_session(session, reruns):
+    session.start()
+    for _ in range(reruns):
+        session.rerun_with_random_filter()
+    return session
+
+
+# Um processo de sessões: base (gerada em memória com --mock), estado do
+# Streamlit compartilhado (trace e snapshot por processo) e uma sessão de
+# aquecimento que enche os caches, como o primeiro gerente do dia. Depois
+# roda as suas sessões, `concurrency` de cada vez em threads, e as mantém
+# abertas até o fim para a medida do RSS
+def run_process(indices, secrets, mock, orders, seed, timeout, concurrency, reruns, think_seconds):
+    if mock:
+        db = connect(db_name=APP_DB_NAME, mock=True)
+        generate(db, orders, seed=seed, log=lambda message: None)
+        # O app abre o MongoClient pela URI: com --mock, todas as conexões
+        # apontam para a base em memória do processo
+        import dashboard.mongo
+        dashboard.mongo.MongoClient = lambda *a, **k: db.client
+        use_box_geo_match()
+    workdir = tempfile.mkdtemp(prefix=f'load_test_{os.getpid()}_')
+    trace = os.path.join(workdir, 'trace.jsonl')
+    install_shared_runtime(dict(secrets, PROFILE_TRACE_FILE=trace, SNAPSHOT_DIR=os.path.join(workdir, 'snapshot')))
+    warmup = run_session(DashboardSession(-1, seed, timeout), 0)
+    if warmup.errors:
+        raise RuntimeError(f"A sessão de aquecimento falhou: {warmup.errors[0]}")
+    if os.path.exists(trace):
+        os.remove(trace)
+    gc.collect()
+    rss_warm = rss_bytes()
+
+    sessions = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_session, DashboardSession(index, seed + index + 1, timeout, think_seconds), reruns)
+                   for index in indices]
+        for future in concurrent.futures.as_completed(futures):
+            session = future.result()
+            sessions.append(session)
+            print(f"  sessão {session.index + 1:>3} concluída (processo {os.getpid()})", flush=True)
+    gc.collect()
+    return {
+        'pid': os.getpid(),
+        'sessoes': [{'indice': session.index, 'timings': session.timings, 'erros': session.errors}
+                    for session in sorted(sessions, key=lambda session: session.index)],
+        'trace': trace,
+        'rss_aquecido': rss_warm,
+        'rss': rss_bytes(),
+        'caches_streamlit': streamlit_cache_bytes(),
+    }
+
+
+# Memória média por processo, com todas as sessões de cada um abertas
+def summarize_memory(processes):
+    caches = collections.Counter()
+    for process in processes:
+        caches.update(process['caches_streamlit'])
+    n_sessions = sum(len(process['sessoes']) for process in processes)
+    return {
+        'processos': len(processes),
+        'rss_aquecido': float(np.mean([process['rss_aquecido'] for process in processes])),
+        'rss_final': float(np.mean([process['rss'] for process in processes])),
+        'por_sessao': sum(process['rss'] - process['rss_aquecido'] for process in processes) / max(n_sessions, 1),
+        'caches_streamlit': {name: size / len(processes) for name, size in caches.most_common()},
+    }
+
+
+def _mb(value):
+    return value / 1024 / 1024
+
+
+def print_report(result):
+    print(f"\n{result['sessoes']} sessões x {result['reruns_por_sessao']} reruns "
+          f"({result['concorrencia']} simultâneas por processo, {result['processos']} processo(s)), "
+          f"{result['pedidos']:,} pedidos em {result['backend']}")
+    print(f"  {'execução do rerun':<28}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for label, stats in result['rerun_ms'].items():
+        if stats['p50'] is not None:
+            print(f"  {label:<28}" + ''.join(f"{stats[k]:>8.0f}ms" for k in ('p50', 'p95', 'p99', 'max')))
+    stats = result['trace']['script_ms']
+    if stats['p50'] is not None:
+        print(f"  {'script (profiler)':<28}" + ''.join(f"{stats[k]:>8.0f}ms" for k in ('p50', 'p95', 'p99', 'max')))
+
+    print("\ncache de resultados")
+    for stage, stats in result['trace']['cache_resultados'].items():
+        rate = '-' if stats['taxa_acerto'] is None else f"{stats['taxa_acerto']:.0%}"
+        print(f"  {stage:<30}{stats['acertos']:>8} acertos{stats['faltas']:>8} faltas{rate:>8}")
+    reads = result['trace']['leituras_mongo_por_rerun']
+    if reads is not None:
+        print(f"  leituras no MongoDB por rerun (faltas do st.cache_data): {reads:.2f}")
+
+    memory = result['memoria']
+    print(f"\nmemória (média de {memory['processos']} processos)")
+    print(f"  RSS após a sessão de aquecimento  {_mb(memory['rss_aquecido']):>10,.1f} MB")
+    print(f"  RSS com todas as sessões abertas  {_mb(memory['rss_final']):>10,.1f} MB")
+    print(f"  a mais por sessão                 {_mb(memory['por_sessao']):>10,.2f} MB")
+    for name, size in list(memory['caches_streamlit'].items())[:8]:
+        print(f"  {name:<56}{_mb(size):>10,.2f} MB")
+
+    if result['erros']:
+        print(f"\n{len(result['erros'])} erro(s) nas sessões, por exemplo:", file=sys.stderr)
+        for error in result['erros'][:5]:
+            print(f"  {error}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga com sessões simultâneas do dashboard')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--reruns', type=int, default=10, help='trocas de filtro por sessão')
+    parser.add_argument('--concurrency', type=int, default=4, help='sessões simultâneas (threads) por processo')
+    parser.add_argument('--processes', type=int, default=1, help='processos entre os quais as sessões são repartidas')
+    parser.add_argument('--think', type=float, default=0.5, help='pausa máxima (s) entre trocas de filtro')
+    parser.add_argument('--orders', type=parse_orders, default=20_000, help='pedidos gerados com --mock')
+    parser.add_argument('--uri', default=os.environ.get('MONGODB_URI'))
+    parser.add_argument('--mock', action='store_true', help='gera a base em mongomock, em cada processo')
+    parser.add_argument('--secret', action='append', default=[], metavar='CHAVE=VALOR',
+                        help='secret extra para o app (ex.: REFRESH_MODE=delta)')
+    parser.add_argument('--timeout', type=float, default=300, help='limite (s) de cada rerun')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=RESULTS_DIR)
+    args = parser.parse_args()
+    if not args.mock and not args.uri:
+        raise SystemExit('Informe --uri (base já populada) ou use --mock')
+
+    if args.mock:
+        n_orders = args.orders
+    else:
+        db = connect(args.uri, APP_DB_NAME)
+        n_orders = db['pedidos'].estimated_document_count()
+        db.client.close()
+        if not n_orders:
+            raise SystemExit(f"Base {APP_DB_NAME} vazia: rode benchmarks/synthetic.py --db {APP_DB_NAME} antes ou use --mock")
+    backend = 'mongomock' if args.mock else 'mongod'
+
+    secrets = {
+        'MONGODB_URI': args.uri or 'mongodb://localhost:27017',
+        # O painel ao vivo se atualiza sozinho e não depende dos filtros
+        'LIVE_PANEL': False,
+    }
+    for item in args.secret:
+        key, _, value = item.partition('=')
+        secrets[key] = value
+
+    # As sessões são repartidas entre os processos; com um só, roda aqui mesmo.
+    # Os outros processos começam do zero (spawn: nada de estado do Streamlit ou
+    # conexões herdadas) e recebem a função pelo nome do módulo, porque o
+    # AppTest troca o __main__ do processo pelo app.py
+    n_processes = max(1, min(args.processes, args.sessions))
+    shares = [list(range(args.sessions))[i::n_processes] for i in range(n_processes)]
+    job = (secrets, args.mock, args.orders, args.seed, args.timeout, args.concurrency, args.reruns, args.think)
+    print(f"{args.sessions} sessões, {args.concurrency} simultâneas por processo, {n_processes} processo(s)")
+    started = time.perf_counter()
+    if n_processes == 1:
+        processes = [run_process(shares[0], *job)]
+    else:
+        from load_test import run_process as spawned_process
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=n_processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(spawned_process, share, *job) for share in shares]
+            processes = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    outcomes = sorted((session for process in processes for session in process['sessoes']),
+                      key=lambda session: session['indice'])
+    timings = [timing for outcome in outcomes for timing in outcome['timings']]
+    result = {
+        'commit': git_commit(),
+        'data': datetime.datetime.now().strftime('%Y%m%dT%H%M%S'),
+        'backend': backend,
+        'pedidos': n_orders,
+        'sessoes': args.sessions,
+        'reruns_por_sessao': args.reruns,
+        'concorrencia': args.concurrency,
+        'processos': n_processes,
+        'segundos': elapsed,
+        'python': platform.python_version(),
+        'secrets_extras': args.secret,
+        'rerun_ms': {
+            'todos': percentiles([ms for _, ms in timings]),
+            'inicial': percentiles([ms for action, ms in timings if action == 'inicial']),
+            **{f"troca de {action}": percentiles([ms for name, ms in timings if name == action])
+               for action in FILTER_ACTIONS},
+        },
+        'trace': summarize_trace([process['trace'] for process in processes]),
+        'memoria': summarize_memory(processes),
+        'erros': [error for outcome in outcomes for error in outcome['erros']],
+    }
+    print_report(result)
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"load-{backend}-{n_orders}-{args.sessions}x{args.reruns}-{result['data']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+    print(f"\nresultados gravados em {path}")
+    if result['erros']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+# Gerador de dados sintéticos para as nove coleções do dashboard, com os
+# formatos usados pelo app (pedidos com restaurante_id, status_pedido,
+# valor_total, data_hora_pedido e itens; restaurantes com categorias em lista
+# e coordenadas GeoJSON). Os volumes de referência são 100k, 1M e 10M pedidos.
+#
+# Uso:
+#   python benchmarks/synthetic.py --orders 1000000 --uri mongodb://localhost:27017
+#   python benchmarks/synthetic.py --orders 100000 --mock   (MongoDB em memória, só para volumes pequenos)
+#
+# O banco padrão é restaurante_reviews_bench, para não misturar com os dados reais.
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = {'100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+DEFAULT_DB_NAME = 'restaurante_reviews_bench'
+COLLECTIONS = ('usuarios', 'restaurantes', 'cardapios', 'pratos', 'pedidos', 'avaliacoes',
+               'notificacoes', 'mensagens', 'relatorios')
+
+CATEGORIAS = ['brasileira', 'italiana', 'japonesa', 'lanches', 'pizza', 'árabe', 'mexicana',
+              'vegana', 'chinesa', 'saudável', 'doces', 'churrasco']
+STATUS = ['entregue', 'cancelado', 'a_caminho', 'em_preparo', 'confirmado', 'pendente']
+STATUS_PESOS = [0.70, 0.08, 0.05, 0.07, 0.05, 0.05]
+# Pedidos por hora do dia, com picos no almoço e no jantar
+PESOS_HORA = np.array([1, 0.5, 0.3, 0.2, 0.2, 0.3, 0.6, 1, 1.5, 2, 3, 6,
+                       9, 7, 3, 2, 2, 3, 5, 8, 9, 7, 4, 2], dtype=np.float64)
+# Região de São Paulo (longitude, latitude)
+LON_RANGE = (-46.83, -46.36)
+LAT_RANGE = (-23.78, -23.36)
+PERIODO_DIAS = 730
+
+
+# Quantidade de documentos das coleções auxiliares, proporcional aos pedidos
+def collection_sizes(n_orders):
+    n_restaurants = int(np.clip(n_orders // 400, 50, 20_000))
+    return {
+        'restaurantes': n_restaurants,
+        'usuarios': int(np.clip(n_orders // 10, 100, 1_000_000)),
+        'pratos_por_restaurante': 15,
+        'avaliacoes': n_orders // 4,
+        'notificacoes': n_orders // 5,
+        'mensagens': n_orders // 10,
+    }
+
+
+def _object_ids(n):
+    return [ObjectId() for _ in range(n)]
+
+
+def _points(rng, n):
+    lon = rng.uniform(*LON_RANGE, n).round(6)
+    lat = rng.uniform(*LAT_RANGE, n).round(6)
+    return [{'type': 'Point', 'coordinates': [float(x), float(y)]} for x, y in zip(lon, lat)]
+
+
+# Datas com tendência de crescimento no período e picos de horário
+def _order_times(rng, n, start):
+    days = np.floor(np.sqrt(rng.random(n)) * PERIODO_DIAS).astype(np.int64)
+    hours = rng.choice(24, size=n, p=PESOS_HORA / PESOS_HORA.sum())
+    seconds = days * 86400 + hours * 3600 + rng.integers(0, 3600, n)
+    return [start + datetime.timedelta(seconds=int(s)) for s in seconds]
+
+
+def _insert(collection, documents, batch_size):
+    for i in range(0, len(documents), batch_size):
+        collection.insert_many(documents[i:i + batch_size], ordered=False)
+
+
+# Restaurantes, usuários, pratos e cardápios (as dimensões dos pedidos)
+def generate_dimensions(db, rng, sizes, batch_size):
+    restaurant_ids = _object_ids(sizes['restaurantes'])
+    n_categorias = rng.integers(1, 4, len(restaurant_ids))
+    notas_medias = rng.uniform(2.5, 5, len(restaurant_ids)).round(1)
+    restaurantes = [{
+        '_id': oid,
+        'nome': f"Restaurante {i + 1}",
+        'descricao': 'Restaurante sintético para benchmark',
+        'categorias': [str(c) for c in rng.choice(CATEGORIAS, size=k, replace=False)],
+        'endereco': {'cidade': 'São Paulo', 'estado': 'SP', 'coordenadas': point},
+        'avaliacao_media': float(nota),
+    } for i, (oid, k, nota, point) in enumerate(
+        zip(restaurant_ids, n_categorias, notas_medias, _points(rng, len(restaurant_ids)))
+    )]
+    _insert(db['restaurantes'], restaurantes, batch_size)
+
+    user_ids = _object_ids(sizes['usuarios'])
+    usuarios = [{
+        '_id': oid,
+        'nome': f"Usuário {i + 1}",
+        'email': f"usuario{i + 1}@exemplo.com",
+        'preferencias_alimentares': [str(c) for c in rng.choice(CATEGORIAS, size=2, replace=False)],
+        'endereco': {'cidade': 'São Paulo', 'coordenadas': point},
+    } for i, (oid, point) in enumerate(zip(user_ids, _points(rng, len(user_ids))))]
+    _insert(db['usuarios'], usuarios, batch_size)
+
+    per_restaurant = sizes['pratos_por_restaurante']
+    n_pratos = len(restaurant_ids) * per_restaurant
+    prato_ids = _object_ids(n_pratos)
+    prato_restaurante = np.repeat(np.arange(len(restaurant_ids)), per_restaurant)
+    precos = rng.lognormal(np.log(35), 0.5, n_pratos).clip(5, 250).round(2)
+    pratos = [{
+        '_id': oid,
+        'restaurante_id': restaurant_ids[r],
+        'nome': f"Prato {i + 1}",
+        'preco': float(preco),
+        'disponivel': True,
+    } for i, (oid, r, preco) in enumerate(zip(prato_ids, prato_restaurante, precos))]
+    _insert(db['pratos'], pratos, batch_size)
+
+    cardapios = [{
+        'restaurante_id': oid,
+        'nome': 'Cardápio principal',
+        'pratos': prato_ids[i * per_restaurant:(i + 1) * per_restaurant],
+    } for i, oid in enumerate(restaurant_ids)]
+    _insert(db['cardapios'], cardapios, batch_size)
+
+    return restaurant_ids, user_ids, prato_ids, precos
+
+
+# Avaliações de parte dos pedidos entregues de um lote
+def _reviews(rng, pedidos, fraction):
+    entregues = [doc for doc in pedidos if doc['status_pedido'] == 'entregue']
+    chosen = np.flatnonzero(rng.random(len(entregues)) < fraction)
+    notas = rng.choice([1, 2, 3, 4, 5], size=len(chosen), p=[0.05, 0.07, 0.15, 0.33, 0.40])
+    return [{
+        'pedido_id': entregues[i]['_id'],
+        'usuario_id': entregues[i]['usuario_id'],
+        'restaurante_id': entregues[i]['restaurante_id'],
+        'nota': int(nota),
+        'comentario': 'Avaliação sintética',
+        'data_avaliacao': entregues[i]['data_hora_pedido'] + datetime.timedelta(hours=int(rng.integers(1, 72))),
+    } for i, nota in zip(chosen, notas)]
+
+
+# Pedidos em lotes: restaurantes com popularidade desigual (Zipf), 1 a 4 itens
+# do cardápio do próprio restaurante e valor_total = itens + taxa de entrega.
+# As avaliações são geradas junto, a partir dos pedidos entregues de cada lote.
+def generate_orders(db, rng, n_orders, sizes, restaurant_ids, user_ids, prato_ids, precos, batch_size):
+    start = datetime.datetime(2023, 1, 1)
+    per_restaurant = sizes['pratos_por_restaurante']
+    review_fraction = min(1.0, sizes['avaliacoes'] / max(n_orders * STATUS_PESOS[0], 1))
+    popularity = 1.0 / np.arange(1, len(restaurant_ids) + 1) ** 0.8
+    popularity /= popularity.sum()
+    for offset in range(0, n_orders, batch_size):
+        n = min(batch_size, n_orders - offset)
+        restaurants = rng.choice(len(restaurant_ids), size=n, p=popularity)
+        users = rng.integers(0, len(user_ids), n)
+        status = rng.choice(len(STATUS), size=n, p=STATUS_PESOS)
+        n_itens = rng.integers(1, 5, n)
+        taxas = rng.choice([0.0, 4.99, 7.99, 9.99], size=n)
+        times = _order_times(rng, n, start)
+        points = _points(rng, n)
+        documentos = []
+        for i in range(n):
+            pratos = restaurants[i] * per_restaurant + rng.integers(0, per_restaurant, n_itens[i])
+            quantidades = rng.integers(1, 4, n_itens[i])
+            itens = [{'prato_id': prato_ids[p], 'quantidade': int(q), 'preco_unitario': float(precos[p])}
+                     for p, q in zip(pratos, quantidades)]
+            documentos.append({
+                '_id': ObjectId(),
+                'numero_pedido': offset + i + 1,
+                'usuario_id': user_ids[users[i]],
+                'restaurante_id': restaurant_ids[restaurants[i]],
+                'itens': itens,
+                'status_pedido': STATUS[status[i]],
+                'taxa_entrega': float(taxas[i]),
+                'valor_total': round(float((precos[pratos] * quantidades).sum() + taxas[i]), 2),
+                'data_hora_pedido': times[i],
+                'endereco_entrega': {'coordenadas': points[i]},
+            })
+        db['pedidos'].insert_many(documentos, ordered=False)
+        avaliacoes = _reviews(rng, documentos, review_fraction)
+        if avaliacoes:
+            db['avaliacoes'].insert_many(avaliacoes, ordered=False)
+
+
+# Notificações, mensagens e relatórios
+def generate_activity(db, rng, sizes, restaurant_ids, user_ids, batch_size):
+    agora = datetime.datetime(2025, 1, 1)
+    for name, total, make in (
+        ('notificacoes', sizes['notificacoes'], lambda u: {
+            'usuario_id': u, 'tipo': 'status_pedido', 'mensagem': 'Seu pedido saiu para entrega', 'lida': False,
+            'data_envio': agora}),
+        ('mensagens', sizes['mensagens'], lambda u: {
+            'remetente_id': u, 'destinatario_id': restaurant_ids[int(rng.integers(len(restaurant_ids)))],
+            'conteudo': 'Olá, o pedido vai demorar?', 'data_envio': agora}),
+    ):
+        for offset in range(0, total, batch_size):
+            users = rng.integers(0, len(user_ids), min(batch_size, total - offset))
+            db[name].insert_many([make(user_ids[u]) for u in users], ordered=False)
+
+    relatorios = [{
+        'restaurante_id': oid, 'periodo': '2024-12', 'tipo': 'mensal', 'gerado_em': agora,
+    } for oid in restaurant_ids]
+    _insert(db['relatorios'], relatorios, batch_size)
+
+
+# Índices que o dashboard usa (os mesmos do README e do cubo de pedidos)
+def create_indexes(db):
+    db['pedidos'].create_index('numero_pedido', unique=True)
+    db['pedidos'].create_index([('restaurante_id', 1), ('status_pedido', 1)])
+    db['pedidos'].create_index([('data_hora_pedido', 1)])
+    db['restaurantes'].create_index('categorias')
+    db['avaliacoes'].create_index([('restaurante_id', 1), ('data_avaliacao', -1)])
+
+
+# Apaga as coleções e gera uma base com n_orders pedidos
+def generate(db, n_orders, seed=42, batch_size=50_000, log=print):
+    rng = np.random.default_rng(seed)
+    sizes = collection_sizes(n_orders)
+    for name in COLLECTIONS:
+        db[name].drop()
+
+    start = time.perf_counter()
+    restaurant_ids, user_ids, prato_ids, precos = generate_dimensions(db, rng, sizes, batch_size)
+    log(f"dimensões: {len(restaurant_ids):,} restaurantes, {len(user_ids):,} usuários, "
+        f"{len(prato_ids):,} pratos ({time.perf_counter() - start:.1f}s)")
+    generate_orders(db, rng, n_orders, sizes, restaurant_ids, user_ids, prato_ids, precos, batch_size)
+    log(f"pedidos e avaliações: {n_orders:,} pedidos ({time.perf_counter() - start:.1f}s)")
+    generate_activity(db, rng, sizes, restaurant_ids, user_ids, batch_size)
+    create_indexes(db)
+    log(f"concluído em {time.perf_counter() - start:.1f}s")
+    return {name: db[name].estimated_document_count() for name in COLLECTIONS}
+
+
+# Banco de destino: MongoDB local pela URI ou mongomock em memória
+def connect(uri=None, db_name=DEFAULT_DB_NAME, mock=False):
+    if mock:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("mongomock não está instalado (pip install -r requirements-dev.txt)")
+        return mongomock.MongoClient()[db_name]
+    from pymongo import MongoClient
+    return MongoClient(uri or 'mongodb://localhost:27017')[db_name]
+
+
+def parse_orders(value):
+    return SIZES.get(value.lower()) or int(value.replace('_', ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera uma base sintética para os benchmarks do dashboard')
+    parser.add_argument('--orders', type=parse_orders, default=SIZES['100k'], help='100k, 1m, 10m ou um número')
+    parser.add_argument('--uri', default=os.environ.get('MONGODB_URI'))
+    parser.add_argument('--db', default=DEFAULT_DB_NAME)
+    parser.add_argument('--mock', action='store_true', help='usa mongomock em vez de um mongod')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=50_000)
+    args = parser.parse_args()
+
+    db = connect(args.uri, args.db, args.mock)
+    counts = generate(db, args.orders, seed=args.seed, batch_size=args.batch_size)
+    for name, count in counts.items():
+        print(f"{name:<14}{count:>12,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Módulos de apoio do dashboard (consultas, carregamento e agregações)
@@ -0,0 +1,167 @@
+# Modo aproximado para períodos longos: a primeira renderização usa uma
+# amostra aleatória dos pedidos ($sample como primeiro estágio, que o MongoDB
+# atende com um cursor aleatório sem ler a coleção inteira) e o resumo exato é
+# calculado em segundo plano. Os totais da amostra são escalados para a
+# coleção, com intervalos de confiança de 95% para faturamento, taxa de
+# sucesso e ticket médio; quando o cálculo exato termina a página é refeita.
+import concurrent.futures
+import threading
+
+import numpy as np
+
+from dashboard.decoder import decode_documents
+from dashboard.loaders import SECTION_SOURCES, build_projection
+from dashboard.queries import summarize_orders_frame
+
+DEFAULT_SAMPLE_SIZE = 20_000
+# Acima desta fração da coleção o $sample deixa de usar o cursor aleatório e
+# passa a ordenar a coleção inteira
+MAX_SAMPLE_FRACTION = 0.05
+# Com menos pedidos que isso na amostra o intervalo fica largo demais: calcula exato
+MIN_SAMPLE_MATCHES = 100
+Z_95 = 1.96
+
+
+# Amostra uniforme da coleção e, dela, os pedidos que passam pelos filtros.
+# A amostra não é estratificada por dia nem por restaurante de propósito: o
+# $sample só usa o cursor aleatório como primeiro estágio, e um $match + $sample
+# por estrato leria (e ordenaria ao acaso) todos os pedidos do período, com o
+# mesmo custo do cálculo exato. Na amostra uniforme todo pedido tem a mesma
+# probabilidade de entrar, então as estimativas não precisam de pesos por
+# estrato e os intervalos abaixo já refletem a variação entre dias e restaurantes.
+def order_sample_pipeline(match, sample_size):
+    fields = SECTION_SOURCES['pedidos'].fields
+    return [
+        {'$sample': {'size': sample_size}},
+        {'$match': match},
+        {'$project': build_projection(fields)},
+    ]
+
+
+# Tamanho da amostra para uma coleção de `total_orders` pedidos
+def sample_size_for(total_orders, sample_size=DEFAULT_SAMPLE_SIZE):
+    return int(min(sample_size, total_orders * MAX_SAMPLE_FRACTION))
+
+
+def _interval(estimate, standard_error):
+    return float(estimate - Z_95 * standard_error), float(estimate + Z_95 * standard_error)
+
+
+# Intervalos de confiança das métricas dos cards a partir da amostra: `valores`
+# e `entregues` são dos pedidos filtrados, `sample_size` a amostra inteira
+# (filtrados ou não) e `total_orders` o tamanho da coleção
+def confidence_intervals(valores, entregues, sample_size, total_orders):
+    n = len(valores)
+    scale = total_orders / sample_size
+    # Correção de população finita (amostra sem reposição)
+    fpc = np.sqrt(max(1 - sample_size / total_orders, 0.0))
+
+    # Faturamento: total de y = valor * [passa no filtro] sobre a coleção
+    y = np.zeros(sample_size)
+    y[:n] = valores
+    faturamento = scale * y.sum()
+    faturamento_se = total_orders * y.std(ddof=1) / np.sqrt(sample_size) * fpc
+
+    taxa = entregues.mean() if n else 0.0
+    taxa_se = np.sqrt(taxa * (1 - taxa) / n) * fpc if n else 0.0
+    ticket = valores.mean() if n else 0.0
+    ticket_se = valores.std(ddof=1) / np.sqrt(n) * fpc if n > 1 else 0.0
+    return {
+        'valor_total': _interval(faturamento, faturamento_se),
+        'taxa_sucesso': tuple(float(100 * limite) for limite in np.clip(_interval(taxa, taxa_se), 0, 1)),
+        'ticket_medio': _interval(ticket, ticket_se),
+    }
+
+
+# Multiplica contagens e somas do resumo pelo fator de expansão da amostra
+# (o ticket médio por célula não muda)
+def scale_summary(summary, factor):
+    scaled = dict(summary)
+    scaled['total_pedidos'] = int(round(summary['total_pedidos'] * factor))
+    scaled['valor_total'] = summary['valor_total'] * factor
+    scaled['pedidos_entregues'] = int(round(summary['pedidos_entregues'] * factor))
+    scaled['status_counts'] = summary['status_counts'].assign(
+        count=(summary['status_counts']['count'] * factor).round().astype(np.int64)
+    )
+    scaled['pedidos_dia'] = summary['pedidos_dia'].assign(
+        count=(summary['pedidos_dia']['count'] * factor).round().astype(np.int64)
+    )
+    scaled['hora_semana'] = summary['hora_semana'].assign(
+        pedidos=(summary['hora_semana']['pedidos'] * factor).round().astype(np.int64),
+        faturamento=summary['hora_semana']['faturamento'] * factor,
+    )
+    scaled['pedidos_tempo'] = summary['pedidos_tempo'].assign(
+        faturamento=summary['pedidos_tempo']['faturamento'] * factor,
+        quantidade=(summary['pedidos_tempo']['quantidade'] * factor).round().astype(np.int64),
+    )
+    scaled['por_restaurante'] = summary['por_restaurante'].assign(
+        valor_total=summary['por_restaurante']['valor_total'] * factor
+    )
+    return scaled
+
+
+# Resumo aproximado (mesma estrutura do exato) com os intervalos em
+# summary['aproximado']; None quando a amostra tem poucos pedidos filtrados
+def approximate_order_summary(collection, match, total_orders, sample_size=DEFAULT_SAMPLE_SIZE):
+    size = sample_size_for(total_orders, sample_size)
+    if size < MIN_SAMPLE_MATCHES:
+        return None
+    fields = SECTION_SOURCES['pedidos'].fields
+    sample = decode_documents(collection.aggregate(order_sample_pipeline(match, size)), fields)
+    if len(sample) < MIN_SAMPLE_MATCHES:
+        return None
+    valores = np.nan_to_num(sample['valor_total'].to_numpy(dtype=np.float64))
+    entregues = (sample['status_pedido'] == 'entregue').to_numpy()
+    summary = scale_summary(summarize_orders_frame(sample), total_orders / size)
+    summary['aproximado'] = {
+        'amostra': len(sample),
+        'amostra_total': size,
+        'intervalos': confidence_intervals(valores, entregues, size, total_orders),
+    }
+    return summary
+
+
+# Cálculos exatos em segundo plano, um por chave, compartilhados entre as
+# sessões: quem pede a mesma chave recebe o cálculo que já está em andamento.
+# Um cálculo concluído com sucesso sai do dicionário (o resultado fica no cache
+# de resultados); um que falhou fica até a página descartá-lo e calcular direto.
+class BackgroundRefiner:
+    def __init__(self, max_workers=2):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='refino')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, compute):
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future
+            future = self._futures[key] = self._executor.submit(compute)
+        # Fora do lock: se o cálculo já terminou, o callback roda nesta thread
+        future.add_done_callback(lambda done: self._forget_finished(key, done))
+        return future
+
+    def _forget_finished(self, key, future):
+        if future.cancelled() or future.exception() is None:
+            with self._lock:
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+
+    def get(self, key):
+        with self._lock:
+            return self._futures.get(key)
+
+    # Cálculo concluído que continua guardado (na prática, um que falhou)
+    def done(self, key):
+        future = self.get(key)
+        return future is not None and future.done()
+
+    # Cálculo ainda em andamento
+    def pending(self, key):
+        future = self.get(key)
+        return future is not None and not future.done()
+
+    # Esquece o cálculo da chave (ex.: depois de uma falha, já tratada pela página)
+    def discard(self, key):
+        with self._lock:
+            self._futures.pop(key, None)
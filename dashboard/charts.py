@@ -0,0 +1,74 @@
+# Dados dos gráficos preparados no servidor: histogramas já com as faixas e
+# contagens calculadas em NumPy e séries temporais com a resolução ajustada ao
+# período. O JSON enviado ao navegador fica limitado pelo número de faixas e de
+# pontos, e não pelo número de linhas da coleção.
+import numpy as np
+import pandas as pd
+
+# Pontos máximos de uma série temporal antes de trocar para uma resolução maior
+MAX_SERIES_POINTS = 400
+
+# Resoluções possíveis (alias de período do pandas, nome exibido, dias por período)
+PERIODS = (
+    ('D', 'dia', 1),
+    ('W', 'semana', 7),
+    ('M', 'mês', 30.44),
+    ('Q', 'trimestre', 91.31),
+    ('Y', 'ano', 365.25),
+)
+
+
+# Faixas de um histograma contínuo: início, fim, centro e quantidade por faixa
+def histogram_bins(values, bins=20):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return pd.DataFrame(columns=['inicio', 'fim', 'centro', 'quantidade'])
+    counts, edges = np.histogram(values, bins=bins)
+    return pd.DataFrame({
+        'inicio': edges[:-1],
+        'fim': edges[1:],
+        'centro': (edges[:-1] + edges[1:]) / 2,
+        'quantidade': counts,
+    })
+
+
+# Quantidade por valor distinto (para valores discretos, como as notas de 1 a 5)
+def value_distribution(values, name='valor'):
+    values = np.asarray(values, dtype=np.float64)
+    distinct, counts = np.unique(values[np.isfinite(values)], return_counts=True)
+    return pd.DataFrame({name: distinct, 'quantidade': counts})
+
+
+# Menor resolução (entre as candidatas) que cabe em max_points no período
+def choose_period(start, end, max_points=MAX_SERIES_POINTS, candidates=('D', 'W', 'M', 'Q', 'Y')):
+    span_days = max((pd.Timestamp(end) - pd.Timestamp(start)).days, 0) + 1
+    options = [period for period in PERIODS if period[0] in candidates]
+    for alias, label, days in options:
+        if span_days / days + 1 <= max_points:
+            return alias, label
+    return options[-1][0], options[-1][1]
+
+
+# Reagrega uma série diária de totais (somas/contagens) na resolução que cabe
+# em max_points; devolve a série e o nome da resolução usada
+def downsample_totals(frame, date_column, value_columns, max_points=MAX_SERIES_POINTS):
+    if frame.empty:
+        return frame, 'dia'
+    dates = pd.to_datetime(frame[date_column])
+    alias, label = choose_period(dates.min(), dates.max(), max_points)
+    if alias == 'D':
+        return frame, label
+    periods = dates.dt.to_period(alias).dt.start_time.rename(date_column)
+    resampled = frame[value_columns].groupby(periods).sum().reset_index()
+    resampled[date_column] = resampled[date_column].dt.date
+    return resampled, label
+
+
+# Média por período de uma coluna, com resolução mensal ou maior conforme o período
+def mean_by_period(dates, values, max_points=MAX_SERIES_POINTS, candidates=('M', 'Q', 'Y')):
+    if dates.empty:
+        return pd.Series(dtype=np.float64), 'mês'
+    alias, label = choose_period(dates.min(), dates.max(), max_points, candidates)
+    periods = dates.dt.to_period(alias).astype(str)
+    return values.groupby(periods.to_numpy()).mean(), label
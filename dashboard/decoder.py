@@ -0,0 +1,302 @@
+# Decodificador colunar: lê os lotes do cursor (BSON bruto) direto para
+# buffers tipados por coluna, sem a passada recursiva de process_record e sem
+# montar o DataFrame linha a linha.
+#
+# Para cada campo projetado, os elementos BSON são localizados no lote com uma
+# única busca (regex em C) e os valores de tamanho fixo (ObjectId, double,
+# inteiros e datas) são copiados com indexação vetorizada do NumPy. Lotes com
+# formato inesperado (campo repetido, tipo não suportado) caem para
+# bson.decode_all, sem perda de dados.
+import re
+import struct
+
+import bson
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from bson import Decimal128, ObjectId
+from pandas.api.types import union_categoricals
+
+from dashboard.loaders import build_projection
+
+DEFAULT_BATCH_SIZE = 10_000
+
+# Tipos de coluna suportados (ver dashboard/schema.py)
+COLUMN_KINDS = ('objectid', 'objectid_key', 'category', 'float', 'float32', 'datetime', 'str', 'list')
+
+# Códigos de tipo dos elementos BSON
+_BSON_DOUBLE = 0x01
+_BSON_STRING = 0x02
+_BSON_ARRAY = 0x04
+_BSON_OBJECTID = 0x07
+_BSON_DATETIME = 0x09
+_BSON_NULL = 0x0A
+_BSON_INT32 = 0x10
+_BSON_INT64 = 0x12
+
+# Tipos BSON aceitos por tipo de coluna no caminho vetorizado
+_ACCEPTED_TYPES = {
+    'objectid': (_BSON_OBJECTID,),
+    'objectid_key': (_BSON_OBJECTID,),
+    'float': (_BSON_DOUBLE, _BSON_INT32, _BSON_INT64),
+    'float32': (_BSON_DOUBLE, _BSON_INT32, _BSON_INT64),
+    'datetime': (_BSON_DATETIME,),
+    'category': (_BSON_STRING,),
+    'str': (_BSON_STRING,),
+    'list': (_BSON_ARRAY,),
+}
+
+_NAT_MS = np.iinfo(np.int64).min
+_EMPTY_OID = b'\x00' * 12
+_INT32 = struct.Struct('<i')
+
+
+class _FallbackBatch(Exception):
+    pass
+
+
+# Função para converter ObjectId para string e lidar com tipos aninhados
+# (caminho linha a linha, usado quando a seção não declara os campos)
+def process_record(record):
+    for key, value in record.items():
+        if isinstance(value, ObjectId):
+            record[key] = str(value)
+        elif isinstance(value, dict):
+            record[key] = process_record(value)
+        elif isinstance(value, list):
+            record[key] = [process_record(item) if isinstance(item, dict) else item for item in value]
+    return record
+
+
+def _to_float(value):
+    if value is None:
+        return np.nan
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    return value
+
+
+# Acumula os lotes de uma coluna e monta o array final
+class _ColumnBuffer:
+    def __init__(self, kind):
+        if kind not in COLUMN_KINDS:
+            raise ValueError(f"Tipo de coluna desconhecido: {kind}")
+        self.kind = kind
+        self.chunks = []
+
+    # Lote vindo de documentos já decodificados (valores Python)
+    def append_values(self, values):
+        n = len(values)
+        if self.kind in ('float', 'float32'):
+            chunk = np.fromiter((_to_float(v) for v in values), dtype=np.float64, count=n)
+        elif self.kind == 'datetime':
+            chunk = np.fromiter(
+                (_NAT_MS if v is None else pd.Timestamp(v).value // 1_000_000 for v in values),
+                dtype=np.int64,
+                count=n
+            )
+        elif self.kind in ('objectid', 'objectid_key'):
+            # 12 bytes por valor; ausentes viram zeros e são marcados na máscara
+            raw = np.frombuffer(b''.join(_EMPTY_OID if v is None else v.binary for v in values), dtype='V12')
+            chunk = (raw, np.fromiter((v is None for v in values), dtype=bool, count=n))
+        elif self.kind == 'category':
+            chunk = pd.Categorical(values)
+        else:
+            chunk = list(values)
+        self.chunks.append(chunk)
+
+    # Lote já no formato da coluna (caminho vetorizado)
+    def append_chunk(self, chunk):
+        self.chunks.append(chunk)
+
+    def finish(self):
+        if self.kind in ('float', 'float32'):
+            column = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.float64)
+            return column.astype(np.float32) if self.kind == 'float32' else column
+        if self.kind == 'datetime':
+            ms = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.int64)
+            return pd.to_datetime(ms.view('datetime64[ms]'))
+        if self.kind == 'objectid':
+            return _objectid_categorical(self.chunks)
+        if self.kind == 'objectid_key':
+            return _objectid_binary(self.chunks)
+        if self.kind == 'category':
+            return union_categoricals(self.chunks) if self.chunks else pd.Categorical([])
+        values = [v for chunk in self.chunks for v in chunk]
+        column = np.empty(len(values), dtype=object)
+        column[:] = values
+        return column
+
+
+# ObjectIds viram códigos inteiros (categorical) cujas categorias são as
+# strings hexadecimais, compatíveis com os ids em string usados no restante do app
+def _objectid_categorical(chunks):
+    if not chunks:
+        return pd.Categorical([])
+    raw = np.concatenate([chunk[0] for chunk in chunks])
+    mask = np.concatenate([chunk[1] for chunk in chunks])
+    uniques, codes = np.unique(raw[~mask], return_inverse=True)
+    all_codes = np.full(len(raw), -1, dtype=np.int32)
+    all_codes[~mask] = codes
+    categories = [bytes(u).hex() for u in uniques]
+    return pd.Categorical.from_codes(all_codes, categories=categories)
+
+
+# Chaves primárias ficam com os 12 bytes do ObjectId (fixed_size_binary do
+# Arrow), sem uma string por linha
+def _objectid_binary(chunks):
+    if not chunks:
+        return pd.arrays.ArrowExtensionArray(pa.array([], type=pa.binary(12)))
+    raw = np.concatenate([chunk[0] for chunk in chunks])
+    mask = np.concatenate([chunk[1] for chunk in chunks])
+    validity = pa.py_buffer(np.packbits(~mask, bitorder='little')) if mask.any() else None
+    array = pa.FixedSizeBinaryArray.from_buffers(pa.binary(12), len(raw), [validity, pa.py_buffer(raw.tobytes())])
+    return pd.arrays.ArrowExtensionArray(array)
+
+
+# Posição inicial de cada documento do lote
+def _document_starts(raw_batch):
+    starts = []
+    pos = 0
+    end = len(raw_batch)
+    while pos < end:
+        starts.append(pos)
+        pos += _INT32.unpack_from(raw_batch, pos)[0]
+    return np.array(starts, dtype=np.int64)
+
+
+# Copia `width` bytes a partir de cada offset (matriz n x width)
+def _gather(buffer, offsets, width):
+    return np.ascontiguousarray(buffer[offsets[:, None] + np.arange(width)])
+
+
+# Localiza o campo em cada documento do lote e extrai a coluna tipada
+class _RawFieldReader:
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.accepted = np.array(_ACCEPTED_TYPES[kind] + (_BSON_NULL,), dtype=np.uint8)
+        # Busca literal pelo nome do campo; o byte anterior é o tipo do elemento
+        self.pattern = re.compile(re.escape(name.encode('utf-8') + b'\x00'))
+        self.header_size = len(name.encode('utf-8')) + 1
+
+    def read(self, raw_batch, buffer, starts):
+        positions = np.fromiter(
+            (match.start() for match in self.pattern.finditer(raw_batch, 1)),
+            dtype=np.int64
+        ) - 1
+        types = buffer[positions]
+        # Ocorrências do nome fora de um cabeçalho de elemento (ex.: dentro de
+        # uma string) não têm um código de tipo válido antes e são ignoradas
+        is_element = ((types >= 0x01) & (types <= 0x13)) | (types == 0x7F) | (types == 0xFF)
+        positions = positions[is_element]
+        types = types[is_element]
+        if not np.isin(types, self.accepted).all():
+            raise _FallbackBatch()
+
+        doc_index = np.searchsorted(starts, positions, side='right') - 1
+        if np.any(np.diff(doc_index) <= 0):
+            # Campo repetido no mesmo documento (ex.: subdocumento com o mesmo nome)
+            raise _FallbackBatch()
+
+        present = types != _BSON_NULL
+        return self._extract(
+            raw_batch, buffer, len(starts),
+            doc_index[present], types[present], positions[present] + 1 + self.header_size
+        )
+
+    def _extract(self, raw_batch, buffer, n_docs, doc_index, types, offsets):
+        if self.kind in ('objectid', 'objectid_key'):
+            raw = np.zeros((n_docs, 12), dtype=np.uint8)
+            raw[doc_index] = _gather(buffer, offsets, 12)
+            mask = np.ones(n_docs, dtype=bool)
+            mask[doc_index] = False
+            return raw.view('V12').ravel(), mask
+
+        if self.kind in ('float', 'float32'):
+            column = np.full(n_docs, np.nan, dtype=np.float64)
+            for bson_type, width, dtype in ((_BSON_DOUBLE, 8, '<f8'), (_BSON_INT32, 4, '<i4'), (_BSON_INT64, 8, '<i8')):
+                selected = types == bson_type
+                if selected.any():
+                    column[doc_index[selected]] = _gather(buffer, offsets[selected], width).view(dtype).ravel()
+            return column
+
+        if self.kind == 'datetime':
+            column = np.full(n_docs, _NAT_MS, dtype=np.int64)
+            column[doc_index] = _gather(buffer, offsets, 8).view('<i8').ravel()
+            return column
+
+        if self.kind == 'category':
+            # Strings copiadas para uma matriz de largura fixa e fatoradas com np.unique
+            codes = np.full(n_docs, -1, dtype=np.int32)
+            if not len(offsets):
+                return pd.Categorical.from_codes(codes, categories=[])
+            lengths = _gather(buffer, offsets, 4).view('<i4').ravel() - 1
+            width = max(int(lengths.max()), 1)
+            columns = np.arange(width)
+            indices = np.minimum(offsets[:, None] + 4 + columns, len(buffer) - 1)
+            chars = np.where(columns < lengths[:, None], buffer[indices], 0).astype(np.uint8)
+            uniques, inverse = np.unique(chars.view(f'S{width}').ravel(), return_inverse=True)
+            codes[doc_index] = inverse
+            return pd.Categorical.from_codes(codes, categories=[u.decode('utf-8') for u in uniques])
+
+        values = [None] * n_docs
+        for index, offset in zip(doc_index.tolist(), offsets.tolist()):
+            length = _INT32.unpack_from(raw_batch, offset)[0]
+            if self.kind == 'str':
+                values[index] = raw_batch[offset + 4:offset + 3 + length].decode('utf-8')
+            else:
+                # Array BSON: subdocumento com chaves "0", "1", ...
+                values[index] = list(bson.decode(raw_batch[offset:offset + length]).values())
+        return values
+
+
+def _append_documents(buffers, documents):
+    for name, column in buffers.items():
+        column.append_values([document.get(name) for document in documents])
+
+
+# Converte documentos já decodificados (em lotes) em colunas tipadas
+def decode_documents(documents, fields, batch_size=DEFAULT_BATCH_SIZE):
+    buffers = {name: _ColumnBuffer(kind) for name, kind in fields.items()}
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            _append_documents(buffers, batch)
+            batch = []
+    if batch:
+        _append_documents(buffers, batch)
+    return pd.DataFrame({name: column.finish() for name, column in buffers.items()})
+
+
+# Converte lotes de BSON bruto (find_raw_batches) em colunas tipadas
+def decode_raw_batches(raw_batches, fields):
+    buffers = {name: _ColumnBuffer(kind) for name, kind in fields.items()}
+    readers = [_RawFieldReader(name, kind) for name, kind in fields.items()]
+    for raw_batch in raw_batches:
+        raw_batch = bytes(raw_batch)
+        if not raw_batch:
+            continue
+        buffer = np.frombuffer(raw_batch, dtype=np.uint8)
+        starts = _document_starts(raw_batch)
+        try:
+            chunks = [reader.read(raw_batch, buffer, starts) for reader in readers]
+        except _FallbackBatch:
+            _append_documents(buffers, bson.decode_all(raw_batch))
+            continue
+        for reader, chunk in zip(readers, chunks):
+            buffers[reader.name].append_chunk(chunk)
+    return pd.DataFrame({name: column.finish() for name, column in buffers.items()})
+
+
+# Busca uma coleção já no formato colunar, só com os campos declarados
+def fetch_columnar(collection, fields, query=None, batch_size=DEFAULT_BATCH_SIZE):
+    query = query or {}
+    projection = build_projection(fields)
+    try:
+        raw_batches = collection.find_raw_batches(query, projection, batch_size=batch_size)
+    except NotImplementedError:
+        # Clientes sem suporte a lotes brutos (ex.: bancos em memória para testes)
+        return decode_documents(collection.find(query, projection), fields, batch_size)
+    return decode_raw_batches(raw_batches, fields)
@@ -0,0 +1,117 @@
+# Dimensão de restaurantes: cada restaurante recebe um código inteiro denso e
+# cada categoria aponta para os códigos dos seus restaurantes (índice
+# invertido). O filtro de categorias vira uma união de conjuntos e uma consulta
+# vetorizada nos códigos dos pedidos.
+#
+# A mesma relação fica guardada como matriz esparsa restaurante x categoria em
+# formato CSR (indptr/indices, só NumPy): o faturamento por categoria é o
+# produto da transposta pelo vetor de faturamento por restaurante, sem merge
+# nem explode, e o custo depende do número de restaurantes, não de pedidos.
+import numpy as np
+import pandas as pd
+
+
+class RestaurantDimension:
+    def __init__(self, df_restaurantes):
+        self.ids = pd.Index(df_restaurantes['_id'].astype(str).to_numpy() if not df_restaurantes.empty else [])
+        self.names = df_restaurantes['nome'].to_numpy() if 'nome' in df_restaurantes.columns else np.array([])
+        # Código do nome de cada restaurante (restaurantes homônimos somam juntos
+        # no ranking, como no groupby por nome)
+        name_codes, self.unique_names = pd.factorize(pd.Series(self.names, dtype=object), use_na_sentinel=True)
+        self.name_codes = name_codes.astype(np.int32)
+
+        postings = {}
+        restaurant_categories = []
+        if 'categorias' in df_restaurantes.columns:
+            for code, categorias in enumerate(df_restaurantes['categorias'].to_numpy()):
+                if isinstance(categorias, str):
+                    categorias = [categorias]
+                elif not isinstance(categorias, (list, tuple, np.ndarray)):
+                    restaurant_categories.append(())
+                    continue
+                restaurant_categories.append(tuple(dict.fromkeys(categorias)))
+                for categoria in categorias:
+                    postings.setdefault(categoria, []).append(code)
+        self.categories = sorted(postings)
+        self.restaurants_by_category = {
+            categoria: np.unique(np.array(codes, dtype=np.int32)) for categoria, codes in postings.items()
+        }
+
+        # Incidência restaurante x categoria em CSR: as categorias do restaurante
+        # r são incidence_indices[incidence_indptr[r]:incidence_indptr[r + 1]]
+        category_codes = {categoria: code for code, categoria in enumerate(self.categories)}
+        lengths = np.array([len(categorias) for categorias in restaurant_categories], dtype=np.int64)
+        self.incidence_indptr = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        self.incidence_indptr[1:len(lengths) + 1] = np.cumsum(lengths)
+        self.incidence_indptr[len(lengths) + 1:] = self.incidence_indptr[len(lengths)]
+        self.incidence_indices = np.fromiter(
+            (category_codes[categoria] for categorias in restaurant_categories for categoria in categorias),
+            dtype=np.int32, count=int(lengths.sum())
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Códigos dos restaurantes que têm ao menos uma das categorias
+    def codes_for_categories(self, categories):
+        postings = [self.restaurants_by_category[c] for c in categories if c in self.restaurants_by_category]
+        if not postings:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(postings))
+
+    # Ids (string) correspondentes aos códigos
+    def ids_for_codes(self, codes):
+        return self.ids[codes].tolist()
+
+    # Códigos dos ids informados (-1 para ids desconhecidos)
+    def codes_for_ids(self, ids):
+        return self.ids.get_indexer(pd.Index(list(ids)).astype(str)).astype(np.int32)
+
+    # Converte a coluna restaurante_id dos pedidos para os códigos da dimensão.
+    # Em colunas categóricas só as categorias passam pelo get_indexer; o resto
+    # é um take vetorizado nos códigos.
+    def order_codes(self, restaurante_id):
+        if isinstance(restaurante_id.dtype, pd.CategoricalDtype):
+            mapper = self.ids.get_indexer(restaurante_id.cat.categories.astype(str)).astype(np.int32)
+            codes = restaurante_id.cat.codes.to_numpy()
+            return np.where(codes >= 0, mapper[codes], -1).astype(np.int32)
+        return self.ids.get_indexer(restaurante_id.astype(str)).astype(np.int32)
+
+    # Máscara dos pedidos cujos restaurantes estão entre os códigos selecionados
+    def order_mask(self, order_codes, selected_codes):
+        table = np.zeros(len(self.ids) + 1, dtype=bool)
+        table[selected_codes] = True
+        # O código -1 (restaurante desconhecido) cai na última posição, sempre False
+        return table[order_codes]
+
+    # Vetor por código de restaurante a partir de (ids, valores) já agregados;
+    # devolve também quais restaurantes apareceram
+    def values_by_code(self, ids, values):
+        codes = self.codes_for_ids(ids)
+        known = codes >= 0
+        totals = np.bincount(codes[known], weights=np.asarray(values, dtype=np.float64)[known], minlength=len(self))
+        present = np.bincount(codes[known], minlength=len(self)) > 0
+        return totals, present
+
+    # Produto da transposta da incidência pelo vetor por restaurante: total de cada categoria
+    def category_totals(self, values):
+        per_entry = np.repeat(np.asarray(values, dtype=np.float64), np.diff(self.incidence_indptr))
+        return np.bincount(self.incidence_indices, weights=per_entry, minlength=len(self.categories))
+
+    # Ranking por nome de restaurante (só os que apareceram), maiores primeiro
+    def top_names(self, values, present, n=10):
+        named = self.name_codes >= 0
+        totals = np.bincount(self.name_codes[named], weights=values[named], minlength=len(self.unique_names))
+        seen = np.bincount(self.name_codes[named & present], minlength=len(self.unique_names)) > 0
+        candidates = np.flatnonzero(seen)
+        order = candidates[np.argsort(-totals[candidates], kind='stable')][:n]
+        return pd.DataFrame({'nome': self.unique_names[order], 'valor_total': totals[order]})
+
+    # Total por categoria (só as categorias com algum restaurante presente)
+    def category_frame(self, values, present):
+        totals = self.category_totals(values)
+        seen = self.category_totals(present) > 0
+        return pd.DataFrame({
+            'categorias': np.array(self.categories, dtype=object)[seen],
+            'valor_total': totals[seen],
+        })
@@ -0,0 +1,125 @@
+# Mapa de calor dos pedidos: os pontos de entrega dentro da área visível
+# (consulta $geoWithin no índice 2dsphere) são agregados no MongoDB numa grade
+# retangular de GRID_CELLS x GRID_CELLS células. O mapa recebe no máximo uma
+# marca por célula, qualquer que seja o número de pedidos, e a grade é
+# recalculada para a nova área a cada aproximação.
+import pandas as pd
+
+from dashboard.queries import build_order_match
+
+# Local de entrega dos pedidos (GeoJSON Point, [longitude, latitude]); o app
+# lê outro nome do secret ORDER_LOCATION_FIELD
+DEFAULT_ORDER_LOCATION_FIELD = 'endereco_entrega.coordenadas'
+# Células por lado da grade
+GRID_CELLS = 60
+# Menor área exibida (em graus), para a grade não descer abaixo de poucos metros
+MIN_VIEWPORT_DEGREES = 0.005
+
+
+# Área (min_lon, min_lat, max_lon, max_lat) como polígono GeoJSON, no sentido anti-horário
+def viewport_polygon(bounds):
+    min_lon, min_lat, max_lon, max_lat = bounds
+    return {
+        'type': 'Polygon',
+        'coordinates': [[
+            [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat],
+        ]],
+    }
+
+
+# Expande áreas muito pequenas (ou de um único ponto) até o tamanho mínimo
+def normalize_viewport(bounds):
+    min_lon, min_lat, max_lon, max_lat = bounds
+    if max_lon - min_lon < MIN_VIEWPORT_DEGREES:
+        center = (min_lon + max_lon) / 2
+        min_lon, max_lon = center - MIN_VIEWPORT_DEGREES / 2, center + MIN_VIEWPORT_DEGREES / 2
+    if max_lat - min_lat < MIN_VIEWPORT_DEGREES:
+        center = (min_lat + max_lat) / 2
+        min_lat, max_lat = center - MIN_VIEWPORT_DEGREES / 2, center + MIN_VIEWPORT_DEGREES / 2
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
+# Filtros do dashboard mais o recorte espacial
+def geo_match(match, bounds=None, location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    geo = dict(match)
+    if bounds is None:
+        geo[location_field] = {'$exists': True}
+    else:
+        geo[location_field] = {'$geoWithin': {'$geometry': viewport_polygon(bounds)}}
+    return geo
+
+
+def _coordinate(index, location_field):
+    return {'$arrayElemAt': [f"${location_field}.coordinates", index]}
+
+
+# Limites dos pontos de entrega dos pedidos filtrados (visão geral do mapa)
+def order_location_bounds_pipeline(match, location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    return [
+        {'$match': geo_match(match, location_field=location_field)},
+        {'$group': {
+            '_id': None,
+            'min_lon': {'$min': _coordinate(0, location_field)},
+            'min_lat': {'$min': _coordinate(1, location_field)},
+            'max_lon': {'$max': _coordinate(0, location_field)},
+            'max_lat': {'$max': _coordinate(1, location_field)},
+        }},
+    ]
+
+
+# Contagem e faturamento por célula da grade dentro da área
+def order_grid_pipeline(match, bounds, cells=GRID_CELLS, location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    min_lon, min_lat, max_lon, max_lat = bounds
+    cell_lon = (max_lon - min_lon) / cells
+    cell_lat = (max_lat - min_lat) / cells
+    return [
+        {'$match': geo_match(match, bounds, location_field)},
+        {'$project': {
+            '_id': 0,
+            'valor_total': 1,
+            # Pontos exatamente na borda superior caem na última célula
+            'x': {'$min': [cells - 1, {'$floor': {'$divide': [{'$subtract': [_coordinate(0, location_field), min_lon]}, cell_lon]}}]},
+            'y': {'$min': [cells - 1, {'$floor': {'$divide': [{'$subtract': [_coordinate(1, location_field), min_lat]}, cell_lat]}}]},
+        }},
+        {'$group': {
+            '_id': {'x': '$x', 'y': '$y'},
+            'pedidos': {'$sum': 1},
+            'faturamento': {'$sum': '$valor_total'},
+        }},
+    ]
+
+
+def fetch_order_location_bounds(collection, restaurant_ids=None, start_date=None, end_date=None, statuses=None,
+                                location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    match = build_order_match(restaurant_ids, start_date, end_date, statuses)
+    result = list(collection.aggregate(order_location_bounds_pipeline(match, location_field)))
+    if not result or result[0]['min_lon'] is None:
+        return None
+    row = result[0]
+    return normalize_viewport((row['min_lon'], row['min_lat'], row['max_lon'], row['max_lat']))
+
+
+# Células da grade com o centro em longitude/latitude
+def fetch_order_grid(collection, bounds, restaurant_ids=None, start_date=None, end_date=None, statuses=None,
+                     cells=GRID_CELLS, location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    match = build_order_match(restaurant_ids, start_date, end_date, statuses)
+    rows = [
+        (row['_id']['x'], row['_id']['y'], row['pedidos'], row['faturamento'])
+        for row in collection.aggregate(order_grid_pipeline(match, bounds, cells, location_field))
+    ]
+    grid = pd.DataFrame(rows, columns=['x', 'y', 'pedidos', 'faturamento'])
+    min_lon, min_lat, max_lon, max_lat = bounds
+    grid['lon'] = min_lon + (grid['x'] + 0.5) * (max_lon - min_lon) / cells
+    grid['lat'] = min_lat + (grid['y'] + 0.5) * (max_lat - min_lat) / cells
+    return grid
+
+
+# Nova área a partir das células selecionadas no mapa (meia célula de margem)
+def viewport_from_points(points, bounds, cells=GRID_CELLS):
+    if not points:
+        return None
+    half_lon = (bounds[2] - bounds[0]) / cells / 2
+    half_lat = (bounds[3] - bounds[1]) / cells / 2
+    lons = [point['lon'] for point in points]
+    lats = [point['lat'] for point in points]
+    return normalize_viewport((min(lons) - half_lon, min(lats) - half_lat, max(lons) + half_lon, max(lats) + half_lat))
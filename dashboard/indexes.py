@@ -0,0 +1,319 @@
+# Índices exigidos pelas consultas do dashboard e verificação dos planos de
+# execução: cria os índices declarados abaixo e roda explain (queryPlanner, sem
+# executar a consulta) em cada formato de consulta que o app envia ao MongoDB.
+# Qualquer COLLSCAN numa consulta que deveria usar índice faz o comando falhar,
+# para a latência dos filtros não crescer junto com as coleções.
+#
+# Uso:
+#   python -m dashboard.indexes --uri mongodb://localhost:27017
+#   python -m dashboard.indexes --check-only   (só verifica os planos, sem criar índices)
+#   python -m dashboard.indexes --updated-field pedidos=atualizado_em --live-time-field inserido_em
+#
+# --updated-field, --live-time-field e --location-field repetem os secrets
+# REFRESH_UPDATED_FIELDS, LIVE_TIME_FIELD e ORDER_LOCATION_FIELD do app, quando
+# configurados: os campos ganham índices e as consultas que dependem deles
+# entram na verificação. O app não cria os índices das coleções de origem;
+# este comando é o passo de implantação que os cria.
+#
+# Leituras completas de coleção (carga das seções) e agregações sem filtro
+# varrem a coleção por natureza; aparecem no relatório como "varredura esperada".
+import argparse
+import datetime
+import os
+import sys
+from collections import namedtuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
+
+from dashboard.approximate import order_sample_pipeline, sample_size_for
+from dashboard.geo import DEFAULT_ORDER_LOCATION_FIELD, order_grid_pipeline, order_location_bounds_pipeline
+from dashboard.live import DEFAULT_LIVE_TIME_FIELD, LIVE_WINDOWS
+from dashboard.loaders import SECTION_SOURCES, build_projection
+from dashboard.mongo import MongoAccess, plan_stages
+from dashboard.queries import (
+    build_order_match,
+    dish_ranking_pipeline,
+    order_date_bounds_pipeline,
+    order_status_values_pipeline,
+    order_summary_pipeline,
+)
+from dashboard.tenant import scope_query
+from dashboard.rollup import (
+    ROLLUP_COLLECTION,
+    ensure_rollup_indexes,
+    rollup_changed_hours_pipeline,
+    rollup_date_bounds_pipeline,
+    rollup_rebuild_pipeline,
+    rollup_recompute_pipeline,
+    rollup_status_values_pipeline,
+    rollup_summary_pipeline,
+    rollup_update_pipeline,
+)
+
+# Índices compostos dos filtros da barra lateral: a igualdade/$in vem antes do
+# intervalo de datas, que também serve à ordenação por data
+REQUIRED_INDEXES = {
+    'pedidos': [
+        [('data_hora_pedido', ASCENDING)],
+        [('restaurante_id', ASCENDING), ('data_hora_pedido', ASCENDING)],
+        [('status_pedido', ASCENDING), ('data_hora_pedido', ASCENDING)],
+    ],
+    # Carga das seções no modo por restaurante
+    'avaliacoes': [
+        [('restaurante_id', ASCENDING)],
+    ],
+    'pratos': [
+        [('restaurante_id', ASCENDING)],
+    ],
+}
+
+
+
+# Índices declarados mais os dos campos configurados no app: o campo de
+# alteração de cada seção (busca incremental e recálculo do cubo), o campo de
+# data do painel ao vivo (sozinho e depois do restaurante, no modo por
+# restaurante) e o 2dsphere do local de entrega (mapa de calor)
+def required_indexes(updated_fields=None, live_time_field=DEFAULT_LIVE_TIME_FIELD,
+                     location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    indexes = {collection: list(keys) for collection, keys in REQUIRED_INDEXES.items()}
+    for section, field in (updated_fields or {}).items():
+        indexes.setdefault(SECTION_SOURCES[section].collection, []).append([(field, ASCENDING)])
+    indexes['pedidos'].extend([
+        [(live_time_field, ASCENDING)],
+        [('restaurante_id', ASCENDING), (live_time_field, ASCENDING)],
+        [(location_field, GEOSPHERE)],
+    ])
+    return {collection: [keys for i, keys in enumerate(declared) if keys not in declared[:i]]
+            for collection, declared in indexes.items()}
+
+
+QueryCheck = namedtuple('QueryCheck', ['name', 'collection', 'command', 'full_scan'])
+PlanResult = namedtuple('PlanResult', ['name', 'collection', 'plan', 'status'])
+
+
+# Cria os índices declarados e os índices do cubo
+def ensure_indexes(db, updated_fields=None, live_time_field=DEFAULT_LIVE_TIME_FIELD,
+                   location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    created = []
+    for collection, indexes in required_indexes(updated_fields, live_time_field, location_field).items():
+        for keys in indexes:
+            created.append((collection, db[collection].create_index(keys)))
+    ensure_rollup_indexes(db)
+    created.extend((ROLLUP_COLLECTION, index) for index in db[ROLLUP_COLLECTION].index_information())
+    return created
+
+
+def _aggregate(collection, pipeline):
+    return {'aggregate': collection, 'pipeline': pipeline, 'cursor': {}}
+
+
+def _find(collection, query, projection=None, sort=None, limit=None):
+    command = {'find': collection, 'filter': query}
+    if projection is not None:
+        command['projection'] = projection
+    if sort is not None:
+        command['sort'] = sort
+    if limit is not None:
+        command['limit'] = limit
+    return command
+
+
+# Valores reais (um pedido qualquer) para montar filtros plausíveis; o explain
+# não executa a consulta, mas o planejador escolhe o plano pelos valores
+def sample_values(db, location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    order = db['pedidos'].find_one(
+        {}, {'restaurante_id': 1, 'status_pedido': 1, 'data_hora_pedido': 1, location_field: 1}
+    ) or {}
+    restaurant = db['restaurantes'].find_one({}, {'_id': 1}) or {}
+    data = order.get('data_hora_pedido') or datetime.datetime.now()
+    location = order
+    for key in location_field.split('.'):
+        location = location.get(key) if isinstance(location, dict) else None
+    coordinates = (location if isinstance(location, dict) else {}).get('coordinates') or [-46.63, -23.55]
+    return {
+        'order_id': order.get('_id', ObjectId()),
+        'restaurant_id': order.get('restaurante_id', restaurant.get('_id', ObjectId())),
+        'status': order.get('status_pedido', 'entregue'),
+        'start_date': data.date() - datetime.timedelta(days=30),
+        'end_date': data.date(),
+        'data': data,
+        'total_orders': db['pedidos'].estimated_document_count(),
+        'bounds': (coordinates[0] - 0.05, coordinates[1] - 0.05, coordinates[0] + 0.05, coordinates[1] + 0.05),
+    }
+
+
+# Todos os formatos de consulta que o dashboard envia, com os filtros da barra
+# lateral nas combinações que o app monta
+def dashboard_queries(values, updated_fields=None, live_time_field=DEFAULT_LIVE_TIME_FIELD,
+                      location_field=DEFAULT_ORDER_LOCATION_FIELD):
+    updated_fields = updated_fields or {}
+    restaurant_ids = [values['restaurant_id']]
+    statuses = [values['status']]
+    start, end = values['start_date'], values['end_date']
+    filtered_matches = {
+        'período': build_order_match(None, start, end),
+        'restaurantes': build_order_match(restaurant_ids),
+        'restaurantes + período': build_order_match(restaurant_ids, start, end),
+        'status + período': build_order_match(None, start, end, statuses),
+        'restaurantes + período + status': build_order_match(restaurant_ids, start, end, statuses),
+    }
+
+    checks = [
+        QueryCheck(f"carga da seção {section}", source.collection,
+                   _find(source.collection, {}, build_projection(source.fields)), True)
+        for section, source in SECTION_SOURCES.items()
+    ]
+    checks.append(QueryCheck('resumo sem filtros', 'pedidos',
+                             _aggregate('pedidos', order_summary_pipeline({})), True))
+    checks.append(QueryCheck('limites de período sem filtros', 'pedidos',
+                             _aggregate('pedidos', order_date_bounds_pipeline({})), True))
+    checks.append(QueryCheck('mapa: área dos pedidos sem filtros', 'pedidos',
+                             _aggregate('pedidos', order_location_bounds_pipeline({}, location_field)), True))
+    for label, match in filtered_matches.items():
+        checks.append(QueryCheck(f"resumo: {label}", 'pedidos',
+                                 _aggregate('pedidos', order_summary_pipeline(match)), False))
+        checks.append(QueryCheck(f"cubo: {label}", ROLLUP_COLLECTION,
+                                 _aggregate(ROLLUP_COLLECTION, rollup_summary_pipeline(match)), False))
+        checks.append(QueryCheck(f"pratos mais vendidos: {label}", 'pedidos',
+                                 _aggregate('pedidos', dish_ranking_pipeline(match)), False))
+        checks.append(QueryCheck(f"mapa: área dos pedidos: {label}", 'pedidos',
+                                 _aggregate('pedidos', order_location_bounds_pipeline(match, location_field)), False))
+    # Modo aproximado: o $sample como primeiro estágio usa o cursor aleatório
+    # (o plano não depende dos filtros, aplicados depois da amostra); acima de
+    # 5% da coleção viraria COLLSCAN com ordenação
+    checks.append(QueryCheck('amostra do modo aproximado', 'pedidos',
+                             _aggregate('pedidos', order_sample_pipeline(
+                                 filtered_matches['período'], max(sample_size_for(values['total_orders']), 1))), False))
+    checks.extend([
+        QueryCheck('limites de período: restaurantes', 'pedidos',
+                   _aggregate('pedidos', order_date_bounds_pipeline(filtered_matches['restaurantes'])), False),
+        QueryCheck('valores de status: período', 'pedidos',
+                   _aggregate('pedidos', order_status_values_pipeline(filtered_matches['período'])), False),
+        QueryCheck('cubo limites de período: restaurantes', ROLLUP_COLLECTION,
+                   _aggregate(ROLLUP_COLLECTION, rollup_date_bounds_pipeline(filtered_matches['restaurantes'])), False),
+        QueryCheck('cubo valores de status: período', ROLLUP_COLLECTION,
+                   _aggregate(ROLLUP_COLLECTION, rollup_status_values_pipeline(filtered_matches['período'])), False),
+        QueryCheck('mapa de calor: grade da área', 'pedidos',
+                   _aggregate('pedidos', order_grid_pipeline(
+                       filtered_matches['período'], values['bounds'], location_field=location_field)), False),
+        QueryCheck('último pedido (versão dos dados e cubo)', 'pedidos',
+                   _find('pedidos', {}, {'_id': 1}, {'_id': DESCENDING}, 1), False),
+        QueryCheck('contagem do restaurante (modo por restaurante)', 'pedidos',
+                   _aggregate('pedidos', [{'$match': build_order_match(restaurant_ids)},
+                                          {'$group': {'_id': 1, 'n': {'$sum': 1}}}]), False),
+        QueryCheck('cubo: janela de atualização', 'pedidos',
+                   _aggregate('pedidos', rollup_update_pipeline({'$gt': values['order_id']})[:2]), False),
+        QueryCheck('cubo: reconstrução', 'pedidos',
+                   _aggregate('pedidos', rollup_rebuild_pipeline(values['order_id'])[:2]), False),
+        QueryCheck('cubo: recálculo das horas alteradas', 'pedidos',
+                   _aggregate('pedidos', rollup_recompute_pipeline(
+                       [values['data'].replace(minute=0, second=0, microsecond=0)],
+                       values['data'], values['order_id'])[:2]), False),
+        QueryCheck('cubo: restaurantes do $lookup', 'restaurantes',
+                   _find('restaurantes', {'_id': {'$in': restaurant_ids}}), False),
+        QueryCheck('pratos mais vendidos: nomes', 'pratos',
+                   _find('pratos', {'_id': {'$in': [values['order_id']]}}, {'nome': 1}), False),
+    ])
+    # Painel ao vivo: pedidos desde a marca d'água de data (menos a sobreposição),
+    # em toda a base e no modo por restaurante
+    since = values['data'] - datetime.timedelta(minutes=max(LIVE_WINDOWS))
+    live_projection = {'_id': 1, 'data_hora_pedido': 1, 'valor_total': 1, 'status_pedido': 1, live_time_field: 1}
+    for label, query in (('', {}), (' (restaurante)', scope_query('pedidos', str(values['restaurant_id'])))):
+        checks.append(QueryCheck(f"painel ao vivo: pedidos recentes{label}", 'pedidos',
+                                 _find('pedidos', dict(query, **{live_time_field: {'$gte': since}}),
+                                       live_projection, {live_time_field: ASCENDING}), False))
+    # Carga das seções no modo por restaurante (filtro de restaurante na consulta)
+    for section, source in SECTION_SOURCES.items():
+        checks.append(QueryCheck(f"carga do restaurante: {section}", source.collection,
+                                 _find(source.collection, scope_query(section, str(values['restaurant_id'])),
+                                       build_projection(source.fields)), False))
+    # Busca incremental (modo delta) das seções que só crescem; com campo de
+    # alteração, o $or da marca d'água de _id com a do campo
+    for section in ('pedidos', 'avaliacoes'):
+        source = SECTION_SOURCES[section]
+        query = {'_id': {'$gt': values['order_id']}}
+        if section in updated_fields:
+            query = {'$or': [query, {updated_fields[section]: {'$gt': values['data']}}]}
+        checks.append(QueryCheck(f"delta da seção {section}", source.collection,
+                                 _find(source.collection, query, build_projection(source.fields)), False))
+    # Recálculo do cubo: horas dos pedidos alterados desde a última rodada
+    if 'pedidos' in updated_fields:
+        checks.append(QueryCheck('cubo: horas dos pedidos alterados', 'pedidos',
+                                 _aggregate('pedidos', rollup_changed_hours_pipeline(
+                                     updated_fields['pedidos'], values['data'], values['order_id'])), False))
+    return checks
+
+
+# Roda o explain de cada consulta e classifica o plano
+def verify_query_plans(db, checks):
+    results = []
+    for check in checks:
+        try:
+            explain = db.command('explain', check.command, verbosity='queryPlanner')
+        except OperationFailure as e:
+            results.append(PlanResult(check.name, check.collection, f"explain falhou: {e}", 'erro'))
+            continue
+        stages = plan_stages(explain)
+        collscan = any(stage.startswith('COLLSCAN') for stage in stages)
+        if not collscan:
+            status = 'ok'
+        elif check.full_scan:
+            status = 'varredura esperada'
+        else:
+            status = 'COLLSCAN'
+        results.append(PlanResult(check.name, check.collection, ' > '.join(stages) or '-', status))
+    return results
+
+
+def print_results(results):
+    width = max(len(result.name) for result in results) + 2
+    for result in results:
+        print(f"  {result.status:<20}{result.name:<{width}}{result.collection:<22}{result.plan}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cria os índices do dashboard e verifica os planos das consultas')
+    parser.add_argument('--uri', default=os.environ.get('MONGODB_URI'))
+    parser.add_argument('--db', default='restaurante_reviews_db')
+    parser.add_argument('--check-only', action='store_true', help='não cria índices, só verifica os planos')
+    parser.add_argument('--updated-field', action='append', default=[], metavar='SEÇÃO=CAMPO',
+                        help='campo de alteração de uma seção (secret REFRESH_UPDATED_FIELDS)')
+    parser.add_argument('--live-time-field', default=DEFAULT_LIVE_TIME_FIELD,
+                        help='campo de data do painel ao vivo (secret LIVE_TIME_FIELD)')
+    parser.add_argument('--location-field', default=DEFAULT_ORDER_LOCATION_FIELD,
+                        help='local de entrega dos pedidos, GeoJSON Point (secret ORDER_LOCATION_FIELD)')
+    args = parser.parse_args()
+    if not args.uri:
+        raise SystemExit('Informe --uri ou a variável MONGODB_URI')
+    updated_fields = dict(item.split('=', 1) for item in args.updated_field)
+    unknown = set(updated_fields) - set(SECTION_SOURCES)
+    if unknown:
+        raise SystemExit(f"Seções desconhecidas em --updated-field: {', '.join(sorted(unknown))}")
+
+    # Índices e explain no primário, onde os índices acabaram de ser criados
+    mongo = MongoAccess(args.uri, args.db, {'read_preference': 'primary'})
+    if not args.check_only:
+        print('criando índices')
+        for collection, index in ensure_indexes(mongo.db, updated_fields, args.live_time_field, args.location_field):
+            print(f"  {collection:<22}{index}")
+
+    print('\nplanos das consultas do dashboard')
+    results = verify_query_plans(
+        mongo.db, dashboard_queries(sample_values(mongo.db, args.location_field), updated_fields,
+                                    args.live_time_field, args.location_field)
+    )
+    print_results(results)
+
+    failures = [result for result in results if result.status in ('COLLSCAN', 'erro')]
+    if failures:
+        print(f"\n{len(failures)} consulta(s) sem índice ou com explain falhando:", file=sys.stderr)
+        for result in failures:
+            print(f"  {result.name} ({result.collection}): {result.plan}", file=sys.stderr)
+        raise SystemExit(1)
+    print(f"\n{len(results)} consultas verificadas, nenhum COLLSCAN inesperado")
+
+
+if __name__ == '__main__':
+    main()
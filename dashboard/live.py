@@ -0,0 +1,238 @@
+# Métricas ao vivo dos pedidos: os pedidos novos são lidos pela marca d'água
+# de um campo de data (ou por um change stream, em replica sets) e somados num buffer
+# circular de buckets por minuto. Cada pedido custa O(1) e a memória é fixa
+# (um bucket por minuto da maior janela), qualquer que seja o movimento;
+# as janelas de 15, 30 e 60 minutos somam só os buckets que cobrem.
+import datetime
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+LIVE_WINDOWS = (15, 30, 60)
+LIVE_MODES = ('poll', 'change_stream')
+# Colunas de status no buffer; status além do limite somam em "outros"
+MAX_STATUS = 15
+OTHER_STATUS = 'outros'
+# Campo de data usado como marca d'água por padrão
+DEFAULT_LIVE_TIME_FIELD = 'data_hora_pedido'
+# Cada leitura volta este tanto antes da marca d'água, para pegar pedidos
+# gravados com atraso (relógios dos servidores fora de sincronia, commits
+# lentos); os já somados são reconhecidos pelo _id
+DEFAULT_OVERLAP_SECONDS = 120
+
+_LIVE_FIELDS = {'_id': 1, 'data_hora_pedido': 1, 'valor_total': 1, 'status_pedido': 1}
+
+
+# Datas naive em UTC, como o pymongo devolve as datas gravadas
+def _naive_utc(timestamp):
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _utcnow():
+    return _naive_utc(datetime.datetime.now(datetime.timezone.utc))
+
+
+def _epoch_minute(timestamp):
+    return int((_naive_utc(timestamp) - datetime.datetime(1970, 1, 1)).total_seconds() // 60)
+
+
+# Buffer circular de buckets por minuto: o slot de um minuto é minuto % tamanho
+# e é zerado quando um minuto mais novo passa a ocupá-lo
+class MinuteRing:
+    def __init__(self, minutes=max(LIVE_WINDOWS)):
+        self.minutes = minutes
+        self.bucket_minute = np.full(minutes, -1, dtype=np.int64)
+        self.orders = np.zeros(minutes, dtype=np.int64)
+        self.revenue = np.zeros(minutes, dtype=np.float64)
+        self.status_orders = np.zeros((minutes, MAX_STATUS + 1), dtype=np.int64)
+        self.status_columns = {}
+
+    def _status_column(self, status):
+        column = self.status_columns.get(status)
+        if column is None:
+            if len(self.status_columns) >= MAX_STATUS:
+                return MAX_STATUS
+            column = self.status_columns[status] = len(self.status_columns)
+        return column
+
+    # Soma um pedido no bucket do seu minuto; pedidos mais antigos que o buffer são ignorados
+    def add(self, minute, valor, status):
+        slot = minute % self.minutes
+        current = self.bucket_minute[slot]
+        if minute < current:
+            return False
+        if minute > current:
+            self.bucket_minute[slot] = minute
+            self.orders[slot] = 0
+            self.revenue[slot] = 0.0
+            self.status_orders[slot] = 0
+        self.orders[slot] += 1
+        self.revenue[slot] += valor
+        self.status_orders[slot, self._status_column(status)] += 1
+        return True
+
+    # Slots dos últimos `minutes` minutos até now_minute (inclusive)
+    def _window_mask(self, now_minute, minutes):
+        return (self.bucket_minute > now_minute - minutes) & (self.bucket_minute <= now_minute)
+
+    def window(self, now_minute, minutes):
+        mask = self._window_mask(now_minute, minutes)
+        pedidos = int(self.orders[mask].sum())
+        faturamento = float(self.revenue[mask].sum())
+        status_totals = self.status_orders[mask].sum(axis=0)
+        labels = list(self.status_columns) + [OTHER_STATUS]
+        columns = list(self.status_columns.values()) + [MAX_STATUS]
+        return {
+            'minutos': minutes,
+            'pedidos': pedidos,
+            'faturamento': faturamento,
+            'pedidos_por_minuto': pedidos / minutes,
+            'ticket_medio': faturamento / pedidos if pedidos else 0.0,
+            'status': {label: int(status_totals[column]) for label, column in zip(labels, columns)
+                       if status_totals[column]},
+        }
+
+    # Série por minuto (minutos sem pedidos com zero) para o gráfico
+    def per_minute(self, now_minute, minutes):
+        minutes_axis = np.arange(now_minute - minutes + 1, now_minute + 1, dtype=np.int64)
+        slots = minutes_axis % self.minutes
+        valid = self.bucket_minute[slots] == minutes_axis
+        return pd.DataFrame({
+            'minuto': pd.to_datetime(minutes_axis * 60, unit='s'),
+            'pedidos': np.where(valid, self.orders[slots], 0),
+            'faturamento': np.where(valid, self.revenue[slots], 0.0),
+        })
+
+
+# Pedidos novos acompanhados a partir da coleção, compartilhado entre as sessões;
+# `query` restringe os pedidos acompanhados (ex.: um restaurante) e
+# `time_field` é a data usada como marca d'água (a do pedido ou, se a coleção
+# tiver, a de inserção), que não depende da ordem dos ObjectIds
+class LiveOrderFeed:
+    def __init__(self, collection, mode='poll', minutes=max(LIVE_WINDOWS), poll_seconds=5, query=None,
+                 time_field=DEFAULT_LIVE_TIME_FIELD, overlap_seconds=DEFAULT_OVERLAP_SECONDS):
+        if mode not in LIVE_MODES:
+            raise ValueError(f"Modo do painel ao vivo desconhecido: {mode}")
+        self.collection = collection
+        self.mode = mode
+        self.poll_seconds = poll_seconds
+        self.query = query or {}
+        self.time_field = time_field
+        self.overlap = datetime.timedelta(seconds=overlap_seconds)
+        self.fields = dict(_LIVE_FIELDS, **{time_field: 1})
+        self.ring = MinuteRing(minutes)
+        self.watermark = None
+        # _id -> data dos pedidos já somados dentro da janela de sobreposição
+        self._seen = {}
+        self.last_poll = 0.0
+        self.last_batch = 0
+        self._stream = None
+        self._resume_token = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _now_minute(self):
+        return _epoch_minute(_utcnow())
+
+    def _add(self, order):
+        timestamp = order.get('data_hora_pedido')
+        if not isinstance(timestamp, datetime.datetime):
+            return
+        valor = order.get('valor_total')
+        self.ring.add(_epoch_minute(timestamp), float(valor) if valor is not None else 0.0,
+                      order.get('status_pedido'))
+
+    # Lê os pedidos com data a partir de `since`, somando só os que ainda não
+    # foram vistos, e avança a marca d'água (nunca além de agora, para um
+    # relógio adiantado não esconder os pedidos seguintes)
+    def _read_since(self, since):
+        count = 0
+        latest = self.watermark
+        query = dict(self.query, **{self.time_field: {'$gte': since}})
+        for order in self.collection.find(query, self.fields, sort=[(self.time_field, ASCENDING)]):
+            timestamp = order.get(self.time_field)
+            if not isinstance(timestamp, datetime.datetime) or order['_id'] in self._seen:
+                continue
+            timestamp = _naive_utc(timestamp)
+            self._seen[order['_id']] = timestamp
+            self._add(order)
+            latest = timestamp if latest is None else max(latest, timestamp)
+            count += 1
+        if latest is not None:
+            self.watermark = min(latest, _utcnow())
+            horizon = self.watermark - self.overlap
+            self._seen = {order_id: timestamp for order_id, timestamp in self._seen.items() if timestamp >= horizon}
+        return count
+
+    # Carga inicial: só os pedidos da maior janela (índice do campo de data)
+    def _start(self):
+        if self.mode == 'change_stream':
+            self._open_change_stream()
+        self._read_since(_utcnow() - datetime.timedelta(minutes=self.ring.minutes))
+        self._started = True
+
+    def _change_stream_pipeline(self):
+        match = {'operationType': 'insert'}
+        match.update({f"fullDocument.{field}": value for field, value in self.query.items()})
+        return [{'$match': match}]
+
+    def _open_change_stream(self):
+        try:
+            self._stream = self.collection.watch(self._change_stream_pipeline(), max_await_time_ms=50)
+        except (PyMongoError, NotImplementedError):
+            # Standalone sem replica set: segue pela marca d'água de data
+            self._stream = None
+            self.mode = 'poll'
+
+    # Pedidos a partir da marca d'água menos a sobreposição
+    def _poll(self):
+        if self.watermark is None:
+            return self._read_since(_utcnow() - datetime.timedelta(minutes=self.ring.minutes))
+        return self._read_since(self.watermark - self.overlap)
+
+    def _drain_change_stream(self):
+        count = 0
+        try:
+            while True:
+                change = self._stream.try_next()
+                if change is None:
+                    break
+                self._resume_token = self._stream.resume_token
+                self._add(change['fullDocument'])
+                count += 1
+        except PyMongoError:
+            # Stream interrompido: retoma do último token na próxima leitura
+            self._stream = self.collection.watch(
+                self._change_stream_pipeline(), max_await_time_ms=50, resume_after=self._resume_token
+            )
+        return count
+
+    # Lê os pedidos novos (no máximo uma vez a cada poll_seconds, para todas as sessões)
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not self._started:
+                self._start()
+            elif force or now - self.last_poll >= self.poll_seconds:
+                if self.mode == 'change_stream' and self._stream is not None:
+                    self.last_batch = self._drain_change_stream()
+                else:
+                    self.last_batch = self._poll()
+            else:
+                return
+            self.last_poll = now
+
+    def windows(self, windows=LIVE_WINDOWS):
+        with self._lock:
+            now_minute = self._now_minute()
+            return [self.ring.window(now_minute, minutes) for minutes in windows]
+
+    def per_minute(self, minutes=None):
+        with self._lock:
+            return self.ring.per_minute(self._now_minute(), minutes or self.ring.minutes)
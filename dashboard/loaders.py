@@ -0,0 +1,41 @@
+# Fontes de dados de cada seção do dashboard: cada seção declara a coleção e
+# os campos que usa (com o tipo definido no esquema da coleção), e só é
+# buscada quando a seção é renderizada.
+from collections import namedtuple
+
+from dashboard.schema import schema_fields
+
+SectionSource = namedtuple('SectionSource', ['collection', 'fields'])
+
+
+def _source(collection, *names):
+    return SectionSource(collection, schema_fields(collection, names))
+
+
+SECTION_SOURCES = {
+    # Filtros da barra lateral e "Performance dos Restaurantes"
+    'restaurantes': _source('restaurantes', '_id', 'nome', 'categorias'),
+    # Métricas, "Análise Detalhada de Pedidos" e "Evolução Temporal"
+    'pedidos': _source('pedidos', '_id', 'restaurante_id', 'status_pedido', 'valor_total', 'data_hora_pedido'),
+    # "Análise de Avaliações e Satisfação"
+    'avaliacoes': _source('avaliacoes', '_id', 'nota', 'data_avaliacao'),
+    # "Análise do Cardápio e Pratos"
+    'pratos': _source('pratos', 'nome', 'preco'),
+}
+
+
+# Converte a lista de campos em projeção do MongoDB ('_id' só vem se for pedido)
+def build_projection(fields):
+    if fields is None:
+        return None
+    projection = {field: 1 for field in fields}
+    if '_id' not in projection:
+        projection['_id'] = 0
+    return projection
+
+
+# Retorna a fonte declarada para uma seção
+def get_section_source(section):
+    if section not in SECTION_SOURCES:
+        raise KeyError(f"Seção sem fonte de dados declarada: {section}")
+    return SECTION_SOURCES[section]
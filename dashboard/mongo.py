@@ -0,0 +1,213 @@
+# Camada de acesso ao MongoDB: cliente com pool e timeouts configuráveis,
+# compressão de rede, leituras analíticas em secundários (secondaryPreferred) e
+# um log das consultas lentas com o resumo do plano de execução (explain).
+#
+# As opções vêm da seção [MONGO] do secrets.toml, por exemplo:
+#   [MONGO]
+#   max_pool_size = 50
+#   read_preference = "secondaryPreferred"
+#   compressors = "zstd,snappy,zlib"
+#   batch_size = 20000
+#   slow_query_ms = 500
+import collections
+import importlib.util
+import json
+import logging
+import threading
+import time
+
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger('dashboard.mongo')
+
+DEFAULT_SETTINGS = {
+    'max_pool_size': 20,
+    'min_pool_size': 0,
+    'max_idle_time_ms': 300_000,
+    'server_selection_timeout_ms': 5_000,
+    'connect_timeout_ms': 5_000,
+    # Leituras completas de coleções grandes podem levar mais que alguns segundos
+    'socket_timeout_ms': 120_000,
+    'read_preference': 'secondaryPreferred',
+    'max_staleness_seconds': None,
+    'compressors': 'zstd,snappy,zlib',
+    'zlib_compression_level': 1,
+    'batch_size': 20_000,
+    'slow_query_ms': 500,
+    'explain_slow_queries': True,
+    'app_name': 'dashboard-restaurantes',
+}
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+# Módulo Python exigido por cada compressor (zlib faz parte da biblioteca padrão)
+_COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': None}
+
+# Comandos de leitura que valem o registro (getMore faz parte do comando original)
+_LOGGED_COMMANDS = ('find', 'aggregate', 'count', 'distinct')
+# Campos de sessão/protocolo que não entram no explain
+_SESSION_FIELDS = ('lsid', 'txnNumber', '$clusterTime', '$db', '$readPreference', 'readConcern', 'apiVersion')
+
+
+def merge_settings(settings=None):
+    merged = dict(DEFAULT_SETTINGS)
+    merged.update({key: value for key, value in dict(settings or {}).items() if key in DEFAULT_SETTINGS})
+    return merged
+
+
+# Compressores pedidos que têm o módulo instalado, na ordem de preferência
+def available_compressors(requested):
+    names = [name.strip() for name in requested.split(',')] if isinstance(requested, str) else list(requested)
+    return [
+        name for name in names
+        if name in _COMPRESSOR_MODULES
+        and (_COMPRESSOR_MODULES[name] is None or importlib.util.find_spec(_COMPRESSOR_MODULES[name]) is not None)
+    ]
+
+
+# Argumentos do MongoClient a partir das configurações
+def client_options(settings):
+    options = {
+        'maxPoolSize': settings['max_pool_size'],
+        'minPoolSize': settings['min_pool_size'],
+        'maxIdleTimeMS': settings['max_idle_time_ms'],
+        'serverSelectionTimeoutMS': settings['server_selection_timeout_ms'],
+        'connectTimeoutMS': settings['connect_timeout_ms'],
+        'socketTimeoutMS': settings['socket_timeout_ms'],
+        'appname': settings['app_name'],
+    }
+    compressors = available_compressors(settings['compressors'])
+    if compressors:
+        options['compressors'] = compressors
+        if 'zlib' in compressors:
+            options['zlibCompressionLevel'] = settings['zlib_compression_level']
+    return options
+
+
+# Read preference das consultas analíticas (com staleness máxima opcional)
+def analytics_read_preference(settings):
+    mode = READ_PREFERENCES.get(settings['read_preference'])
+    if mode is None:
+        raise ValueError(f"read_preference desconhecida: {settings['read_preference']}")
+    if settings['max_staleness_seconds'] and mode is not ReadPreference.PRIMARY:
+        return type(mode)(max_staleness=settings['max_staleness_seconds'])
+    return mode
+
+
+# Estágios do plano vencedor na ordem de execução, com o índice usado,
+# ex. ['IXSCAN(data_hora_pedido_1)', 'FETCH']
+def plan_stages(explain):
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stage = node['stage']
+                if node.get('indexName'):
+                    stage = f"{stage}({node['indexName']})"
+                stages.append(stage)
+            for key, value in node.items():
+                if key not in ('rejectedPlans', 'executionStats', 'allPlansExecution'):
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain.get('queryPlanner', {}).get('winningPlan') or explain.get('stages') or explain)
+    # Os planos são aninhados da raiz para as folhas; a leitura fica na ordem de execução
+    return stages[::-1]
+
+
+# Resumo do plano vencedor, ex. "IXSCAN(data_hora_pedido_1) > FETCH"
+def plan_summary(explain):
+    return ' > '.join(plan_stages(explain)) or None
+
+
+def _strip_session_fields(command):
+    return {key: value for key, value in command.items() if key not in _SESSION_FIELDS}
+
+
+# Registro das consultas lentas: o listener só guarda o comando e a duração;
+# o explain roda depois, fora da thread de monitoramento do driver
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms, explain=True, maxlen=200):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.entries = collections.deque(maxlen=maxlen)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in _LOGGED_COMMANDS:
+            with self._lock:
+                self._pending[event.request_id] = (event.database_name, _strip_session_fields(event.command))
+
+    def succeeded(self, event):
+        with self._lock:
+            pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        database, command = pending
+        entry = {
+            'quando': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'comando': event.command_name,
+            'colecao': command.get(event.command_name),
+            'ms': round(duration_ms, 1),
+            'servidor': f"{event.connection_id[0]}:{event.connection_id[1]}" if event.connection_id else None,
+            'plano': None,
+            '_database': database,
+            '_command': command,
+        }
+        with self._lock:
+            self.entries.append(entry)
+        logger.warning("consulta lenta: %s %s em %.0f ms", entry['comando'], entry['colecao'], duration_ms)
+
+    def failed(self, event):
+        with self._lock:
+            self._pending.pop(event.request_id, None)
+
+    # Roda o explain (queryPlanner, sem executar a consulta) das entradas novas
+    def explain_pending(self, client, limit=5):
+        if not self.explain:
+            return
+        with self._lock:
+            pending = [entry for entry in self.entries if entry['plano'] is None and '_command' in entry][:limit]
+        for entry in pending:
+            command = entry.pop('_command')
+            try:
+                result = client[entry.pop('_database')].command('explain', command, verbosity='queryPlanner')
+                entry['plano'] = plan_summary(result)
+            except PyMongoError as e:
+                entry['plano'] = f"explain indisponível: {e}"
+            logger.info("plano da consulta lenta: %s", json.dumps(
+                {key: value for key, value in entry.items() if not key.startswith('_')}, ensure_ascii=False, default=str
+            ))
+
+    def to_records(self):
+        with self._lock:
+            return [{key: value for key, value in entry.items() if not key.startswith('_')} for entry in self.entries]
+
+
+# Conexão configurada: db (primário, para escritas e índices) e analytics_db
+# (leituras do dashboard, com a read preference configurada)
+class MongoAccess:
+    def __init__(self, uri, db_name, settings=None):
+        self.settings = merge_settings(settings)
+        self.slow_log = SlowQueryLog(self.settings['slow_query_ms'], self.settings['explain_slow_queries'])
+        self.client = MongoClient(uri, event_listeners=[self.slow_log], **client_options(self.settings))
+        self.db = self.client[db_name]
+        self.analytics_db = self.db.with_options(read_preference=analytics_read_preference(self.settings))
+        self.batch_size = self.settings['batch_size']
+
+    def explain_slow_queries(self):
+        self.slow_log.explain_pending(self.client)
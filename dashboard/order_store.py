@@ -0,0 +1,74 @@
+# Pedidos em cache já com as datas convertidas e ordenados por
+# data_hora_pedido. A janela do filtro de período é localizada com
+# searchsorted e devolvida como fatia (view) do frame ordenado, então mudar o
+# período custa O(log n) mais o tamanho da fatia.
+import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# Valores em ordem crescente, com os nulos (pedidos sem data) todos no fim
+def is_time_sorted(timestamps):
+    dated = timestamps.notna().to_numpy()
+    n_dated = int(dated.sum())
+    return bool(dated[:n_dated].all()) and timestamps.iloc[:n_dated].is_monotonic_increasing
+
+
+class OrderStore:
+    def __init__(self, df_pedidos):
+        frame = df_pedidos
+        if not frame.empty and 'data_hora_pedido' in frame.columns:
+            if not pd.api.types.is_datetime64_any_dtype(frame['data_hora_pedido']):
+                frame = frame.assign(data_hora_pedido=pd.to_datetime(frame['data_hora_pedido']))
+            # Ordenação estável; pedidos sem data ficam no fim e fora de qualquer janela.
+            # Frames que já chegam ordenados (snapshot) são usados sem cópia.
+            if not is_time_sorted(frame['data_hora_pedido']):
+                frame = frame.sort_values('data_hora_pedido', kind='stable', na_position='last')
+            self.n_dated = int(frame['data_hora_pedido'].notna().sum())
+            self.timestamps = frame['data_hora_pedido'].to_numpy()[:self.n_dated]
+        else:
+            self.n_dated = 0
+            self.timestamps = np.empty(0, dtype='datetime64[ns]')
+        if not isinstance(frame.index, pd.RangeIndex) or frame.index.start != 0 or frame.index.step != 1:
+            frame = frame.reset_index(drop=True)
+        self.frame = frame
+        self._restaurant_bounds = self._bounds_by_restaurant()
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    # Primeira e última data de pedido de cada restaurante, para os limites do
+    # filtro de período sem varrer os pedidos
+    def _bounds_by_restaurant(self):
+        if not self.n_dated or 'restaurante_id' not in self.frame.columns:
+            return None
+        dated = self.frame.iloc[:self.n_dated]
+        bounds = dated.groupby('restaurante_id', observed=True)['data_hora_pedido'].agg(['min', 'max'])
+        bounds.index = bounds.index.astype(str)
+        return bounds
+
+    # Limites de data dos pedidos (opcionalmente só dos restaurantes informados)
+    def date_bounds(self, restaurant_ids=None):
+        if not self.n_dated:
+            return None, None
+        if restaurant_ids is None:
+            return pd.Timestamp(self.timestamps[0]).date(), pd.Timestamp(self.timestamps[-1]).date()
+        if self._restaurant_bounds is None:
+            return None, None
+        selected = self._restaurant_bounds.reindex(list(restaurant_ids)).dropna()
+        if selected.empty:
+            return None, None
+        return selected['min'].min().date(), selected['max'].max().date()
+
+    # Fatia dos pedidos entre as datas (inclusive), sem copiar as colunas
+    def slice_dates(self, start_date, end_date):
+        start = np.datetime64(datetime.datetime.combine(start_date, datetime.time.min))
+        end = np.datetime64(datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min))
+        lo = np.searchsorted(self.timestamps, start, side='left')
+        hi = np.searchsorted(self.timestamps, end, side='left')
+        return self.frame.iloc[lo:hi]
@@ -0,0 +1,74 @@
+# Busca concorrente das seções: as leituras no MongoDB são limitadas pela rede
+# (round-trips de cada lote do cursor), então várias coleções em paralelo num
+# pool pequeno de threads custam o tempo da mais lenta, e não a soma de todas.
+# Cada seção continua com o seu próprio cache; o pool só decide quando a busca
+# começa, e a página espera apenas pela seção que vai renderizar.
+import concurrent.futures
+
+DEFAULT_MAX_WORKERS = 4
+
+
+# Executa as funções de `loaders` ({nome: função}) em paralelo e devolve
+# {nome: resultado}; `thread_setup` roda no início de cada thread do pool
+# (no Streamlit, para anexar o contexto da execução do script)
+def fetch_concurrently(loaders, max_workers=DEFAULT_MAX_WORKERS, thread_setup=None):
+    if len(loaders) <= 1:
+        return {name: load() for name, load in loaders.items()}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(loaders)),
+        thread_name_prefix='fetch',
+        initializer=thread_setup,
+    ) as executor:
+        futures = {name: executor.submit(load) for name, load in loaders.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# Seções de uma execução buscadas em segundo plano assim que a página começa;
+# get() devolve o frame (ou repassa a exceção) da seção pedida. Com `executor`,
+# as buscas rodam num pool de fora (no app, um só para todas as execuções), e
+# uma execução interrompida antes do shutdown() não deixa threads para trás;
+# `thread_setup` roda antes de cada busca, já que as threads do pool atendem
+# execuções diferentes
+class SectionPrefetcher:
+    def __init__(self, load, max_workers=DEFAULT_MAX_WORKERS, thread_setup=None, executor=None):
+        self.load = load
+        self.max_workers = max_workers
+        self.thread_setup = thread_setup
+        self.futures = {}
+        self._executor = executor
+        self._owns_executor = executor is None
+
+    def start(self, sections):
+        pending = [section for section in sections if section not in self.futures]
+        if not pending:
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='prefetch',
+            )
+        for section in pending:
+            self.futures[section] = self._executor.submit(self._load, section)
+
+    def _load(self, section):
+        if self.thread_setup is not None:
+            self.thread_setup()
+        return self.load(section)
+
+    def __contains__(self, section):
+        return section in self.futures
+
+    def ready(self, section):
+        return section in self.futures and self.futures[section].done()
+
+    def get(self, section):
+        return self.futures[section].result()
+
+    # Cancela as buscas que ninguém vai usar nesta execução, sem esperar as que
+    # já começaram; o pool próprio é liberado, o de fora continua com as outras
+    def shutdown(self):
+        for future in self.futures.values():
+            future.cancel()
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,150 @@
+# Medição por etapa de cada execução (rerun) do script: leitura no MongoDB,
+# filtros da barra lateral, agregações e renderização dos gráficos. Desligado,
+# span() devolve um registro vazio e o custo é só o do gerenciador de contexto.
+import contextlib
+import datetime
+import json
+import logging
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger('dashboard.profiling')
+
+# Sessões do mesmo processo gravam no mesmo arquivo de trace; sem a trava,
+# linhas maiores que o buffer de escrita podem se intercalar
+_export_lock = threading.Lock()
+
+
+# Tamanho (linhas e bytes) de um frame, série ou lista; sem deep=True, que
+# percorreria todas as strings a cada rerun
+def frame_stats(obj):
+    if obj is None:
+        return {}
+    if isinstance(obj, pd.DataFrame):
+        return {'linhas': len(obj), 'bytes': int(obj.memory_usage(index=False).sum())}
+    if isinstance(obj, pd.Series):
+        return {'linhas': len(obj), 'bytes': int(obj.memory_usage(index=False))}
+    if hasattr(obj, '__len__'):
+        return {'linhas': len(obj)}
+    return {}
+
+
+# Quantidade de pontos enviados ao navegador por uma figura do Plotly
+def figure_points(fig):
+    total = 0
+    for trace in fig.data:
+        for attr in ('x', 'values', 'z', 'lat'):
+            values = getattr(trace, attr, None)
+            if values is not None:
+                total += len(values)
+                break
+    return total
+
+
+class Span:
+    def __init__(self, name, depth, start):
+        self.name = name
+        self.depth = depth
+        self.start = start
+        self.attrs = {}
+        self.ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    # Linhas e bytes do resultado da etapa
+    def frame(self, obj):
+        self.attrs.update(frame_stats(obj))
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        pass
+
+    def frame(self, obj):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.spans = []
+        self.context = {}
+        # Etapas também chegam das threads de busca concorrente: o nível de
+        # aninhamento é por thread e a lista de etapas é protegida por um lock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread = threading.get_ident()
+        self._started = time.perf_counter()
+        self._started_at = datetime.datetime.now(datetime.timezone.utc)
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+        depth = getattr(self._local, 'depth', 0)
+        span = Span(name, depth, time.perf_counter())
+        if threading.get_ident() != self._thread:
+            span.set(thread=threading.current_thread().name)
+        span.set(**attrs)
+        with self._lock:
+            self.spans.append(span)
+        self._local.depth = depth + 1
+        try:
+            yield span
+        finally:
+            self._local.depth = depth
+            span.ms = (time.perf_counter() - span.start) * 1000
+
+    # Parâmetros da execução (filtros escolhidos), gravados junto do trace
+    def annotate(self, **context):
+        if self.enabled:
+            self.context.update(context)
+
+    def total_ms(self):
+        return (time.perf_counter() - self._started) * 1000
+
+    # Etapas em tabela, com indentação para as etapas aninhadas
+    def to_frame(self):
+        with self._lock:
+            spans = list(self.spans)
+        rows = [{
+            'etapa': '  ' * span.depth + span.name,
+            'ms': span.ms,
+            'linhas': span.attrs.get('linhas'),
+            'bytes': span.attrs.get('bytes'),
+            'detalhes': ', '.join(f"{k}={v}" for k, v in span.attrs.items() if k not in ('linhas', 'bytes')),
+        } for span in spans]
+        return pd.DataFrame(rows, columns=['etapa', 'ms', 'linhas', 'bytes', 'detalhes'])
+
+    def to_record(self):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            'inicio': self._started_at.isoformat(),
+            'total_ms': round(self.total_ms(), 3),
+            'contexto': self.context,
+            'etapas': [{
+                'etapa': span.name,
+                'nivel': span.depth,
+                'inicio_ms': round((span.start - self._started) * 1000, 3),
+                'ms': None if span.ms is None else round(span.ms, 3),
+                **span.attrs,
+            } for span in spans],
+        }
+
+    # Uma linha JSON por rerun no arquivo de trace (e no log estruturado)
+    def export(self, path=None):
+        if not self.enabled:
+            return
+        line = json.dumps(self.to_record(), ensure_ascii=False, default=str)
+        logger.info(line)
+        if path:
+            with _export_lock, open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
@@ -0,0 +1,288 @@
+# Camada de consultas: traduz o estado dos filtros da barra lateral em um
+# $match e calcula os agregados do dashboard no próprio MongoDB, para que só
+# resultados pequenos trafeguem pela rede.
+import datetime
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+# Acima deste número de pedidos o dashboard deixa de trazer a coleção inteira
+# para o pandas e passa a usar os pipelines de agregação
+PANDAS_FALLBACK_MAX_DOCS = 50_000
+
+DIAS_ORDEM = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DIAS_PT = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+# $dayOfWeek do MongoDB vai de 1 (domingo) a 7 (sábado)
+MONGO_DIA_SEMANA = {2: 'Monday', 3: 'Tuesday', 4: 'Wednesday', 5: 'Thursday', 6: 'Friday', 7: 'Saturday', 1: 'Sunday'}
+
+# Células da matriz dia da semana (0 = segunda) x hora do dia
+HORAS_SEMANA = 7 * 24
+
+
+# Função para converter ids em string de volta para ObjectId
+def to_object_ids(ids):
+    return [ObjectId(i) if isinstance(i, str) and ObjectId.is_valid(i) else i for i in ids]
+
+
+# Função para montar o $match dos pedidos a partir dos filtros da barra lateral
+# restaurant_ids=None significa "sem filtro de restaurante"
+def build_order_match(restaurant_ids=None, start_date=None, end_date=None, statuses=None):
+    match = {}
+    if restaurant_ids is not None:
+        match['restaurante_id'] = {'$in': to_object_ids(restaurant_ids)}
+    if start_date is not None or end_date is not None:
+        periodo = {}
+        if start_date is not None:
+            periodo['$gte'] = datetime.datetime.combine(start_date, datetime.time.min)
+        if end_date is not None:
+            periodo['$lt'] = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min)
+        match['data_hora_pedido'] = periodo
+    if statuses is not None:
+        match['status_pedido'] = {'$in': list(statuses)}
+    return match
+
+
+# Pipeline com os limites de data disponíveis para o filtro de período
+def order_date_bounds_pipeline(match):
+    return [
+        {'$match': match},
+        {'$group': {'_id': None,
+                    'min_date': {'$min': '$data_hora_pedido'},
+                    'max_date': {'$max': '$data_hora_pedido'}}},
+    ]
+
+
+# Pipeline com os status existentes para o filtro de status
+def order_status_values_pipeline(match):
+    return [
+        {'$match': match},
+        {'$group': {'_id': '$status_pedido', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+    ]
+
+
+# Pipeline único ($facet) com KPIs, status, dia da semana x hora, evolução
+# diária e faturamento por restaurante
+def order_summary_pipeline(match):
+    return [
+        {'$match': match},
+        {'$facet': {
+            'kpis': [
+                {'$group': {
+                    '_id': None,
+                    'total_pedidos': {'$sum': 1},
+                    'valor_total': {'$sum': '$valor_total'},
+                    'pedidos_entregues': {'$sum': {'$cond': [{'$eq': ['$status_pedido', 'entregue']}, 1, 0]}},
+                }},
+            ],
+            'status': [
+                {'$group': {'_id': '$status_pedido', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1}},
+            ],
+            'hora_semana': [
+                {'$group': {
+                    '_id': {'dia': {'$dayOfWeek': '$data_hora_pedido'}, 'hora': {'$hour': '$data_hora_pedido'}},
+                    'count': {'$sum': 1},
+                    'faturamento': {'$sum': '$valor_total'},
+                }},
+            ],
+            'diario': [
+                {'$group': {
+                    '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$data_hora_pedido'}},
+                    'faturamento': {'$sum': '$valor_total'},
+                    'quantidade': {'$sum': 1},
+                }},
+                {'$sort': {'_id': 1}},
+            ],
+            'por_restaurante': [
+                {'$group': {'_id': '$restaurante_id', 'valor_total': {'$sum': '$valor_total'}}},
+            ],
+        }},
+    ]
+
+
+# Busca os limites de data no servidor
+def fetch_order_date_bounds(collection, match):
+    result = list(collection.aggregate(order_date_bounds_pipeline(match)))
+    if not result or result[0]['min_date'] is None:
+        return None, None
+    return pd.Timestamp(result[0]['min_date']).date(), pd.Timestamp(result[0]['max_date']).date()
+
+
+# Busca os status existentes no servidor
+def fetch_order_status_values(collection, match):
+    return [row['_id'] for row in collection.aggregate(order_status_values_pipeline(match))]
+
+
+# Código da célula (dia da semana * 24 + hora) de cada data, direto dos
+# inteiros do datetime64, sem passar por nomes de dia; datas vazias ficam de fora
+def hour_weekday_codes(timestamps):
+    values = np.asarray(timestamps, dtype='datetime64[s]')
+    valid = ~np.isnat(values)
+    days, seconds = np.divmod(values[valid].astype(np.int64), 86400)
+    # 01/01/1970 foi uma quinta-feira (dia 3, contando a segunda como 0)
+    return (days + 3) % 7 * 24 + seconds // 3600, valid
+
+
+# Pedidos e faturamento por célula dia x hora, numa passada de np.bincount
+def hour_weekday_totals(timestamps, valores):
+    codes, valid = hour_weekday_codes(timestamps)
+    weights = np.nan_to_num(np.asarray(valores, dtype=np.float64)[valid])
+    counts = np.bincount(codes, minlength=HORAS_SEMANA)
+    revenue = np.bincount(codes, weights=weights, minlength=HORAS_SEMANA)
+    return counts, revenue
+
+
+# Matriz dia x hora em formato longo (168 linhas), com o ticket médio por célula
+def hour_weekday_frame(counts, revenue):
+    dia, hora = np.divmod(np.arange(HORAS_SEMANA), 24)
+    ticket = np.full(HORAS_SEMANA, np.nan)
+    np.divide(revenue, counts, out=ticket, where=counts > 0)
+    return pd.DataFrame({
+        'dia': dia,
+        'dia_pt': np.array(DIAS_PT)[dia],
+        'hora': hora,
+        'pedidos': counts.astype(np.int64),
+        'faturamento': revenue.astype(np.float64),
+        'ticket_medio': ticket,
+    })
+
+
+# Estrutura comum do resumo de pedidos, usada tanto pelo caminho do MongoDB
+# quanto pelo caminho em pandas
+def _build_summary(total_pedidos, valor_total, pedidos_entregues, status_counts, hour_weekday, pedidos_tempo, por_restaurante):
+    hora_semana = hour_weekday_frame(*hour_weekday)
+    pedidos_dia = pd.DataFrame({
+        'dia': DIAS_ORDEM,
+        'count': hora_semana.groupby('dia')['pedidos'].sum().reindex(range(7), fill_value=0).to_numpy(),
+        'dia_pt': DIAS_PT,
+    })
+    return {
+        'total_pedidos': int(total_pedidos),
+        'valor_total': float(valor_total),
+        'pedidos_entregues': int(pedidos_entregues),
+        'status_counts': status_counts,
+        'pedidos_dia': pedidos_dia,
+        'hora_semana': hora_semana,
+        'pedidos_tempo': pedidos_tempo,
+        'por_restaurante': por_restaurante,
+    }
+
+
+# Calcula o resumo de pedidos com o pipeline $facet
+def aggregate_order_summary(collection, match):
+    result = list(collection.aggregate(order_summary_pipeline(match)))
+    return summary_from_facets(result[0] if result else {})
+
+
+# Converte o resultado do $facet na estrutura comum do resumo
+def summary_from_facets(facets):
+    kpis = facets.get('kpis') or [{}]
+    status_counts = pd.DataFrame(
+        [(row['_id'], row['count']) for row in facets.get('status', [])],
+        columns=['status', 'count']
+    )
+    counts = np.zeros(HORAS_SEMANA, dtype=np.int64)
+    revenue = np.zeros(HORAS_SEMANA, dtype=np.float64)
+    for row in facets.get('hora_semana', []):
+        dia, hora = row['_id'].get('dia'), row['_id'].get('hora')
+        if dia in MONGO_DIA_SEMANA and hora is not None:
+            # Domingo = 1 no MongoDB, 6 na matriz
+            code = (dia + 5) % 7 * 24 + hora
+            counts[code] += row['count']
+            revenue[code] += row['faturamento'] or 0.0
+    pedidos_tempo = pd.DataFrame(
+        [(row['_id'], row['faturamento'], row['quantidade']) for row in facets.get('diario', [])],
+        columns=['data', 'faturamento', 'quantidade']
+    )
+    pedidos_tempo['data'] = pd.to_datetime(pedidos_tempo['data']).dt.date
+    por_restaurante = pd.DataFrame(
+        [(str(row['_id']), row['valor_total']) for row in facets.get('por_restaurante', [])],
+        columns=['restaurante_id', 'valor_total']
+    )
+    return _build_summary(
+        kpis[0].get('total_pedidos', 0),
+        kpis[0].get('valor_total', 0.0),
+        kpis[0].get('pedidos_entregues', 0),
+        status_counts,
+        (counts, revenue),
+        pedidos_tempo,
+        por_restaurante,
+    )
+
+
+# Caminho em pandas (fallback para bases pequenas): mesmo resumo a partir do
+# DataFrame de pedidos já filtrado
+def summarize_orders_frame(df_pedidos):
+    status_counts = df_pedidos['status_pedido'].value_counts()
+    status_counts = status_counts[status_counts > 0].reset_index()
+    status_counts.columns = ['status', 'count']
+
+    hour_weekday = hour_weekday_totals(df_pedidos['data_hora_pedido'], df_pedidos['valor_total'])
+
+    pedidos_tempo = df_pedidos.groupby(df_pedidos['data_hora_pedido'].dt.date).agg(
+        faturamento=('valor_total', 'sum'),
+        quantidade=('valor_total', 'size')
+    ).reset_index()
+    pedidos_tempo.columns = ['data', 'faturamento', 'quantidade']
+
+    por_restaurante = df_pedidos.groupby('restaurante_id', observed=True)['valor_total'].sum().reset_index()
+    por_restaurante['restaurante_id'] = por_restaurante['restaurante_id'].astype(str)
+
+    return _build_summary(
+        len(df_pedidos),
+        df_pedidos['valor_total'].sum(),
+        (df_pedidos['status_pedido'] == 'entregue').sum(),
+        status_counts,
+        hour_weekday,
+        pedidos_tempo,
+        por_restaurante,
+    )
+
+
+# Pratos mais vendidos e de maior faturamento a partir dos itens dos pedidos
+# filtrados: $unwind dos itens e $group por prato no servidor. Cada ranking é
+# um $sort seguido de $limit, que o MongoDB executa como top-k (sem ordenar
+# todos os pratos), e só os `limit` primeiros trafegam pela rede.
+def dish_ranking_pipeline(match, limit=10):
+    quantidade = {'$ifNull': ['$itens.quantidade', 1]}
+    return [
+        {'$match': match},
+        {'$project': {'itens.prato_id': 1, 'itens.quantidade': 1, 'itens.preco_unitario': 1}},
+        {'$unwind': '$itens'},
+        # Primeiro por (pedido, prato): um prato em duas linhas do mesmo pedido
+        # conta como um pedido só
+        {'$group': {
+            '_id': {'pedido': '$_id', 'prato_id': '$itens.prato_id'},
+            'quantidade': {'$sum': quantidade},
+            'faturamento': {'$sum': {'$multiply': [quantidade, {'$ifNull': ['$itens.preco_unitario', 0]}]}},
+        }},
+        {'$group': {
+            '_id': '$_id.prato_id',
+            'quantidade': {'$sum': '$quantidade'},
+            'faturamento': {'$sum': '$faturamento'},
+            'pedidos': {'$sum': 1},
+        }},
+        {'$facet': {
+            'quantidade': [{'$sort': {'quantidade': -1, '_id': 1}}, {'$limit': limit}],
+            'faturamento': [{'$sort': {'faturamento': -1, '_id': 1}}, {'$limit': limit}],
+        }},
+    ]
+
+
+# Rankings de pratos com o nome (buscado só para os pratos dos rankings)
+def fetch_dish_rankings(orders, dishes, match, limit=10):
+    result = list(orders.aggregate(dish_ranking_pipeline(match, limit)))
+    facets = result[0] if result else {}
+    prato_ids = {row['_id'] for ranking in facets.values() for row in ranking if row['_id'] is not None}
+    nomes = {row['_id']: row.get('nome') for row in dishes.find({'_id': {'$in': list(prato_ids)}}, {'nome': 1})}
+    rankings = {}
+    for ranking in ('quantidade', 'faturamento'):
+        rankings[ranking] = pd.DataFrame(
+            [(str(row['_id']), nomes.get(row['_id']) or str(row['_id']), row['quantidade'], row['faturamento'],
+              row['pedidos']) for row in facets.get(ranking, [])],
+            columns=['prato_id', 'nome', 'quantidade', 'faturamento', 'pedidos']
+        )
+    return rankings
@@ -0,0 +1,224 @@
+# Atualização incremental das coleções em cache: em vez de recarregar a
+# coleção inteira a cada TTL, guarda uma marca d'água (high-water mark) por
+# coleção e busca só os documentos novos ou alterados, anexando-os ao frame
+# em memória. Em replica sets pode acompanhar um change stream.
+import collections
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pandas.api.types import union_categoricals
+from pymongo.errors import PyMongoError
+
+from dashboard.decoder import DEFAULT_BATCH_SIZE, decode_documents, fetch_columnar
+from dashboard.order_store import is_time_sorted
+from dashboard.schema import object_id_values
+
+REFRESH_MODES = ('ttl', 'delta', 'change_stream')
+
+# Seções cujas coleções só crescem por inserções e valem a atualização incremental
+INCREMENTAL_SECTIONS = ('pedidos', 'avaliacoes')
+
+# Intervalo entre buscas incrementais
+DEFAULT_REFRESH_SECONDS = 600
+# Recarga completa periódica, como rede de segurança para alterações que a
+# marca d'água não enxerga (ex.: mudança de status sem campo de atualização)
+DEFAULT_FULL_RELOAD_SECONDS = 24 * 3600
+
+
+# Concatena frames colunares preservando as colunas categóricas
+def append_frames(old, new):
+    if old.empty:
+        return new.reset_index(drop=True)
+    if new.empty:
+        return old
+    columns = {}
+    for name in old.columns:
+        if isinstance(old[name].dtype, pd.CategoricalDtype):
+            columns[name] = union_categoricals([old[name], new[name].astype('category')], ignore_order=True)
+        elif isinstance(old[name].dtype, pd.ArrowDtype):
+            # Chaves binárias (fixed_size_binary) continuam em Arrow
+            columns[name] = pd.concat([old[name], new[name].astype(old[name].dtype)], ignore_index=True)
+        else:
+            columns[name] = np.concatenate([old[name].to_numpy(), new[name].to_numpy()])
+    return pd.DataFrame(columns)
+
+
+# Maior valor do campo usado como marca d'água
+def _max_value(series):
+    if series.empty:
+        return None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # ObjectIds em hexadecimal: a ordem das strings é a ordem dos bytes
+        present = series.cat.categories[np.unique(series.cat.codes[series.cat.codes >= 0])]
+        return max(present) if len(present) else None
+    value = series.max()
+    return None if pd.isna(value) else value
+
+
+def _as_query_value(value):
+    if isinstance(value, bytes) and len(value) == 12:
+        return ObjectId(value)
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+# Frame de uma coleção mantido em memória e atualizado por delta
+class IncrementalFrameCache:
+    def __init__(self, collection, fields, watermark_field='_id', updated_field=None,
+                 mode='delta', refresh_seconds=DEFAULT_REFRESH_SECONDS,
+                 full_reload_seconds=DEFAULT_FULL_RELOAD_SECONDS, batch_size=DEFAULT_BATCH_SIZE,
+                 sort_field=None):
+        if mode not in REFRESH_MODES:
+            raise ValueError(f"Modo de atualização desconhecido: {mode}")
+        if watermark_field not in fields:
+            raise ValueError(f"O campo da marca d'água precisa estar na projeção: {watermark_field}")
+        if (updated_field is not None or mode == 'change_stream') and '_id' not in fields:
+            raise ValueError("Atualizar documentos alterados exige '_id' na projeção")
+        if sort_field is not None and sort_field not in fields:
+            raise ValueError(f"O campo de ordenação precisa estar na projeção: {sort_field}")
+        self.collection = collection
+        self.fields = dict(fields)
+        if updated_field is not None and updated_field not in self.fields:
+            self.fields[updated_field] = 'datetime'
+        self.watermark_field = watermark_field
+        self.updated_field = updated_field
+        self.mode = mode
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.batch_size = batch_size
+        # Campo pelo qual o frame é mantido ordenado (ex.: a data dos pedidos,
+        # que o OrderStore fatia com searchsorted)
+        self.sort_field = sort_field
+
+        self.frame = None
+        self.watermark = None
+        self.updated_watermark = None
+        self.last_refresh = 0.0
+        self.last_full_reload = 0.0
+        self.last_delta_size = 0
+        self.version = 0
+        self._stream = None
+        self._resume_token = None
+        self._lock = threading.Lock()
+
+    # Retorna o frame atual, atualizando-o se o intervalo já passou
+    def get(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if self.frame is None or now - self.last_full_reload >= self.full_reload_seconds:
+                self._full_reload()
+            elif self.mode == 'change_stream' and self._stream is not None:
+                self._drain_change_stream()
+            elif force or now - self.last_refresh >= self.refresh_seconds:
+                self._delta_refresh()
+            return self.frame
+
+    def _full_reload(self):
+        if self.mode == 'change_stream':
+            self._open_change_stream()
+        self.frame = self._sorted(fetch_columnar(self.collection, self.fields, batch_size=self.batch_size))
+        self.watermark = _max_value(self.frame[self.watermark_field])
+        if self.updated_field is not None:
+            self.updated_watermark = _max_value(self.frame[self.updated_field])
+        self.last_refresh = self.last_full_reload = time.monotonic()
+        self.last_delta_size = len(self.frame)
+        self.version += 1
+
+    # Busca só o que passou da marca d'água e faz upsert no frame
+    def _delta_refresh(self):
+        conditions = []
+        if self.watermark is not None:
+            conditions.append({self.watermark_field: {'$gt': _as_query_value(self.watermark)}})
+        if self.updated_field is not None and self.updated_watermark is not None:
+            conditions.append({self.updated_field: {'$gt': _as_query_value(self.updated_watermark)}})
+        query = {'$or': conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+
+        delta = fetch_columnar(self.collection, self.fields, query, self.batch_size)
+        self.last_refresh = time.monotonic()
+        self.last_delta_size = len(delta)
+        if delta.empty:
+            return
+        self._upsert(delta)
+        self.watermark = max(self.watermark, _max_value(delta[self.watermark_field])) if self.watermark is not None \
+            else _max_value(delta[self.watermark_field])
+        if self.updated_field is not None:
+            delta_updated = _max_value(delta[self.updated_field])
+            if delta_updated is not None:
+                self.updated_watermark = delta_updated if self.updated_watermark is None \
+                    else max(self.updated_watermark, delta_updated)
+
+    # Ordenação estável pelo campo de ordenação, com os valores nulos no fim
+    # (como o OrderStore espera); frames já ordenados voltam sem cópia
+    def _sorted(self, frame):
+        if self.sort_field is None or frame.empty:
+            return frame
+        if is_time_sorted(frame[self.sort_field]):
+            return frame
+        return frame.sort_values(self.sort_field, kind='stable', na_position='last').reset_index(drop=True)
+
+    def _upsert(self, delta, deleted_ids=()):
+        frame = self.frame
+        if '_id' in frame.columns:
+            replaced = set(delta['_id'].dropna().tolist())
+            replaced.update(object_id_values(frame['_id'], deleted_ids))
+            if replaced:
+                frame = frame[~frame['_id'].isin(replaced).fillna(False).to_numpy(dtype=bool)]
+        # O delta costuma vir todo depois do fim do frame, e a ordenação de
+        # _sorted (timsort) só reordena de fato o trecho fora de ordem
+        self.frame = self._sorted(append_frames(frame, delta))
+        self.version += 1
+
+    def _open_change_stream(self):
+        try:
+            self._stream = self.collection.watch(full_document='updateLookup', max_await_time_ms=50)
+        except (PyMongoError, NotImplementedError):
+            # Standalone sem replica set: segue no modo delta
+            self._stream = None
+            self.mode = 'delta'
+
+    # Consome os eventos pendentes do change stream sem bloquear a página. Vale
+    # o último evento de cada _id (inserção seguida de alterações, ou exclusão):
+    # vários fullDocument do mesmo pedido duplicariam a linha no frame
+    def _drain_change_stream(self):
+        latest = collections.OrderedDict()
+        try:
+            while True:
+                change = self._stream.try_next()
+                if change is None:
+                    break
+                self._resume_token = self._stream.resume_token
+                operation = change['operationType']
+                if operation in ('insert', 'update', 'replace') and change.get('fullDocument'):
+                    document = change['fullDocument']
+                    latest.pop(document['_id'], None)
+                    latest[document['_id']] = document
+                elif operation == 'delete':
+                    latest.pop(change['documentKey']['_id'], None)
+                    latest[change['documentKey']['_id']] = None
+        except PyMongoError:
+            # Stream interrompido: retoma do último token na próxima leitura
+            self._resume_change_stream()
+        documents = [document for document in latest.values() if document is not None]
+        deleted_ids = [doc_id for doc_id, document in latest.items() if document is None]
+        self.last_refresh = time.monotonic()
+        self.last_delta_size = len(latest)
+        if latest:
+            self._upsert(decode_documents(documents, self.fields), deleted_ids)
+
+    # Sem como retomar (token expirado, servidor fora do ar), o stream é
+    # descartado e a próxima leitura faz a recarga completa, que reabre o stream
+    # ou, sem replica set, passa ao modo delta
+    def _resume_change_stream(self):
+        try:
+            self._stream = self.collection.watch(
+                full_document='updateLookup', max_await_time_ms=50, resume_after=self._resume_token
+            )
+        except PyMongoError:
+            self._stream = None
+            self.last_full_reload = float('-inf')
@@ -0,0 +1,165 @@
+# Cache de resultados compartilhado entre as sessões: os KPIs e as séries dos
+# gráficos de uma combinação de filtros ficam guardados pela chave canônica do
+# estado dos filtros (categorias, período, restaurantes e status, sem depender
+# da ordem em que foram escolhidos). Gerentes que abrem a mesma visão recebem o
+# resultado pronto em vez de refazer a agregação.
+#
+# Os valores ficam serializados (pickle): cada sessão recebe a sua cópia e o
+# tamanho em bytes é exato. O total respeita um orçamento em bytes, com
+# descarte do item usado há mais tempo (LRU). Cada entrada guarda a versão dos
+# dados com que foi calculada: uma leitura com outra versão descarta só aquela
+# entrada (no modo por restaurante cada sessão tem a versão do seu recorte, e
+# uma não pode invalidar as entradas da outra); as que não voltam a ser lidas
+# saem pelo LRU ou pela idade máxima.
+import collections
+import datetime
+import hashlib
+import json
+import pickle
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _normalize_value(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+# Conjunto em forma canônica (None = sem filtro, diferente de conjunto vazio)
+def _normalize_set(values):
+    if values is None:
+        return None
+    return sorted({_normalize_value(value) for value in values})
+
+
+# Hash canônico do estado dos filtros da barra lateral
+def filter_state_key(categories=None, start_date=None, end_date=None, restaurant_ids=None, statuses=None):
+    state = {
+        'categorias': _normalize_set(categories) or None,
+        'periodo': [None if start_date is None else _normalize_value(start_date),
+                    None if end_date is None else _normalize_value(end_date)],
+        'restaurantes': _normalize_set(restaurant_ids),
+        'status': _normalize_set(statuses),
+    }
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=None):
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        # (espaço de nomes, chave) -> (valor serializado, criado em, versão dos dados)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Um lock por chave em cálculo, para sessões simultâneas não repetirem a
+        # agregação: (espaço de nomes, chave) -> [lock, sessões usando o lock]
+        self._computing = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, entry):
+        self.bytes -= len(self._entries.pop(entry)[0])
+
+    # Valor serializado da entrada, se existir, for da mesma versão dos dados e
+    # não tiver expirado (com o lock)
+    def _lookup(self, namespace, version, key):
+        entry = (namespace, key)
+        cached = self._entries.get(entry)
+        if cached is not None and cached[2] != version:
+            self._drop(entry)
+            self.invalidations += 1
+            cached = None
+        if cached is not None and self.max_age_seconds is not None \
+                and time.monotonic() - cached[1] > self.max_age_seconds:
+            self._drop(entry)
+            cached = None
+        if cached is None:
+            return None
+        self._entries.move_to_end(entry)
+        return cached[0]
+
+    # (encontrado, valor)
+    def get(self, namespace, version, key):
+        with self._lock:
+            payload = self._lookup(namespace, version, key)
+            if payload is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, pickle.loads(payload)
+
+    # Se a chave está no cache, sem contar acerto ou falta
+    def contains(self, namespace, version, key):
+        with self._lock:
+            return self._lookup(namespace, version, key) is not None
+
+    def put(self, namespace, version, key, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        entry = (namespace, key)
+        with self._lock:
+            if entry in self._entries:
+                self._drop(entry)
+            self._entries[entry] = (payload, time.monotonic(), version)
+            self.bytes += len(payload)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, namespace, version, key, compute):
+        found, value = self.get(namespace, version, key)
+        if found:
+            return value
+        with self._lock:
+            computing = self._computing.setdefault((namespace, key), [threading.Lock(), 0])
+            computing[1] += 1
+            key_lock = computing[0]
+        try:
+            with key_lock:
+                # Outra sessão pode ter calculado enquanto esta esperava
+                with self._lock:
+                    payload = self._lookup(namespace, version, key)
+                    if payload is not None:
+                        # Conta como acerto: o valor veio do cache, só esperou o cálculo
+                        self.misses -= 1
+                        self.hits += 1
+                if payload is not None:
+                    return pickle.loads(payload)
+                value = compute()
+                self.put(namespace, version, key, value)
+                return value
+        finally:
+            # O lock só sai quando a última sessão que o usa termina: quem ainda
+            # espera nele e quem chega depois continuam no mesmo lock
+            with self._lock:
+                computing[1] -= 1
+                if computing[1] == 0:
+                    del self._computing[(namespace, key)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entradas': len(self._entries),
+                'bytes': self.bytes,
+                'limite_bytes': self.max_bytes,
+                'acertos': self.hits,
+                'faltas': self.misses,
+                'taxa_acerto': self.hits / lookups if lookups else None,
+                'descartes_lru': self.evictions,
+                'invalidacoes': self.invalidations,
+            }
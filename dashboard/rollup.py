@@ -0,0 +1,332 @@
+# Cubo pré-agregado de pedidos: buckets por hora × restaurante × status (com as
+# categorias do restaurante), mantido incrementalmente com $merge e
+# reconstruído do zero uma vez por dia. O dashboard responde a partir dele
+# sempre que os filtros cabem nas dimensões do cubo, e o custo passa a
+# depender do número de buckets, não do número de pedidos.
+import datetime
+import os
+import socket
+import uuid
+
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from dashboard.queries import summary_from_facets
+
+ROLLUP_COLLECTION = 'pedidos_rollup_hora'
+ROLLUP_META_COLLECTION = 'rollup_meta'
+# Coleção auxiliar da reconstrução completa, trocada pelo cubo ao final
+ROLLUP_REBUILD_COLLECTION = f'{ROLLUP_COLLECTION}_reconstrucao'
+# Documento de concessão que decide qual processo atualiza o cubo
+ROLLUP_LEASE_ID = f'{ROLLUP_COLLECTION}:lease'
+ROLLUP_LEASE_SECONDS = 30 * 60
+# Reconstrução completa periódica, como na recarga do IncrementalFrameCache
+ROLLUP_REBUILD_SECONDS = 24 * 3600
+
+# Campos do $match dos pedidos que o cubo consegue responder (a data tem
+# granularidade de hora, e o filtro de período trabalha com dias inteiros)
+ROLLUP_DIMENSIONS = ('restaurante_id', 'status_pedido', 'data_hora_pedido')
+
+
+# Verifica se o $match dos pedidos pode ser respondido pelo cubo
+def rollup_supports(match):
+    if not set(match) <= set(ROLLUP_DIMENSIONS):
+        return False
+    periodo = match.get('data_hora_pedido', {})
+    return all(
+        isinstance(limite, datetime.datetime) and limite == limite.replace(minute=0, second=0, microsecond=0)
+        for limite in periodo.values()
+    )
+
+
+# Traduz o $match dos pedidos para os campos do cubo
+def rollup_match(match):
+    translated = {}
+    for field, condition in match.items():
+        translated['hora' if field == 'data_hora_pedido' else field] = condition
+    return translated
+
+
+# Hora cheia de `data_hora_pedido`: a chave de tempo dos buckets
+HORA_PEDIDO = {
+    '$dateFromParts': {
+        'year': {'$year': '$data_hora_pedido'},
+        'month': {'$month': '$data_hora_pedido'},
+        'day': {'$dayOfMonth': '$data_hora_pedido'},
+        'hour': {'$hour': '$data_hora_pedido'},
+    }
+}
+
+
+# Estágios que agregam os pedidos do $match em buckets por hora
+def rollup_bucket_stages(match):
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'restaurante_id': '$restaurante_id', 'status_pedido': '$status_pedido', 'hora': HORA_PEDIDO},
+            'quantidade': {'$sum': 1},
+            'faturamento': {'$sum': '$valor_total'},
+        }},
+        {'$lookup': {
+            'from': 'restaurantes',
+            'localField': '_id.restaurante_id',
+            'foreignField': '_id',
+            'as': 'restaurante',
+        }},
+        {'$project': {
+            'restaurante_id': '$_id.restaurante_id',
+            'status_pedido': '$_id.status_pedido',
+            'hora': '$_id.hora',
+            'categorias': {'$ifNull': [{'$arrayElemAt': ['$restaurante.categorias', 0]}, []]},
+            'quantidade': 1,
+            'faturamento': 1,
+        }},
+    ]
+
+
+# Pipeline que agrega os pedidos de uma janela de _id em buckets por hora e
+# soma (via $merge) aos buckets já existentes
+def rollup_update_pipeline(id_range):
+    return rollup_bucket_stages({'_id': id_range}) + [
+        {'$merge': {
+            'into': ROLLUP_COLLECTION,
+            'on': '_id',
+            'whenMatched': [{'$set': {
+                'quantidade': {'$add': ['$quantidade', '$$new.quantidade']},
+                'faturamento': {'$add': ['$faturamento', '$$new.faturamento']},
+                'categorias': '$$new.categorias',
+            }}],
+            'whenNotMatched': 'insert',
+        }},
+    ]
+
+
+# Horas cheias dos pedidos já somados ao cubo (_id até `high`) alterados desde
+# `since`, e a maior data de alteração vista, para recalcular só essas horas
+def rollup_changed_hours_pipeline(updated_field, since, high):
+    return [
+        {'$match': {updated_field: {'$gt': since}, '_id': {'$lte': high}}},
+        {'$group': {'_id': HORA_PEDIDO, 'alterado_ate': {'$max': f'${updated_field}'}}},
+    ]
+
+
+# Recalcula por completo os buckets das horas informadas, substituindo os
+# existentes; os buckets que não são tocados pelo recálculo (ex.: o status
+# antigo de um pedido que mudou de status) ficam sem a marca `recalculado_em`
+# da rodada e são removidos em seguida. Só entram os pedidos até a marca d'água
+# `high`: os seguintes são somados pela próxima janela de _id, e contá-los aqui
+# também os somaria duas vezes
+def rollup_recompute_pipeline(hours, stamp, high):
+    periodo = [{'data_hora_pedido': {'$gte': hora, '$lt': hora + datetime.timedelta(hours=1)}} for hora in hours]
+    return rollup_bucket_stages({'$or': periodo, '_id': {'$lte': high}}) + [
+        {'$addFields': {'recalculado_em': stamp}},
+        {'$merge': {'into': ROLLUP_COLLECTION, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+# Cubo inteiro (pedidos até o _id informado) numa coleção auxiliar, que depois
+# substitui o cubo de uma vez: as sessões nunca leem um cubo pela metade
+def rollup_rebuild_pipeline(high):
+    return rollup_bucket_stages({'_id': {'$lte': high}}) + [
+        {'$out': ROLLUP_REBUILD_COLLECTION},
+    ]
+
+
+# Índices do cubo para os filtros do dashboard
+def ensure_rollup_indexes(db):
+    rollup = db[ROLLUP_COLLECTION]
+    rollup.create_index([('hora', 1)])
+    rollup.create_index([('restaurante_id', 1), ('hora', 1)])
+    rollup.create_index([('status_pedido', 1), ('hora', 1)])
+
+
+def _utcnow():
+    # Datas naive em UTC, como o pymongo devolve as datas gravadas
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# Concessão (lease) com prazo de validade que decide qual processo atualiza o
+# cubo; se o dono morrer no meio da atualização, outro assume quando o prazo
+# vence. Devolve o identificador do dono ou None se outro processo a detém.
+def acquire_rollup_lease(meta, lease_seconds=ROLLUP_LEASE_SECONDS):
+    owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}'
+    now = _utcnow()
+    try:
+        meta.update_one(
+            {'_id': ROLLUP_LEASE_ID, 'expira_em': {'$lte': now}},
+            {'$set': {'dono': owner, 'expira_em': now + datetime.timedelta(seconds=lease_seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return None
+    return owner
+
+
+def release_rollup_lease(meta, owner):
+    meta.delete_one({'_id': ROLLUP_LEASE_ID, 'dono': owner})
+
+
+# Atualiza o cubo com os pedidos que chegaram desde a última execução e, com
+# `updated_field`, recalcula as horas dos pedidos alterados (mudança de status,
+# pedidos gravados com ObjectId antigo). A cada `rebuild_seconds` o cubo é
+# reconstruído do zero, como rede de segurança para o que a marca d'água não
+# enxerga (alterações sem campo de atualização, exclusões). A marca d'água só
+# avança depois que a agregação termina. Devolve a marca d'água publicada, ou
+# None se o cubo ainda não foi montado.
+def update_rollup(db, updated_field=None, rebuild_seconds=ROLLUP_REBUILD_SECONDS,
+                  lease_seconds=ROLLUP_LEASE_SECONDS, force_rebuild=False):
+    meta = db[ROLLUP_META_COLLECTION]
+    owner = acquire_rollup_lease(meta, lease_seconds)
+    if owner is None:
+        # Outro processo está atualizando: vale o cubo até a marca d'água publicada
+        return (meta.find_one({'_id': ROLLUP_COLLECTION}) or {}).get('watermark')
+    try:
+        state = meta.find_one({'_id': ROLLUP_COLLECTION}) or {}
+        reconstruido_em = state.get('reconstruido_em')
+        if force_rebuild or state.get('watermark') is None or reconstruido_em is None \
+                or _utcnow() - reconstruido_em >= datetime.timedelta(seconds=rebuild_seconds):
+            return _rebuild_rollup(db, meta, updated_field)
+        return _apply_rollup_delta(db, meta, state, updated_field)
+    finally:
+        release_rollup_lease(meta, owner)
+
+
+def _latest_order_id(db):
+    latest = db['pedidos'].find_one({}, {'_id': 1}, sort=[('_id', DESCENDING)])
+    return None if latest is None else latest['_id']
+
+
+# Maior data de alteração entre os pedidos até `high` (os que o cubo cobre)
+def _latest_update(db, updated_field, high):
+    if updated_field is None:
+        return None
+    latest = db['pedidos'].find_one(
+        {updated_field: {'$ne': None}, '_id': {'$lte': high}}, {updated_field: 1}, sort=[(updated_field, DESCENDING)]
+    )
+    return None if latest is None else latest[updated_field]
+
+
+def _rebuild_rollup(db, meta, updated_field):
+    started = _utcnow()
+    high = _latest_order_id(db)
+    if high is None:
+        return None
+    updated_high = _latest_update(db, updated_field, high)
+    db['pedidos'].aggregate(rollup_rebuild_pipeline(high))
+    db[ROLLUP_REBUILD_COLLECTION].rename(ROLLUP_COLLECTION, dropTarget=True)
+    ensure_rollup_indexes(db)
+    meta.update_one(
+        {'_id': ROLLUP_COLLECTION},
+        {'$set': {'watermark': high, 'alterado_ate': updated_high, 'reconstruido_em': started, 'atualizado_em': _utcnow()}},
+        upsert=True,
+    )
+    return high
+
+
+def _apply_rollup_delta(db, meta, state, updated_field):
+    low = state['watermark']
+    high = _latest_order_id(db)
+    if high is not None and high > low:
+        db['pedidos'].aggregate(rollup_update_pipeline({'$gt': low, '$lte': high}))
+        meta.update_one({'_id': ROLLUP_COLLECTION}, {'$set': {'watermark': high, 'atualizado_em': _utcnow()}})
+        low = high
+
+    if updated_field is None:
+        return low
+    since = state.get('alterado_ate')
+    if since is None:
+        # Campo de alteração configurado depois da última reconstrução: passa a
+        # acompanhar a partir de agora
+        meta.update_one({'_id': ROLLUP_COLLECTION}, {'$set': {'alterado_ate': _latest_update(db, updated_field, low)}})
+        return low
+    # A marca d'água de alteração só avança sobre os pedidos até `low`, que o
+    # cubo já cobre; os alterados depois dela entram pela janela de _id
+    changed = list(db['pedidos'].aggregate(rollup_changed_hours_pipeline(updated_field, since, low)))
+    hours = [row['_id'] for row in changed if row['_id'] is not None]
+    if hours:
+        stamp = _utcnow()
+        db['pedidos'].aggregate(rollup_recompute_pipeline(hours, stamp, low))
+        db[ROLLUP_COLLECTION].delete_many({'hora': {'$in': hours}, 'recalculado_em': {'$ne': stamp}})
+    if changed:
+        meta.update_one(
+            {'_id': ROLLUP_COLLECTION},
+            {'$set': {'alterado_ate': max(row['alterado_ate'] for row in changed), 'atualizado_em': _utcnow()}}
+        )
+    return low
+
+
+# Reconstrói o cubo do zero (ex.: depois de uma carga retroativa de pedidos)
+def rebuild_rollup(db, updated_field=None):
+    return update_rollup(db, updated_field=updated_field, force_rebuild=True)
+
+
+# Mesmo $facet do resumo de pedidos, somando buckets em vez de contar pedidos
+def rollup_summary_pipeline(match):
+    return [
+        {'$match': rollup_match(match)},
+        {'$facet': {
+            'kpis': [
+                {'$group': {
+                    '_id': None,
+                    'total_pedidos': {'$sum': '$quantidade'},
+                    'valor_total': {'$sum': '$faturamento'},
+                    'pedidos_entregues': {'$sum': {'$cond': [{'$eq': ['$status_pedido', 'entregue']}, '$quantidade', 0]}},
+                }},
+            ],
+            'status': [
+                {'$group': {'_id': '$status_pedido', 'count': {'$sum': '$quantidade'}}},
+                {'$sort': {'count': -1}},
+            ],
+            'hora_semana': [
+                {'$group': {
+                    '_id': {'dia': {'$dayOfWeek': '$hora'}, 'hora': {'$hour': '$hora'}},
+                    'count': {'$sum': '$quantidade'},
+                    'faturamento': {'$sum': '$faturamento'},
+                }},
+            ],
+            'diario': [
+                {'$group': {
+                    '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$hora'}},
+                    'faturamento': {'$sum': '$faturamento'},
+                    'quantidade': {'$sum': '$quantidade'},
+                }},
+                {'$sort': {'_id': 1}},
+            ],
+            'por_restaurante': [
+                {'$group': {'_id': '$restaurante_id', 'valor_total': {'$sum': '$faturamento'}}},
+            ],
+        }},
+    ]
+
+
+# Resumo de pedidos respondido pelo cubo
+def rollup_order_summary(db, match):
+    result = list(db[ROLLUP_COLLECTION].aggregate(rollup_summary_pipeline(match)))
+    return summary_from_facets(result[0] if result else {})
+
+
+# Limites de data e status disponíveis, também a partir do cubo
+def rollup_date_bounds_pipeline(match):
+    return [
+        {'$match': rollup_match(match)},
+        {'$group': {'_id': None, 'min_date': {'$min': '$hora'}, 'max_date': {'$max': '$hora'}}},
+    ]
+
+
+def rollup_status_values_pipeline(match):
+    return [
+        {'$match': rollup_match(match)},
+        {'$group': {'_id': '$status_pedido', 'count': {'$sum': '$quantidade'}}},
+        {'$sort': {'count': -1}},
+    ]
+
+
+def rollup_date_bounds(db, match):
+    result = list(db[ROLLUP_COLLECTION].aggregate(rollup_date_bounds_pipeline(match)))
+    if not result or result[0]['min_date'] is None:
+        return None, None
+    return result[0]['min_date'].date(), result[0]['max_date'].date()
+
+
+def rollup_status_values(db, match):
+    return [row['_id'] for row in db[ROLLUP_COLLECTION].aggregate(rollup_status_values_pipeline(match))]
@@ -0,0 +1,92 @@
+# Esquema explícito das colunas em cache, por coleção. Cada campo tem um tipo
+# compacto que o decodificador colunar produz direto:
+#   objectid      -> categorical (códigos inteiros + ids em hexadecimal); para
+#                    chaves estrangeiras, que se repetem muito (restaurante_id)
+#   objectid_key  -> 12 bytes por linha (fixed_size_binary do Arrow); para
+#                    chaves primárias, em que cada linha tem um id diferente
+#   category      -> categorical de strings (status)
+#   float         -> float64; para valores somados no faturamento
+#   float32       -> float32; só para valores que não são acumulados em somas
+#                    grandes (preço de prato, nota), onde a precisão basta
+#   datetime      -> datetime64[ms]
+#   str / list    -> objetos Python (coleções pequenas)
+import sys
+
+import numpy as np
+import pandas as pd
+
+COLLECTION_SCHEMAS = {
+    'pedidos': {
+        '_id': 'objectid_key',
+        'restaurante_id': 'objectid',
+        'status_pedido': 'category',
+        # Somado em todos os KPIs de faturamento: float32 perderia centavos
+        'valor_total': 'float',
+        'data_hora_pedido': 'datetime',
+    },
+    'restaurantes': {
+        '_id': 'objectid',
+        'nome': 'str',
+        'categorias': 'list',
+    },
+    'avaliacoes': {
+        '_id': 'objectid_key',
+        'restaurante_id': 'objectid',
+        'nota': 'float32',
+        'data_avaliacao': 'datetime',
+    },
+    'pratos': {
+        '_id': 'objectid_key',
+        'restaurante_id': 'objectid',
+        'nome': 'str',
+        'preco': 'float32',
+    },
+}
+
+
+# Tipos de cada campo pedido, segundo o esquema da coleção
+def schema_fields(collection, names):
+    schema = COLLECTION_SCHEMAS[collection]
+    missing = [name for name in names if name not in schema]
+    if missing:
+        raise KeyError(f"Campos sem tipo no esquema de {collection}: {missing}")
+    return {name: schema[name] for name in names}
+
+
+# Valores de ObjectId no formato usado pela coluna (bytes ou hexadecimal)
+def object_id_values(series, object_ids):
+    if isinstance(series.dtype, pd.ArrowDtype):
+        return [oid.binary for oid in object_ids]
+    return [str(oid) for oid in object_ids]
+
+
+# Tamanho que o frame teria sem o esquema: ids e status como strings Python e
+# números em float64, como o pd.DataFrame(lista de dicts) produzia
+def _legacy_column_bytes(series):
+    if isinstance(series.dtype, pd.ArrowDtype):
+        # ObjectId como string hexadecimal de 24 caracteres + ponteiro
+        return len(series) * (sys.getsizeof('0' * 24) + 8)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(object).memory_usage(deep=True, index=False)
+    if series.dtype == np.float32:
+        return series.astype(np.float64).memory_usage(index=False)
+    return series.memory_usage(deep=True, index=False)
+
+
+# Relatório de memória por frame em cache (antes/depois do esquema compacto)
+def frame_memory_report(frames):
+    rows = []
+    for name, frame in frames.items():
+        if frame is None:
+            continue
+        antes = sum(_legacy_column_bytes(frame[column]) for column in frame.columns)
+        depois = int(frame.memory_usage(deep=True, index=False).sum())
+        rows.append({
+            'frame': name,
+            'linhas': len(frame),
+            'antes (MB)': antes / 1e6,
+            'depois (MB)': depois / 1e6,
+            'bytes/linha': depois / len(frame) if len(frame) else 0.0,
+            'redução': (antes / depois) if depois else 1.0,
+        })
+    return pd.DataFrame(rows, columns=['frame', 'linhas', 'antes (MB)', 'depois (MB)', 'bytes/linha', 'redução'])
@@ -0,0 +1,163 @@
+# Snapshot das coleções em disco (Arrow IPC), compartilhado por todas as
+# sessões e processos do servidor. Um único processo busca os dados no MongoDB
+# e grava uma versão nova num diretório próprio; depois troca atomicamente o
+# arquivo CURRENT, que aponta para a versão vigente. Os leitores mapeiam os
+# arquivos em memória (somente leitura), então as colunas numéricas são views
+# das páginas do sistema de arquivos, sem cópia por sessão.
+import json
+import os
+import shutil
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+POINTER_FILE = 'CURRENT'
+LOCK_FILE = 'refresh.lock'
+
+# Idade máxima do snapshot antes de ser regravado (mesmo TTL do st.cache_data)
+DEFAULT_MAX_AGE_SECONDS = 600
+# Versões antigas mantidas em disco para leitores que ainda as mapeiam
+DEFAULT_KEEP_VERSIONS = 2
+# Tempo máximo de espera pelo primeiro snapshot quando outro processo o grava
+DEFAULT_LOCK_WAIT_SECONDS = 60
+# Trava abandonada (processo que morreu no meio da gravação)
+STALE_LOCK_SECONDS = 15 * 60
+
+
+# Colunas binárias de 12 bytes (_id) voltam como coluna Arrow, sem virar bytes Python
+def _types_mapper(arrow_type):
+    if pa.types.is_fixed_size_binary(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+class SnapshotStore:
+    def __init__(self, root, max_age_seconds=DEFAULT_MAX_AGE_SECONDS, keep_versions=DEFAULT_KEEP_VERSIONS,
+                 lock_wait_seconds=DEFAULT_LOCK_WAIT_SECONDS):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.keep_versions = keep_versions
+        self.lock_wait_seconds = lock_wait_seconds
+        os.makedirs(root, exist_ok=True)
+
+    # Versão vigente e o instante em que foi publicada (None se ainda não existe)
+    def current(self):
+        try:
+            with open(os.path.join(self.root, POINTER_FILE), encoding='utf-8') as f:
+                pointer = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isdir(os.path.join(self.root, pointer.get('version', ''))):
+            return None
+        return pointer
+
+    # Vencido pela idade ou sem alguma das seções pedidas
+    def is_stale(self, pointer, sections=()):
+        if pointer is None or not set(sections) <= set(pointer.get('secoes', ())):
+            return True
+        return time.time() - pointer['publicado_em'] >= self.max_age_seconds
+
+    # Versão vigente, regravando o snapshot com loader(sections) se estiver
+    # vencido. Só o processo que conseguir a trava busca os dados; os demais
+    # seguem com a versão anterior (ou esperam, se ainda não houver nenhuma).
+    def ensure_fresh(self, loader, sections):
+        pointer = self.current()
+        if not self.is_stale(pointer, sections):
+            return pointer['version']
+        if self._acquire_lock():
+            try:
+                pointer = self.current()
+                if self.is_stale(pointer, sections):
+                    return self.publish(loader(sections))
+                return pointer['version']
+            finally:
+                self._release_lock()
+        # Outro processo está regravando: a versão anterior serve se tiver as seções
+        if pointer is not None and set(sections) <= set(pointer.get('secoes', ())):
+            return pointer['version']
+        return self._wait_for_first_version(sections)
+
+    # Grava todos os frames numa versão nova e só então troca o ponteiro
+    def publish(self, frames):
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        staging = os.path.join(self.root, f".tmp-{version}")
+        os.makedirs(staging)
+        try:
+            for section, frame in frames.items():
+                self._write_frame(os.path.join(staging, f"{section}.arrow"), frame)
+            os.rename(staging, os.path.join(self.root, version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._write_pointer({'version': version, 'publicado_em': time.time(), 'secoes': sorted(frames)})
+        self._prune(keep=version)
+        return version
+
+    # Frame de uma seção mapeado do disco (somente leitura)
+    def read(self, version, section):
+        source = pa.memory_map(os.path.join(self.root, version, f"{section}.arrow"), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        # split_blocks evita consolidar colunas (o que forçaria uma cópia)
+        return table.to_pandas(split_blocks=True, types_mapper=_types_mapper)
+
+    def _write_frame(self, path, frame):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+
+    # os.replace é atômico: o leitor vê o ponteiro antigo ou o novo, nunca metade
+    def _write_pointer(self, pointer):
+        tmp_path = os.path.join(self.root, f".{POINTER_FILE}.{uuid.uuid4().hex[:8]}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pointer, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.root, POINTER_FILE))
+
+    # Remove versões antigas. Em POSIX os arquivos ainda mapeados por outros
+    # processos continuam válidos até serem desmapeados.
+    def _prune(self, keep):
+        versions = sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and os.path.isdir(os.path.join(self.root, name))
+        )
+        old = [name for name in versions if name != keep][:max(len(versions) - self.keep_versions, 0)]
+        for name in old:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _acquire_lock(self):
+        path = os.path.join(self.root, LOCK_FILE)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < STALE_LOCK_SECONDS:
+                    return False
+                os.remove(path)
+            except OSError:
+                return False
+            return self._acquire_lock()
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def _release_lock(self):
+        try:
+            os.remove(os.path.join(self.root, LOCK_FILE))
+        except OSError:
+            pass
+
+    def _wait_for_first_version(self, sections):
+        deadline = time.monotonic() + self.lock_wait_seconds
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            pointer = self.current()
+            if pointer is not None and set(sections) <= set(pointer.get('secoes', ())):
+                return pointer['version']
+        return None
@@ -0,0 +1,32 @@
+# Modo por restaurante: a sessão de um gerente enxerga só o seu restaurante.
+# Cada seção é lida com o filtro de restaurante na própria consulta (servido
+# pelos índices de restaurante_id), e a memória e o tempo de carga da sessão
+# passam a depender do volume de um restaurante, e não da plataforma inteira.
+from bson import ObjectId
+
+# Campo que liga cada seção ao restaurante
+SECTION_SCOPE_FIELDS = {
+    'restaurantes': '_id',
+    'pedidos': 'restaurante_id',
+    'avaliacoes': 'restaurante_id',
+    'pratos': 'restaurante_id',
+}
+
+
+# Restaurante da sessão: o fixado na configuração tem precedência sobre o da
+# URL; devolve o id em hexadecimal (o formato das colunas de ids em cache)
+def resolve_restaurant_scope(configured=None, requested=None):
+    restaurant_id = configured or requested
+    if not restaurant_id:
+        return None
+    restaurant_id = str(restaurant_id).strip().lower()
+    if not ObjectId.is_valid(restaurant_id):
+        raise ValueError(f"Id de restaurante inválido: {restaurant_id}")
+    return restaurant_id
+
+
+# Filtro da consulta de uma seção restrita a um restaurante
+def scope_query(section, restaurant_id):
+    if section not in SECTION_SCOPE_FIELDS:
+        raise KeyError(f"Seção sem campo de restaurante declarado: {section}")
+    return {SECTION_SCOPE_FIELDS[section]: ObjectId(restaurant_id)}